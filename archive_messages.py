@@ -0,0 +1,43 @@
+#!/usr/bin/env python3
+"""
+Архивация старых сообщений
+
+Переносит сообщения старше заданного числа дней (и ответы на них) из
+anonymous_bot.db в помесячные файлы архива (DB_ARCHIVE_DIR, по умолчанию
+каталог archive рядом с базой). Бот и веб-интерфейс продолжают находить
+перенесенные сообщения в архивах. Скрипт можно запускать по cron, в том
+числе при работающем боте; повторный запуск безопасен.
+"""
+
+import argparse
+import os
+
+from dotenv import load_dotenv
+
+from database import Database, DEFAULT_ARCHIVE_AFTER_DAYS
+
+
+def main():
+    load_dotenv()
+    parser = argparse.ArgumentParser(description="Перенос старых сообщений в помесячные архивы")
+    parser.add_argument("--days", type=int,
+                        default=int(os.getenv("ARCHIVE_AFTER_DAYS", DEFAULT_ARCHIVE_AFTER_DAYS)),
+                        help="архивировать сообщения старше стольких дней (ARCHIVE_AFTER_DAYS)")
+    parser.add_argument("--db", default="anonymous_bot.db", help="путь к базе")
+    args = parser.parse_args()
+
+    print(f"📦 Архивация сообщений старше {args.days} дней")
+    print("=" * 50)
+
+    db = Database(args.db)
+    moved = db.archive_messages(args.days)
+    for month, count in moved.items():
+        print(f"   ✅ {month}: {count} сообщений → {db.archive_path(month)}")
+    db.close()
+
+    print("\n" + "=" * 50)
+    print(f"✅ Перенесено сообщений: {sum(moved.values())}" if moved else "✅ Нечего архивировать")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,6 @@
+"""
+Бенчмарки Anonymous Bot
+
+Запуск из корня репозитория, например:
+    python -m benchmarks.db_contention
+"""
@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк /api/chats: прежний N+1 вариант против get_chats_with_messages()
+
+Прежний вариант делал запрос сообщений на каждого пользователя и запрос
+ответов на каждое сообщение. Новый - два запроса на весь список.
+
+Запуск (по умолчанию 10k пользователей / 500k сообщений):
+    python -m benchmarks.chats_endpoint
+    python -m benchmarks.chats_endpoint --users 1000 --messages 50000 --repeat 5
+"""
+
+import argparse
+import json
+import os
+import tempfile
+import time
+
+from benchmarks.utils import seed_database, summarize
+from database import Database
+
+
+def legacy_chats(db):
+    """Прежняя реализация /api/chats (O(пользователи × сообщения) запросов)"""
+    chats_list = []
+    for chat in db.get_chats_with_last_message():
+        formatted_messages = []
+        for msg in db.get_user_messages(chat['user_id']):
+            replies = db.get_message_replies(msg['message_id'])
+            formatted_messages.append({
+                "message_id": msg['message_id'],
+                "text": msg['message_text'],
+                "timestamp": msg['timestamp'],
+                "is_from_admin": bool(msg['is_from_admin']),
+                "replies": [{
+                    "reply_text": reply['reply_text'],
+                    "timestamp": reply['timestamp'],
+                    "admin_id": reply['admin_id']
+                } for reply in replies]
+            })
+        chats_list.append({"user_id": chat['user_id'], "messages": formatted_messages})
+    return chats_list
+
+
+def measure(func, repeat):
+    """Выполнить func repeat раз и вернуть сводку задержек"""
+    latencies = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        latencies.append(time.perf_counter() - start)
+    return summarize(latencies)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=10000)
+    parser.add_argument("--messages", type=int, default=500000)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--skip-legacy", action="store_true", help="не замерять прежний вариант")
+    args = parser.parse_args()
+
+    # web_app создает Database() в текущем каталоге и требует ADMIN_ID
+    os.environ.setdefault("ADMIN_ID", "1")
+    with tempfile.TemporaryDirectory() as tmp:
+        os.chdir(tmp)
+        import web_app
+
+        db_path = os.path.join(tmp, "bench.db")
+        db = Database(db_path)
+        seed_database(db_path, args.users, args.messages)
+        web_app.db = db
+        client = web_app.app.test_client()
+
+        report = {"users": args.users, "messages": args.messages}
+        report["new_endpoint"] = measure(lambda: client.get("/api/chats").get_data(), args.repeat)
+        if not args.skip_legacy:
+            with web_app.app.app_context():
+                report["legacy_endpoint"] = measure(
+                    lambda: web_app.jsonify(legacy_chats(db)).get_data(), args.repeat
+                )
+        db.close()
+
+    print(json.dumps(report, indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк конкуренции двух процессов за anonymous_bot.db
+
+Один процесс ведет себя как bot.py (пишет пользователей и сообщения),
+второй - как web_app.py (читает список чатов и статистику).
+Сравниваются режимы журнала DELETE (прежнее поведение SQLite по умолчанию)
+и WAL с настройками из database.DEFAULT_PRAGMAS.
+
+Запуск:
+    python -m benchmarks.db_contention --seconds 10
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import sqlite3
+import tempfile
+import time
+
+from benchmarks.utils import summarize
+from database import Database, DEFAULT_PRAGMAS
+
+
+MODES = {
+    "delete": dict(DEFAULT_PRAGMAS, journal_mode="DELETE", synchronous="FULL"),
+    "wal": dict(DEFAULT_PRAGMAS),
+}
+
+
+def writer(db_path, pragmas, deadline, results):
+    """Процесс-«бот»: upsert пользователя + вставка сообщения"""
+    db = Database(db_path, pool_size=1, pragmas=pragmas, busy_retries=0)
+    latencies, errors, i = [], 0, 0
+    while time.time() < deadline:
+        start = time.perf_counter()
+        try:
+            user_id = i % 500
+            db.add_or_update_user(user_id, username=f"user{user_id}")
+            db.add_message(f"w{os.getpid()}-{i}", user_id, "x" * 200)
+            latencies.append(time.perf_counter() - start)
+        except sqlite3.OperationalError:
+            errors += 1
+        i += 1
+    db.close()
+    results["writer"] = summarize(latencies, errors)
+
+
+def reader(db_path, pragmas, deadline, results):
+    """Процесс-«веб-интерфейс»: список чатов и статистика"""
+    db = Database(db_path, pool_size=1, pragmas=pragmas, busy_retries=0)
+    latencies, errors = [], 0
+    while time.time() < deadline:
+        start = time.perf_counter()
+        try:
+            db.get_chats_with_last_message()
+            db.get_stats()
+            latencies.append(time.perf_counter() - start)
+        except sqlite3.OperationalError:
+            errors += 1
+    db.close()
+    results["reader"] = summarize(latencies, errors)
+
+
+def run_mode(name, pragmas, seconds):
+    """Запустить писателя и читателя на отдельной базе в выбранном режиме"""
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "bench.db")
+        Database(db_path, pragmas=pragmas).close()
+
+        manager = multiprocessing.Manager()
+        results = manager.dict()
+        deadline = time.time() + seconds
+        processes = [
+            multiprocessing.Process(target=writer, args=(db_path, pragmas, deadline, results)),
+            multiprocessing.Process(target=reader, args=(db_path, pragmas, deadline, results)),
+        ]
+        for process in processes:
+            process.start()
+        for process in processes:
+            process.join()
+        report = dict(results)
+        manager.shutdown()
+    return {"mode": name, **report}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--seconds", type=float, default=10.0, help="длительность каждого прогона")
+    parser.add_argument("--modes", default="delete,wal", help="режимы через запятую: delete, wal")
+    args = parser.parse_args()
+
+    report = [run_mode(name, MODES[name], args.seconds) for name in args.modes.split(",")]
+    print(json.dumps(report, indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
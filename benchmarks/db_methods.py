@@ -0,0 +1,219 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк публичных методов database.Database на синтетической базе
+
+База заполняется benchmarks.utils.seed_database (пользователи с
+распределением активности Парето, тексты по закону Ципфа, доля отвеченных
+сообщений --reply-ratio), затем каждый метод вызывается до --ops раз, но не
+дольше --max-seconds. Аргументы тоже неравномерны: активные пользователи
+запрашиваются чаще. Отчет - JSON с пропускной способностью и p50/p95/p99
+по каждому методу; с --baseline он сравнивается с прошлым отчетом, и
+методы, у которых p95 вырос больше чем в --threshold раз, перечисляются в
+"regressions" (код выхода 1).
+
+Запуск:
+    python -m benchmarks.db_methods --users 10000 --messages 200000 --output run.json
+    python -m benchmarks.db_methods --baseline run.json
+    python -m benchmarks.db_methods --methods get_stats,get_chats_page --db bench.db
+"""
+
+import argparse
+import inspect
+import itertools
+import json
+import os
+import platform
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+
+from benchmarks.utils import (
+    FIRST_USER_ID, VOCABULARY_SIZE, message_id_for, pareto_weights, seed_database,
+    summarize, synthetic_text, vocabulary_word, zipf_cum_weights,
+)
+from database import Database
+
+# Не замеряются: разрушают данные или меняют схему, а не работают с ней
+EXCLUDED = {
+    "clear_all_data": "удаляет все данные",
+    "archive_messages": "переносит сообщения в архив и меняет остальные замеры",
+    "init_database": "создание схемы",
+    "get_connection": "открытие соединения",
+    "connection": "выдача соединения из пула",
+    "close": "закрытие пула",
+    "archive_path": "не обращается к базе",
+}
+
+
+class Workload:
+    """Генератор аргументов вызовов с тем же перекосом, что и в данных"""
+
+    def __init__(self, users: int, messages: int, seed: int):
+        self.rng = random.Random(seed + 1)
+        self.messages = messages
+        # Те же веса пользователей, что использовала seed_database
+        self.user_weights = pareto_weights(users, random.Random(seed))
+        self.user_ids = range(FIRST_USER_ID, FIRST_USER_ID + users)
+        self.cum_weights = zipf_cum_weights()
+        self.counter = itertools.count()
+
+    def user_id(self) -> int:
+        return self.rng.choices(self.user_ids, self.user_weights)[0]
+
+    def message_id(self) -> str:
+        return message_id_for(self.rng.randrange(self.messages))
+
+    def new_message(self) -> dict:
+        return {
+            "message_id": f"bench{next(self.counter)}",
+            "user_id": self.user_id(),
+            "message_text": synthetic_text(self.rng, self.cum_weights),
+        }
+
+    def search_query(self) -> str:
+        # Слова средней частоты: самые частые совпадают с большей частью базы
+        words = self.rng.randint(1, 2)
+        return " ".join(vocabulary_word(self.rng.randrange(100, VOCABULARY_SIZE // 4)) for _ in range(words))
+
+
+def cases(db: Database, w: Workload):
+    """(имя метода, вызов без аргументов) в порядке замера: чтение, затем запись"""
+    last_event = db.get_last_event_id()
+    return [
+        ("get_user", lambda: db.get_user(w.user_id())),
+        ("get_all_users", lambda: db.get_all_users()),
+        ("get_message", lambda: db.get_message(w.message_id())),
+        ("get_user_messages", lambda: db.get_user_messages(w.user_id())),
+        ("get_user_messages_page", lambda: db.get_user_messages_page(w.user_id(), limit=50)),
+        ("get_all_messages", lambda: db.get_all_messages()),
+        ("get_recent_messages", lambda: db.get_recent_messages(10, 10 * w.rng.randrange(10))),
+        ("count_messages", lambda: db.count_messages()),
+        ("get_message_replies", lambda: db.get_message_replies(w.message_id())),
+        ("has_reply", lambda: db.has_reply(w.message_id())),
+        ("get_chats_with_last_message", lambda: db.get_chats_with_last_message()),
+        ("get_chats_page", lambda: db.get_chats_page(limit=50)),
+        ("get_chats_with_messages", lambda: db.get_chats_with_messages()),
+        ("get_stats", lambda: db.get_stats()),
+        ("get_last_event_id", lambda: db.get_last_event_id()),
+        ("get_data_version", lambda: db.get_data_version()),
+        ("get_events", lambda: db.get_events(max(0, last_event - 100))),
+        ("search", lambda: db.search(w.search_query(), limit=20)),
+        ("search_page", lambda: db.search_page(w.search_query(), limit=20, cursor=20)),
+        ("get_recipients", lambda: db.get_recipients()),
+        ("get_state", lambda: db.get_state("bench", w.user_id())),
+        ("get_states", lambda: db.get_states("bench")),
+
+        ("add_or_update_user", lambda: db.add_or_update_user(
+            w.user_id(), username="bench", first_name="Bench", full_name="Bench User")),
+        ("add_message", lambda: db.add_message(**w.new_message())),
+        ("write_batch", lambda: db.write_batch([], [w.new_message() for _ in range(100)])),
+        ("add_admin_reply", lambda: db.add_admin_reply(w.message_id(), 1, "Ответ")),
+        ("set_state", lambda: db.set_state("bench", w.user_id(), {"message_id": w.message_id()}, 3600)),
+        ("delete_state", lambda: db.delete_state("bench", w.user_id())),
+        ("prune_state", lambda: db.prune_state()),
+        ("add_recipient", lambda: db.add_recipient(w.rng.randrange(1, 1000))),
+        ("remove_recipient", lambda: db.remove_recipient(w.rng.randrange(1, 1000))),
+        ("prune_events", lambda: db.prune_events(keep=10 ** 9)),
+        ("recompute_stats", lambda: db.recompute_stats()),
+    ]
+
+
+def measure(func, ops: int, max_seconds: float) -> dict:
+    """Вызывать func до ops раз или max_seconds секунд; сводка и ops/s"""
+    latencies, errors = [], 0
+    started = time.perf_counter()
+    while len(latencies) + errors < ops and time.perf_counter() - started < max_seconds:
+        start = time.perf_counter()
+        try:
+            func()
+        except sqlite3.Error:
+            errors += 1
+            continue
+        latencies.append(time.perf_counter() - start)
+    elapsed = time.perf_counter() - started
+    return {**summarize(latencies, errors), "ops_per_sec": round(len(latencies) / elapsed, 1) if elapsed else None}
+
+
+def public_methods() -> set:
+    return {name for name, _ in inspect.getmembers(Database, inspect.isfunction)
+            if not name.startswith("_")}
+
+
+def compare(report: dict, baseline: dict, threshold: float) -> list:
+    """Методы, у которых p95 вырос больше чем в threshold раз относительно baseline"""
+    regressions = []
+    for name, result in report["methods"].items():
+        before = baseline.get("methods", {}).get(name)
+        if not before or not before.get("p95_ms") or result["p95_ms"] is None:
+            continue
+        ratio = result["p95_ms"] / before["p95_ms"]
+        if ratio > threshold:
+            regressions.append({"method": name, "baseline_p95_ms": before["p95_ms"],
+                                "p95_ms": result["p95_ms"], "ratio": round(ratio, 2)})
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=10000)
+    parser.add_argument("--messages", type=int, default=200000)
+    parser.add_argument("--reply-ratio", type=float, default=0.5)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--ops", type=int, default=300, help="вызовов каждого метода (не больше)")
+    parser.add_argument("--max-seconds", type=float, default=3.0, help="время на один метод (не больше)")
+    parser.add_argument("--methods", default=None, help="замерить только эти методы (через запятую)")
+    parser.add_argument("--db", default=None,
+                        help="файл базы; если он уже есть, заполнение пропускается (те же --users/--messages)")
+    parser.add_argument("--output", default=None, help="сохранить отчет в файл")
+    parser.add_argument("--baseline", default=None, help="отчет прошлого запуска для сравнения")
+    parser.add_argument("--threshold", type=float, default=1.5, help="допустимый рост p95 относительно baseline")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = args.db or os.path.join(tmp, "bench.db")
+        seeded = args.db is not None and os.path.exists(args.db)
+        db = Database(db_path, archive_dir=os.path.join(tmp, "archive"))
+
+        seed_seconds = None
+        if not seeded:
+            start = time.perf_counter()
+            seed_database(db_path, args.users, args.messages, args.reply_ratio, args.seed)
+            seed_seconds = round(time.perf_counter() - start, 2)
+
+        workload = Workload(args.users, args.messages, args.seed)
+        selected = set(args.methods.split(",")) if args.methods else None
+        results = {}
+        for name, func in cases(db, workload):
+            if selected is None or name in selected:
+                results[name] = measure(func, args.ops, args.max_seconds)
+                print(f"{name}: {results[name]}", file=sys.stderr)
+        db.close()
+
+    report = {
+        "config": {
+            "users": args.users, "messages": args.messages, "reply_ratio": args.reply_ratio,
+            "seed": args.seed, "ops": args.ops, "max_seconds": args.max_seconds,
+            "pragmas": db.pragmas, "sqlite": sqlite3.sqlite_version,
+            "python": platform.python_version(), "seed_seconds": seed_seconds,
+        },
+        "methods": results,
+        "not_measured": sorted(public_methods() - set(results) - set(EXCLUDED)) if selected is None else [],
+    }
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            report["regressions"] = compare(report, json.load(f), args.threshold)
+
+    output = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output + "\n")
+    print(output)
+
+    if report.get("regressions"):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
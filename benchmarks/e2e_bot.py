@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+"""
+Сквозной бенчмарк бота: от сообщения пользователя до доставки получателям
+
+Приложение bot.py (build_application, как в bot.main) получает апдейты
+long polling'ом от benchmarks.fake_telegram, который выдает синтетические
+сообщения пользователей (benchmarks.updates) с заданной скоростью,
+отвечает с задержкой --latency и на долю --error-rate вызовов sendMessage
+отвечает 429 (retry_after --retry-after). Для каждого числа получателей
+измеряется задержка от появления апдейта в getUpdates до доставки первому
+и последнему получателю, а также апдейтов и доставок в секунду.
+
+Лимиты рассылки (TELEGRAM_*_RATE) по умолчанию отключены, чтобы мерить сам
+бот; с --telegram-limits действуют значения из окружения или broadcast.py
+(по умолчанию 1 сообщение в секунду в чат - тогда пропускная способность
+упирается в лимит Telegram).
+
+Запуск:
+    python -m benchmarks.e2e_bot --updates 300 --recipients 1,5,20
+    python -m benchmarks.e2e_bot --rate 20 --error-rate 0.05 --latency 0.05
+"""
+
+import argparse
+import asyncio
+import contextlib
+import json
+import logging
+import os
+import re
+import sys
+import tempfile
+import time
+
+from benchmarks.fake_telegram import FakeTelegramServer
+from benchmarks.updates import synthetic_updates
+from benchmarks.utils import summarize
+
+MARKER = re.compile(r"\[e2e (\d+)\]")
+
+
+def scripted_updates(count, users):
+    """Синтетические апдейты с меткой update_id в тексте - по ней находится доставка"""
+    updates = synthetic_updates(count, users)
+    for update in updates:
+        update["message"]["text"] += f" [e2e {update['update_id']}]"
+    return updates
+
+
+def deliveries(server, recipient_ids):
+    """{update_id: [время доставки каждому получателю]}"""
+    delivered = {}
+    with server.lock:
+        sent = list(server.sent)
+    for message in sent:
+        if message["chat"]["id"] not in recipient_ids:
+            continue
+        match = MARKER.search(message["text"])
+        if match:
+            delivered.setdefault(int(match.group(1)), []).append(message["sent_at"])
+    return delivered
+
+
+async def run_variant(bot_module, server, recipients, updates, rate, timeout):
+    from broadcast import Broadcaster
+
+    recipient_ids = set(range(1, recipients + 1))
+    os.environ["RECIPIENTS"] = ",".join(str(chat_id) for chat_id in sorted(recipient_ids))
+    server.reset()
+    # Новые ведра токенов и кеш профилей - прогоны не влияют друг на друга
+    bot_module.broadcaster = Broadcaster.from_env()
+    bot_module.profile_cache = bot_module.UserProfileCache()
+    with contextlib.redirect_stdout(sys.stderr):  # stdout - только отчет
+        await bot_module.db.clear_all_data()
+
+    application = bot_module.build_application(os.environ["TELEGRAM_BOT_TOKEN"])
+    await application.initialize()
+    await bot_module.recipient_registry.reload()
+    await application.start()
+    await application.updater.start_polling(poll_interval=0, timeout=1)
+
+    server.play(updates, rate)
+    expected = len(updates) * recipients
+    deadline = time.monotonic() + timeout
+    while True:
+        delivered = deliveries(server, recipient_ids)
+        if sum(len(times) for times in delivered.values()) >= expected or time.monotonic() > deadline:
+            break
+        await asyncio.sleep(0.02)
+
+    await application.updater.stop()
+    await application.stop()
+    await application.shutdown()
+
+    first, last = [], []
+    for update_id, times in delivered.items():
+        injected = server.update_times[update_id]
+        first.append(min(times) - injected)
+        if len(times) == recipients:
+            last.append(max(times) - injected)
+
+    count = sum(len(times) for times in delivered.values())
+    elapsed = (max(max(times) for times in delivered.values()) - min(server.update_times.values())
+               if delivered else None)
+    return {
+        "recipients": recipients,
+        "updates": len(updates),
+        "seconds": round(elapsed, 3) if elapsed else None,
+        "updates_per_sec": round(len(last) / elapsed, 1) if elapsed else None,
+        "deliveries_per_sec": round(count / elapsed, 1) if elapsed else None,
+        "missing_deliveries": expected - count,
+        "rate_limited": server.rate_limited,
+        "first_recipient": summarize(first),
+        "all_recipients": summarize(last),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--updates", type=int, default=300)
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--recipients", default="1,5,20", help="числа получателей через запятую")
+    parser.add_argument("--rate", type=float, default=None, help="апдейтов в секунду (по умолчанию все сразу)")
+    parser.add_argument("--latency", type=float, default=0.02, help="задержка Bot API, секунды")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="доля ответов 429 на sendMessage")
+    parser.add_argument("--retry-after", type=int, default=1)
+    parser.add_argument("--telegram-limits", action="store_true", help="не отключать лимиты рассылки")
+    parser.add_argument("--timeout", type=float, default=300.0, help="ожидание доставки на прогон, секунды")
+    args = parser.parse_args()
+
+    updates = scripted_updates(args.updates, args.users)
+
+    with tempfile.TemporaryDirectory() as tmp, \
+            FakeTelegramServer(latency=args.latency, error_rate=args.error_rate,
+                               retry_after=args.retry_after) as telegram:
+        os.chdir(tmp)  # bot.py открывает anonymous_bot.db в текущем каталоге
+        os.environ.update({
+            "TELEGRAM_BOT_TOKEN": "123456:TEST",
+            "TELEGRAM_BASE_URL": telegram.base_url,
+            "ADMIN_ID": "1",
+        })
+        if not args.telegram_limits:
+            os.environ.update({"TELEGRAM_GLOBAL_RATE": "1000000", "TELEGRAM_CHAT_RATE": "1000000"})
+        import bot
+        # Журнал каждого сообщения на INFO заметно нагружает единственный event loop
+        logging.getLogger().setLevel(logging.WARNING)
+
+        async def run_all():
+            return [await run_variant(bot, telegram, int(n), updates, args.rate, args.timeout)
+                    for n in args.recipients.split(",")]
+
+        report = {
+            "config": {"updates": args.updates, "users": args.users, "rate": args.rate,
+                       "latency": args.latency, "error_rate": args.error_rate,
+                       "telegram_limits": args.telegram_limits},
+            "runs": asyncio.run(run_all()),
+        }
+        bot.db.close()
+
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
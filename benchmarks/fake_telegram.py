@@ -0,0 +1,254 @@
+#!/usr/bin/env python3
+"""
+Локальный тестовый сервер Telegram Bot API
+
+Отвечает на getMe, sendMessage, editMessageText, answerCallbackQuery,
+setWebhook/deleteWebhook и getUpdates так, как это делает api.telegram.org,
+запоминает отправленные сообщения (со временем отправки) и считает
+TCP-соединения, чтобы было видно, переиспользует ли клиент соединения.
+getUpdates отдает апдейты, добавленные через add_updates/play, с long
+polling, как настоящий API. Задержка ответа и доля ответов 429 на
+sendMessage (Too Many Requests с retry_after) настраиваются.
+
+Использование из кода:
+    with FakeTelegramServer(latency=0.05) as server:
+        os.environ["TELEGRAM_BASE_URL"] = server.base_url
+        server.play(synthetic_updates(100), rate=20)
+        ...
+
+Запуск отдельно (например, для ручной проверки веб-интерфейса или бота):
+    python -m benchmarks.fake_telegram --port 8081
+    TELEGRAM_BASE_URL=http://127.0.0.1:8081/bot python web_app.py
+    python -m benchmarks.fake_telegram --port 8081 --updates 1000 --rate 50 --error-rate 0.05
+    TELEGRAM_BASE_URL=http://127.0.0.1:8081/bot python bot.py
+"""
+
+import argparse
+import json
+import random
+import threading
+import time
+from typing import Dict, Iterable, Optional
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl
+
+from benchmarks.updates import synthetic_updates
+
+# Сколько апдейтов getUpdates отдает за раз и сколько ждет новых, как в Bot API
+GET_UPDATES_LIMIT = 100
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive, как у настоящего API
+    disable_nagle_algorithm = True
+
+    def setup(self):
+        super().setup()
+        with self.server.lock:
+            self.server.connections += 1
+
+    def log_message(self, format, *args):
+        pass
+
+    def _params(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        body = self.rfile.read(length).decode() if length else ""
+        if self.headers.get("Content-Type", "").startswith("application/json"):
+            return json.loads(body or "{}")
+        # PTB отправляет параметры формой, сложные значения - строками JSON
+        params = {}
+        for key, value in parse_qsl(body):
+            try:
+                params[key] = json.loads(value)
+            except ValueError:
+                params[key] = value
+        return params
+
+    def do_GET(self):
+        self.do_POST()
+
+    def do_POST(self):
+        method = self.path.rsplit("/", 1)[-1].split("?", 1)[0]
+        params = self._params()
+        if self.server.latency:
+            time.sleep(self.server.latency)
+        status, payload = self.server.handle(method, params)
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        try:
+            self.wfile.write(body)
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # клиент отменил запрос (например, long polling при остановке бота)
+
+
+class FakeTelegramServer(ThreadingHTTPServer):
+    """Сервер в фоновом потоке
+
+    sent - отправленные сообщения (с временем отправки sent_at по
+    time.perf_counter), calls - прочие вызовы, update_times - когда апдейт
+    стал доступен через getUpdates, rate_limited - число ответов 429.
+    error_rate - доля вызовов sendMessage, на которые сервер отвечает 429
+    с retry_after секунд.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, latency: float = 0.0,
+                 error_rate: float = 0.0, retry_after: int = 1, seed: int = 0):
+        super().__init__((host, port), _Handler)
+        self.latency = latency
+        self.error_rate = error_rate
+        self.retry_after = retry_after
+        self.lock = threading.Lock()
+        self.connections = 0
+        self.sent = []
+        self.calls = []  # прочие вызовы: (метод, параметры)
+        self.rate_limited = 0
+        self.update_times: Dict[int, float] = {}
+        self._updates = []
+        self._updates_changed = threading.Condition(self.lock)
+        self._rng = random.Random(seed)
+        self._message_id = 0
+        self._thread = None
+
+    def reset(self):
+        """Забыть отправленные сообщения, вызовы и апдейты (между прогонами)"""
+        with self.lock:
+            self.sent.clear()
+            self.calls.clear()
+            self.update_times.clear()
+            self._updates.clear()
+            self.rate_limited = 0
+
+    def add_updates(self, updates: Iterable[dict]):
+        """Сделать апдейты доступными через getUpdates"""
+        with self._updates_changed:
+            now = time.perf_counter()
+            for update in updates:
+                self._updates.append(update)
+                self.update_times[update["update_id"]] = now
+            self._updates_changed.notify_all()
+
+    def play(self, updates: Iterable[dict], rate: Optional[float] = None) -> threading.Thread:
+        """Выдавать апдейты в фоне: rate в секунду (None - все сразу)"""
+        def run():
+            if not rate:
+                self.add_updates(updates)
+                return
+            start = time.perf_counter()
+            for i, update in enumerate(updates):
+                delay = start + i / rate - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+                self.add_updates([update])
+
+        thread = threading.Thread(target=run, daemon=True)
+        thread.start()
+        return thread
+
+    def _get_updates(self, params: dict) -> list:
+        """getUpdates: подтверждение по offset и ожидание новых до timeout секунд"""
+        offset = int(params.get("offset") or 0)
+        limit = int(params.get("limit") or GET_UPDATES_LIMIT)
+        deadline = time.monotonic() + float(params.get("timeout") or 0)
+        with self._updates_changed:
+            # Апдейты с id < offset клиент подтвердил - больше их не отдаем
+            self._updates = [u for u in self._updates if u["update_id"] >= offset]
+            while not self._updates:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._updates_changed.wait(remaining)
+            return self._updates[:limit]
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}/bot"
+
+    def handle(self, method: str, params: dict):
+        """Ответ Bot API на вызов method: (HTTP-статус, JSON)"""
+        if method == "getMe":
+            return 200, {"ok": True, "result": {
+                "id": 1, "is_bot": True, "first_name": "Fake", "username": "fake_bot",
+            }}
+        if method == "sendMessage":
+            with self.lock:
+                if self.error_rate and self._rng.random() < self.error_rate:
+                    self.rate_limited += 1
+                    return 429, {
+                        "ok": False, "error_code": 429,
+                        "description": f"Too Many Requests: retry after {self.retry_after}",
+                        "parameters": {"retry_after": self.retry_after},
+                    }
+                self._message_id += 1
+                message = {
+                    "message_id": self._message_id,
+                    "date": int(time.time()),
+                    "chat": {"id": int(params["chat_id"]), "type": "private"},
+                    "text": params.get("text", ""),
+                }
+                self.sent.append(dict(message, sent_at=time.perf_counter()))
+            return 200, {"ok": True, "result": message}
+        if method == "editMessageText":
+            with self.lock:
+                self.calls.append((method, params))
+                self._message_id += 1
+                message = {
+                    "message_id": int(params.get("message_id") or self._message_id),
+                    "date": int(time.time()),
+                    "chat": {"id": int(params.get("chat_id") or 0), "type": "private"},
+                    "text": params.get("text", ""),
+                }
+            return 200, {"ok": True, "result": message}
+        if method in ("setWebhook", "deleteWebhook", "answerCallbackQuery"):
+            with self.lock:
+                self.calls.append((method, params))
+            return 200, {"ok": True, "result": True}
+        if method == "getUpdates":
+            return 200, {"ok": True, "result": self._get_updates(params)}
+        return 404, {"ok": False, "error_code": 404, "description": "Not Found"}
+
+    def start(self) -> "FakeTelegramServer":
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8081)
+    parser.add_argument("--latency", type=float, default=0.0, help="задержка ответа, секунды")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="доля ответов 429 на sendMessage")
+    parser.add_argument("--retry-after", type=int, default=1, help="retry_after в ответах 429, секунды")
+    parser.add_argument("--updates", type=int, default=0, help="выдать столько синтетических апдейтов")
+    parser.add_argument("--users", type=int, default=100)
+    parser.add_argument("--rate", type=float, default=None, help="апдейтов в секунду (по умолчанию все сразу)")
+    args = parser.parse_args()
+
+    server = FakeTelegramServer(args.host, args.port, args.latency, args.error_rate, args.retry_after)
+    print(f"Fake Bot API: {server.base_url}")
+    if args.updates:
+        server.play(synthetic_updates(args.updates, args.users), args.rate)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк рассылки получателям: последовательный цикл против Broadcaster
+
+FakeBot имитирует задержку Bot API (по умолчанию 50 мс на sendMessage)
+и, по желанию, случайные ответы 429 (RetryAfter). Для 1/10/100 получателей
+измеряется время доставки всем: прежним последовательным циклом,
+Broadcaster с лимитами Telegram и Broadcaster без лимитов.
+
+Запуск:
+    python -m benchmarks.fanout
+    python -m benchmarks.fanout --latency 0.1 --flood-rate 0.05
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import time
+
+from telegram.error import RetryAfter
+
+from broadcast import Broadcaster
+
+
+class FakeBot:
+    """Заглушка telegram.Bot: задержка и (опционально) RetryAfter"""
+
+    def __init__(self, latency: float, flood_rate: float = 0.0, retry_after: int = 1):
+        self.latency = latency
+        self.flood_rate = flood_rate
+        self.retry_after = retry_after
+        self.sent = 0
+
+    async def send_message(self, chat_id, text, **kwargs):
+        await asyncio.sleep(self.latency)
+        if random.random() < self.flood_rate:
+            raise RetryAfter(self.retry_after)
+        self.sent += 1
+
+
+async def sequential(bot, recipients, text):
+    """Прежняя реализация send_to_all_recipients"""
+    success_count = 0
+    failed_recipients = []
+    for recipient_id in recipients:
+        try:
+            await bot.send_message(chat_id=recipient_id, text=text)
+            success_count += 1
+        except Exception:
+            failed_recipients.append(recipient_id)
+    return success_count, failed_recipients
+
+
+async def measure(name, send, recipients, args):
+    """Время рассылки одному набору получателей"""
+    bot = FakeBot(args.latency, args.flood_rate)
+    start = time.perf_counter()
+    success_count, failed = await send(bot, recipients)
+    return {
+        "sender": name,
+        "recipients": len(recipients),
+        "seconds": round(time.perf_counter() - start, 3),
+        "success": success_count,
+        "failed": len(failed),
+    }
+
+
+async def run(args):
+    report = []
+    for count in args.recipients:
+        recipients = list(range(1000, 1000 + count))
+        report.append(await measure(
+            "sequential", lambda bot, r: sequential(bot, r, "test"), recipients, args))
+        # Новый Broadcaster на каждый прогон, чтобы ведра токенов были полными
+        limited = Broadcaster(concurrency=args.concurrency)
+        report.append(await measure(
+            "broadcaster", lambda bot, r: limited.send(bot, r, text="test"), recipients, args))
+        unlimited = Broadcaster(concurrency=args.concurrency, global_rate=1e9,
+                                chat_rate=1e9, group_rate=1e9)
+        report.append(await measure(
+            "broadcaster_no_limits", lambda bot, r: unlimited.send(bot, r, text="test"), recipients, args))
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--recipients", type=int, nargs="+", default=[1, 10, 100])
+    parser.add_argument("--latency", type=float, default=0.05, help="задержка sendMessage, с")
+    parser.add_argument("--flood-rate", type=float, default=0.0, help="доля ответов 429")
+    parser.add_argument("--concurrency", type=int, default=8)
+    args = parser.parse_args()
+
+    print(json.dumps(asyncio.run(run(args)), indent=2))
+
+
+if __name__ == "__main__":
+    main()
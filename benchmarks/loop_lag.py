@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк задержки event loop: синхронные вызовы Database против AsyncDatabase
+
+Имитирует поток апдейтов: concurrency корутин одновременно пишут
+пользователя и сообщение, как handle_any_message. LoopLagMonitor
+показывает, насколько блокируется event loop в каждом варианте.
+
+Запуск:
+    python -m benchmarks.loop_lag --updates 2000 --synchronous FULL
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import tempfile
+import time
+
+from database import Database, AsyncDatabase, DEFAULT_PRAGMAS
+from loop_monitor import LoopLagMonitor
+
+
+async def handle_sync(db, i):
+    """Обработчик в прежнем стиле: обращения к базе прямо в event loop"""
+    db.add_or_update_user(i % 100, username=f"user{i % 100}")
+    db.add_message(f"sync{i}", i % 100, "x" * 200)
+    await asyncio.sleep(0)
+
+
+async def handle_async(db, i):
+    """Обработчик через AsyncDatabase"""
+    await db.add_or_update_user(i % 100, username=f"user{i % 100}")
+    await db.add_message(f"async{i}", i % 100, "x" * 200)
+
+
+async def run_variant(name, handler, db, updates, concurrency):
+    monitor = LoopLagMonitor(interval=0.005, report_every=3600)
+    monitor.start()
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(i):
+        async with semaphore:
+            await handler(db, i)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(updates)))
+    elapsed = time.perf_counter() - start
+    # Даем монитору проснуться хотя бы раз после нагрузки
+    await asyncio.sleep(0.02)
+    await monitor.stop()
+    return {"variant": name, "seconds": round(elapsed, 3), **monitor.snapshot()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--updates", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--synchronous", default="FULL", help="PRAGMA synchronous для прогона")
+    args = parser.parse_args()
+
+    pragmas = dict(DEFAULT_PRAGMAS, synchronous=args.synchronous)
+    report = []
+    with tempfile.TemporaryDirectory() as tmp:
+        sync_db = Database(os.path.join(tmp, "sync.db"), pragmas=pragmas)
+        report.append(asyncio.run(run_variant("sync", handle_sync, sync_db, args.updates, args.concurrency)))
+        sync_db.close()
+
+        async_db = AsyncDatabase(Database(os.path.join(tmp, "async.db"), pragmas=pragmas))
+        report.append(asyncio.run(run_variant("async", handle_async, async_db, args.updates, args.concurrency)))
+        async_db.close()
+
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
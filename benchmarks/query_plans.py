@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+Проверка планов запросов Database (EXPLAIN QUERY PLAN)
+
+Вызывает методы Database на небольшой синтетической базе, перехватывает
+выполненные SQL-запросы и проверяет их планы: полный просмотр таблицы
+(SCAN) разрешен только там, где он ожидается. Завершается с кодом 1,
+если в каком-то запросе появился непредусмотренный SCAN.
+
+Запуск:
+    python -m benchmarks.query_plans
+"""
+
+import os
+import re
+import sys
+import tempfile
+
+from benchmarks.utils import seed_database
+from database import Database
+
+
+class TracingDatabase(Database):
+    """Database, запоминающая все выполненные SQL-запросы"""
+
+    def __init__(self, *args, **kwargs):
+        self.statements = []
+        super().__init__(*args, **kwargs)
+
+    def get_connection(self):
+        conn = super().get_connection()
+        conn.set_trace_callback(self.statements.append)
+        return conn
+
+
+def full_scans(conn, statement):
+    """Список таблиц (или их псевдонимов), которые запрос просматривает целиком"""
+    plan = conn.execute(f"EXPLAIN QUERY PLAN {statement}").fetchall()
+    scans = []
+    for row in plan:
+        match = re.match(r"SCAN (\w+)", row[3])
+        if match:
+            scans.append(match.group(1))
+    return scans
+
+
+def main():
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "plans.db")
+        db = TracingDatabase(db_path, pool_size=2)
+        seed_database(db_path, users=200, messages=5000)
+        with db.connection() as conn:
+            conn.execute("ANALYZE")
+
+        message_id = "s0000000"  # Первое сообщение из seed_database
+        user_id = db.get_message(message_id)['user_id']
+
+        # (название, вызов, таблицы/псевдонимы, которые допустимо просматривать целиком)
+        checks = [
+            ("get_user", lambda: db.get_user(user_id), set()),
+            ("get_message", lambda: db.get_message(message_id), set()),
+            ("has_reply", lambda: db.has_reply(message_id), set()),
+            ("get_message_replies", lambda: db.get_message_replies(message_id), set()),
+            ("get_user_messages_page", lambda: db.get_user_messages_page(user_id, limit=50), set()),
+            # Обход индекса timestamp, остановленный LIMIT
+            ("get_recent_messages", lambda: db.get_recent_messages(10), {"m"}),
+            # COUNT(*) проходит по самому маленькому индексу; CONSTANT - строка без таблицы
+            ("count_messages", db.count_messages, {"messages", "archives", "CONSTANT"}),
+            # Поиск по FTS5 выполняется виртуальной таблицей, а не просмотром
+            ("search", lambda: db.search("слово100"), {"messages_fts", "admin_replies_fts"}),
+            ("add_admin_reply", lambda: db.add_admin_reply(message_id, 1, "ok"), set()),
+            # archives - каталог архивов, по строке на месяц
+            ("get_stats", db.get_stats, {"archives"}),
+            # Список чатов по определению проходит по всем пользователям
+            ("get_chats_with_last_message", db.get_chats_with_last_message, {"users", "u"}),
+            # Первая страница чатов - обход индекса idx_users_chat_order, остановленный LIMIT,
+            # следующие - поиск по нему; u - сама страница
+            ("get_chats_page", lambda: db.get_chats_page(limit=50), {"users", "u"}),
+            ("get_chats_page_after", lambda: db.get_chats_page(limit=50, after=("2024-01-01", 10 ** 9)), {"u"}),
+            ("get_chats_with_messages", db.get_chats_with_messages, {"users", "u", "messages", "m"}),
+        ]
+
+        failures = []
+        with db.connection() as conn:
+            for name, call, allowed in checks:
+                del db.statements[:]
+                call()
+                # Служебные запросы FTS5 к своим теневым таблицам не проверяем
+                statements = [s for s in db.statements
+                              if s.lstrip().upper().startswith(("SELECT", "UPDATE", "DELETE"))
+                              and "_fts_" not in s]
+                for statement in statements:
+                    unexpected = [t for t in full_scans(conn, statement) if t not in allowed]
+                    if unexpected:
+                        failures.append((name, unexpected, " ".join(statement.split())))
+                print(f"{'FAIL' if any(f[0] == name for f in failures) else 'ok':4}  {name}")
+        db.close()
+
+    for name, tables, statement in failures:
+        print(f"\n{name}: полный просмотр {', '.join(tables)}\n  {statement}")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк обработки апдейтов: последовательно против PerChatUpdateProcessor
+
+Настоящие обработчики bot.py получают синтетические апдейты
+(benchmarks.updates) через update_queue приложения, Bot API заменен
+benchmarks.fake_telegram с задержкой --latency. Для каждого значения
+UPDATE_CONCURRENCY измеряется время обработки всех апдейтов и
+проверяется, что сообщения каждого пользователя сохранены по порядку.
+Лимиты рассылки (TELEGRAM_*_RATE) отключены, чтобы мерить обработку,
+а не ожидание лимитов Telegram.
+
+Запуск:
+    python -m benchmarks.update_throughput --updates 500 --concurrency 1,4,16,64
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import re
+import tempfile
+import time
+
+from benchmarks.fake_telegram import FakeTelegramServer
+from benchmarks.updates import synthetic_updates
+
+
+async def run_variant(bot_module, concurrency, updates, timeout):
+    from telegram import Update
+
+    os.environ["UPDATE_CONCURRENCY"] = str(concurrency)
+    bot_module.profile_cache = bot_module.UserProfileCache()
+    await bot_module.db.clear_all_data()
+
+    application = bot_module.build_application(os.environ["TELEGRAM_BOT_TOKEN"])
+    await application.initialize()
+    await bot_module.recipient_registry.reload(reread_env=False)
+    await application.start()
+
+    start = time.perf_counter()
+    for data in updates:
+        await application.update_queue.put(Update.de_json(data, application.bot))
+
+    deadline = time.monotonic() + timeout
+    while (await bot_module.db.get_stats())["total_messages"] < len(updates):
+        if time.monotonic() > deadline:
+            raise RuntimeError(f"concurrency={concurrency}: не все апдейты обработаны за {timeout} с")
+        await asyncio.sleep(0.01)
+    elapsed = time.perf_counter() - start
+
+    await application.stop()
+    await application.shutdown()
+
+    # Порядок: номера сообщений каждого пользователя должны возрастать
+    out_of_order = 0
+    for user in await bot_module.db.get_all_users():
+        numbers = [int(re.search(r"#(\d+)", m["message_text"]).group(1))
+                   for m in await bot_module.db.get_user_messages_page(user["user_id"])]
+        out_of_order += sum(1 for a, b in zip(numbers, numbers[1:]) if b < a)
+
+    return {
+        "concurrency": concurrency,
+        "seconds": round(elapsed, 3),
+        "updates_per_sec": round(len(updates) / elapsed, 1),
+        "out_of_order": out_of_order,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--updates", type=int, default=500)
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--latency", type=float, default=0.05, help="задержка Bot API, секунды")
+    parser.add_argument("--concurrency", default="1,4,16,64")
+    parser.add_argument("--timeout", type=float, default=300.0)
+    args = parser.parse_args()
+
+    updates = synthetic_updates(args.updates, args.users)
+
+    with tempfile.TemporaryDirectory() as tmp, FakeTelegramServer(latency=args.latency) as telegram:
+        os.chdir(tmp)  # bot.py открывает anonymous_bot.db в текущем каталоге
+        os.environ.update({
+            "TELEGRAM_BOT_TOKEN": "123456:TEST",
+            "TELEGRAM_BASE_URL": telegram.base_url,
+            "TELEGRAM_POOL_SIZE": "64",
+            "ADMIN_ID": "1",
+            "RECIPIENTS": "1",
+            "TELEGRAM_GLOBAL_RATE": "1000000",
+            "TELEGRAM_CHAT_RATE": "1000000",
+        })
+        import bot
+
+        async def run_all():
+            return [await run_variant(bot, int(c), updates, args.timeout)
+                    for c in args.concurrency.split(",")]
+
+        report = asyncio.run(run_all())
+        bot.db.close()
+
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+"""
+Синтетические апдейты Telegram в формате Bot API (JSON)
+
+Используются для проверки вебхука и бенчмарков обработки апдейтов.
+Сохраненные апдейты хранятся по одному JSON-объекту на строку.
+"""
+
+import json
+import random
+import time
+from typing import Dict, Iterable, Iterator, List
+
+
+def message_update(update_id: int, user_id: int, text: str, message_id: int = None) -> Dict:
+    """Апдейт с текстовым сообщением пользователя в личном чате"""
+    entities = []
+    if text.startswith('/'):
+        entities.append({"type": "bot_command", "offset": 0, "length": len(text.split()[0])})
+
+    message = {
+        "message_id": message_id if message_id is not None else update_id,
+        "date": int(time.time()),
+        "chat": {"id": user_id, "type": "private", "first_name": f"User{user_id}"},
+        "from": {
+            "id": user_id,
+            "is_bot": False,
+            "first_name": f"User{user_id}",
+            "username": f"user{user_id}",
+            "language_code": "ru",
+        },
+        "text": text,
+    }
+    if entities:
+        message["entities"] = entities
+    return {"update_id": update_id, "message": message}
+
+
+def synthetic_updates(count: int, users: int = 100, seed: int = 42,
+                      first_user_id: int = 100000) -> List[Dict]:
+    """count апдейтов от users пользователей; номера сообщений в тексте
+    позволяют проверить порядок обработки внутри одного чата"""
+    rng = random.Random(seed)
+    sequence = {}
+    updates = []
+    for update_id in range(1, count + 1):
+        user_id = first_user_id + rng.randrange(users)
+        sequence[user_id] = sequence.get(user_id, 0) + 1
+        updates.append(message_update(update_id, user_id, f"synthetic message #{sequence[user_id]}"))
+    return updates
+
+
+def save_updates(path: str, updates: Iterable[Dict]) -> None:
+    with open(path, 'w', encoding='utf-8') as f:
+        for update in updates:
+            f.write(json.dumps(update, ensure_ascii=False) + "\n")
+
+
+def load_updates(path: str) -> Iterator[Dict]:
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
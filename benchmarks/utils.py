@@ -0,0 +1,132 @@
+"""
+Общие функции бенчмарков: перцентили и генерация синтетической базы
+"""
+
+import random
+import sqlite3
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+
+def percentile(values: List[float], p: float) -> Optional[float]:
+    """Перцентиль p (0..100) по отсортированному списку"""
+    if not values:
+        return None
+    index = min(len(values) - 1, int(round(p / 100 * (len(values) - 1))))
+    return values[index]
+
+
+def summarize(latencies: List[float], errors: int = 0) -> Dict[str, Optional[float]]:
+    """Сводка по задержкам (в секундах) в миллисекундах"""
+    latencies = sorted(latencies)
+
+    def ms(value):
+        return round(value * 1000, 3) if value is not None else None
+
+    return {
+        "ops": len(latencies),
+        "errors": errors,
+        "p50_ms": ms(percentile(latencies, 50)),
+        "p95_ms": ms(percentile(latencies, 95)),
+        "p99_ms": ms(percentile(latencies, 99)),
+        "max_ms": ms(latencies[-1] if latencies else None),
+    }
+
+
+# Словарь синтетических сообщений: частота слова обратно пропорциональна
+# его рангу (закон Ципфа), как в текстах на естественном языке
+VOCABULARY_SIZE = 20000
+FIRST_USER_ID = 100000
+
+
+def pareto_weights(count: int, rng: random.Random) -> List[float]:
+    """Веса активности пользователей: немногие пишут большую часть сообщений"""
+    return [rng.paretovariate(1.2) for _ in range(count)]
+
+
+def vocabulary_word(rank: int) -> str:
+    """Слово словаря с рангом rank (0 - самое частое)"""
+    return f"слово{rank}"
+
+
+def synthetic_text(rng: random.Random, cum_weights: List[float], min_words: int = 3,
+                   max_words: int = 40) -> str:
+    """Текст из слов словаря; cum_weights - накопленные веса zipf_cum_weights()"""
+    ranks = rng.choices(range(len(cum_weights)), cum_weights=cum_weights,
+                        k=rng.randint(min_words, max_words))
+    return " ".join(vocabulary_word(rank) for rank in ranks)
+
+
+def zipf_cum_weights(size: int = VOCABULARY_SIZE) -> List[float]:
+    """Накопленные веса 1/ранг для random.choices"""
+    total, cum_weights = 0.0, []
+    for rank in range(1, size + 1):
+        total += 1 / rank
+        cum_weights.append(total)
+    return cum_weights
+
+
+def seed_database(db_path: str, users: int, messages: int, reply_ratio: float = 0.5,
+                  seed: int = 42, batch_size: int = 10000) -> None:
+    """Заполнить базу синтетическими пользователями, сообщениями и ответами
+
+    Сообщения распределены между пользователями неравномерно (распределение
+    Парето): небольшая часть пользователей пишет большую часть сообщений,
+    как и в реальном боте. Текст - слова словаря с частотами по закону
+    Ципфа. Схема должна быть уже создана через Database().
+    ID сообщений - message_id_for(номер).
+    """
+    rng = random.Random(seed)
+    now = datetime.now()
+    start = now - timedelta(days=365)
+    span = (now - start).total_seconds()
+
+    def ts(offset: float) -> str:
+        return (start + timedelta(seconds=offset)).strftime("%Y-%m-%d %H:%M:%S")
+
+    conn = sqlite3.connect(db_path)
+    try:
+        conn.executemany(
+            "INSERT OR IGNORE INTO users (user_id, username, first_name, full_name, "
+            "language_code, first_seen, last_seen) VALUES (?, ?, ?, ?, ?, ?, ?)",
+            ((FIRST_USER_ID + i, f"user{i}", f"Name{i}", f"Name{i} Surname", "ru",
+              ts(0), ts(span)) for i in range(users))
+        )
+
+        weights = pareto_weights(users, rng)
+        authors = rng.choices(range(FIRST_USER_ID, FIRST_USER_ID + users), weights, k=messages) if users else []
+        cum_weights = zipf_cum_weights()
+        # Время сообщений монотонно растет, как при реальной записи
+        step = span / max(messages, 1)
+        batch, replies = [], []
+        for i, user_id in enumerate(authors):
+            message_id = message_id_for(i)
+            text = synthetic_text(rng, cum_weights)
+            answered = rng.random() < reply_ratio
+            batch.append((message_id, user_id, text, len(text), ts(i * step), int(answered)))
+            if answered:
+                replies.append((message_id, 1, "Ответ администратора", ts(i * step + 60)))
+            if len(batch) >= batch_size:
+                _flush(conn, batch, replies)
+                batch, replies = [], []
+        _flush(conn, batch, replies)
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def message_id_for(index: int) -> str:
+    """message_id синтетического сообщения с номером index"""
+    return f"s{index:07x}"
+
+
+def _flush(conn: sqlite3.Connection, messages: list, replies: list) -> None:
+    """Вставить накопленную пачку сообщений и ответов"""
+    conn.executemany(
+        "INSERT INTO messages (message_id, user_id, message_text, message_length, timestamp, "
+        "is_answered) VALUES (?, ?, ?, ?, ?, ?)", messages
+    )
+    conn.executemany(
+        "INSERT INTO admin_replies (message_id, admin_id, reply_text, timestamp) "
+        "VALUES (?, ?, ?, ?)", replies
+    )
@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+"""
+Нагрузочный тест веб-интерфейса: Flask (web_app) против ASGI (web_asgi)
+
+Варианты: flask - встроенный сервер Flask (python web_app.py), gunicorn -
+web_app под gunicorn с --workers синхронными воркерами, asgi - web_asgi
+под uvicorn с --workers воркерами. Каждый сервер запускается отдельным
+процессом на синтетической базе, Telegram заменен benchmarks.fake_telegram
+с задержкой --telegram-latency. concurrency клиентов в течение --seconds шлют смесь запросов:
+страница чатов, статистика, сообщения пользователя и (доля --send-ratio)
+POST /api/send_message. Считаются запросы в секунду и задержки.
+
+Запуск:
+    python -m benchmarks.web_load --seconds 10 --concurrency 32
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+from benchmarks.fake_telegram import FakeTelegramServer
+from benchmarks.utils import seed_database, summarize
+from database import Database
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SERVERS = {
+    "flask": lambda port, workers: [
+        sys.executable, "-c",
+        f"import web_app; web_app.app.run(host='127.0.0.1', port={port}, threaded=True)",
+    ],
+    # Рекомендованный в WEB_INTERFACE.md продакшен-запуск: синхронные воркеры
+    "gunicorn": lambda port, workers: [
+        sys.executable, "-m", "gunicorn", "web_app:app", "-b", f"127.0.0.1:{port}",
+        "-w", str(workers), "--log-level", "warning",
+    ],
+    "asgi": lambda port, workers: [
+        sys.executable, "-m", "uvicorn", "web_asgi:app", "--host", "127.0.0.1",
+        "--port", str(port), "--workers", str(workers), "--log-level", "warning",
+    ],
+}
+
+
+def start_server(name, port, workers, cwd, env):
+    process = subprocess.Popen(SERVERS[name](port, workers), cwd=cwd, env=env,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.time() + 30
+    while time.time() < deadline:
+        try:
+            httpx.get(f"http://127.0.0.1:{port}/api/stats", timeout=1)
+            return process
+        except httpx.TransportError:
+            time.sleep(0.2)
+    process.kill()
+    raise RuntimeError(f"{name}: сервер не запустился")
+
+
+async def load(base_url, seconds, concurrency, users, send_ratio):
+    latencies, errors = [], 0
+    deadline = time.monotonic() + seconds
+    rng = random.Random(1)
+
+    async def worker(client):
+        nonlocal errors
+        while time.monotonic() < deadline:
+            user_id = 100000 + rng.randrange(users)
+            roll = rng.random()
+            start = time.perf_counter()
+            try:
+                if roll < send_ratio:
+                    response = await client.post("/api/send_message",
+                                                 json={"user_id": user_id, "message_text": "load"})
+                elif roll < 0.5:
+                    response = await client.get("/api/chats?limit=50")
+                elif roll < 0.75:
+                    response = await client.get(f"/api/messages/{user_id}?limit=50")
+                else:
+                    response = await client.get("/api/stats")
+                if response.status_code != 200:
+                    errors += 1
+                    continue
+                latencies.append(time.perf_counter() - start)
+            except httpx.HTTPError:
+                errors += 1
+
+    limits = httpx.Limits(max_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=60) as client:
+        start = time.monotonic()
+        await asyncio.gather(*(worker(client) for _ in range(concurrency)))
+        elapsed = time.monotonic() - start
+    return {"rps": round(len(latencies) / elapsed, 1), **summarize(latencies, errors)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--seconds", type=float, default=10.0)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--users", type=int, default=2000)
+    parser.add_argument("--messages", type=int, default=50000)
+    parser.add_argument("--telegram-latency", type=float, default=0.3, help="задержка Bot API, секунды")
+    parser.add_argument("--send-ratio", type=float, default=0.1, help="доля POST /api/send_message")
+    parser.add_argument("--workers", type=int, default=4, help="воркеры gunicorn и uvicorn")
+    parser.add_argument("--servers", default="flask,gunicorn,asgi")
+    parser.add_argument("--port", type=int, default=5055)
+    args = parser.parse_args()
+
+    report = []
+    with tempfile.TemporaryDirectory() as tmp, \
+            FakeTelegramServer(latency=args.telegram_latency) as telegram:
+        db_path = os.path.join(tmp, "anonymous_bot.db")
+        Database(db_path).close()
+        seed_database(db_path, args.users, args.messages)
+
+        env = dict(os.environ, PYTHONPATH=ROOT, ADMIN_ID="1", TELEGRAM_BOT_TOKEN="123456:TEST",
+                   TELEGRAM_BASE_URL=telegram.base_url, TELEGRAM_POOL_SIZE=str(args.concurrency))
+        for name in args.servers.split(","):
+            process = start_server(name, args.port, args.workers, tmp, env)
+            try:
+                result = asyncio.run(load(f"http://127.0.0.1:{args.port}", args.seconds,
+                                          args.concurrency, args.users, args.send_ratio))
+            finally:
+                process.terminate()
+                process.wait()
+            report.append({"server": name, **result})
+
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк отправки ответов из веб-интерфейса через локальный Bot API
+
+Сравнивает прежний способ (новый Bot и asyncio.run() на каждый запрос)
+с общим BackgroundBot из telegram_client. Запросы идут в
+benchmarks.fake_telegram, который считает открытые TCP-соединения.
+Вариант "endpoint" прогоняет POST /api/send_message через тестовый
+клиент Flask (база - во временном каталоге).
+
+Запуск:
+    python -m benchmarks.web_reply --requests 200 --latency 0.01
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import tempfile
+import time
+
+from telegram import Bot
+
+from benchmarks.fake_telegram import FakeTelegramServer
+from benchmarks.utils import summarize
+from telegram_client import BackgroundBot
+
+TOKEN = "123456:TEST"
+
+
+def legacy_send(base_url, chat_id, text):
+    """Прежняя реализация web_app.send_reply"""
+    bot = Bot(token=TOKEN, base_url=base_url)
+
+    async def send_message():
+        await bot.send_message(chat_id=chat_id, text=text)
+
+    asyncio.run(send_message())
+
+
+def measure(server, send, requests):
+    connections = server.connections
+    latencies = []
+    start = time.perf_counter()
+    for i in range(requests):
+        t = time.perf_counter()
+        send(100000 + i, f"reply {i}")
+        latencies.append(time.perf_counter() - t)
+    return {
+        "seconds": round(time.perf_counter() - start, 3),
+        "connections": server.connections - connections,
+        **summarize(latencies),
+    }
+
+
+def run_endpoint(base_url, requests):
+    """POST /api/send_message в web_app с общим клиентом"""
+    os.environ.update({"TELEGRAM_BOT_TOKEN": TOKEN, "TELEGRAM_BASE_URL": base_url,
+                       "ADMIN_ID": os.getenv("ADMIN_ID", "1")})
+    import web_app
+
+    client = web_app.app.test_client()
+
+    def send(chat_id, text):
+        response = client.post("/api/send_message", json={"user_id": chat_id, "message_text": text})
+        assert response.status_code == 200, response.get_json()
+
+    return client, send, web_app
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--latency", type=float, default=0.01, help="задержка Bot API, секунды")
+    args = parser.parse_args()
+
+    report = []
+    with FakeTelegramServer(latency=args.latency) as server:
+        report.append({"variant": "legacy", **measure(
+            server, lambda chat_id, text: legacy_send(server.base_url, chat_id, text), args.requests)})
+
+        shared = BackgroundBot(TOKEN, base_url=server.base_url)
+        report.append({"variant": "shared", **measure(server, shared.send_message, args.requests)})
+        shared.close()
+
+        with tempfile.TemporaryDirectory() as tmp:
+            cwd = os.getcwd()
+            os.chdir(tmp)  # web_app открывает anonymous_bot.db в текущем каталоге
+            try:
+                _, send, web_app = run_endpoint(server.base_url, args.requests)
+                report.append({"variant": "endpoint", **measure(server, send, args.requests)})
+                web_app.telegram_bot.close()
+                web_app.db.close()
+            finally:
+                os.chdir(cwd)
+
+        assert len(server.sent) == 3 * args.requests
+
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+"""
+Отправка записанных апдейтов на вебхук бота
+
+Читает апдейты из файла (по одному JSON на строку) или генерирует
+синтетические и отправляет их POST-запросами с заголовком секрета, как
+это делает Telegram. Печатает задержки ответа вебхука.
+
+Запуск (бот и заглушка Bot API - в отдельных терминалах):
+    python -m benchmarks.fake_telegram --port 8081
+    TELEGRAM_BASE_URL=http://127.0.0.1:8081/bot WEBHOOK_URL=http://127.0.0.1:8443 \\
+        WEBHOOK_SECRET=test python bot.py --mode webhook
+    python -m benchmarks.webhook_replay --url http://127.0.0.1:8443/telegram --secret test
+"""
+
+import argparse
+import asyncio
+import json
+import time
+
+import httpx
+
+from benchmarks.updates import load_updates, synthetic_updates
+from benchmarks.utils import summarize
+
+
+async def replay(url, secret, updates, concurrency):
+    latencies, errors = [], 0
+    semaphore = asyncio.Semaphore(concurrency)
+    headers = {"X-Telegram-Bot-Api-Secret-Token": secret} if secret else {}
+
+    async with httpx.AsyncClient(timeout=30) as client:
+        async def post(update):
+            nonlocal errors
+            async with semaphore:
+                start = time.perf_counter()
+                try:
+                    response = await client.post(url, json=update, headers=headers)
+                    if response.status_code != 200:
+                        errors += 1
+                        return
+                    latencies.append(time.perf_counter() - start)
+                except httpx.HTTPError:
+                    errors += 1
+
+        start = time.perf_counter()
+        await asyncio.gather(*(post(update) for update in updates))
+        elapsed = time.perf_counter() - start
+
+    return {"seconds": round(elapsed, 3), **summarize(latencies, errors)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://127.0.0.1:8443/telegram")
+    parser.add_argument("--secret", default=None, help="WEBHOOK_SECRET бота")
+    parser.add_argument("--file", default=None, help="файл с апдейтами (JSON на строку)")
+    parser.add_argument("--count", type=int, default=100, help="число синтетических апдейтов")
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--concurrency", type=int, default=1, help="одновременных POST")
+    args = parser.parse_args()
+
+    updates = list(load_updates(args.file)) if args.file else synthetic_updates(args.count, args.users)
+    print(json.dumps(asyncio.run(replay(args.url, args.secret, updates, args.concurrency)), indent=2))
+
+
+if __name__ == "__main__":
+    main()
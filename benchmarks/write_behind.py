@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк отложенной записи: коммит на каждый вызов против пачек WriteBehindQueue
+
+Имитирует поток апдейтов: concurrency корутин одновременно пишут
+пользователя и сообщение через AsyncDatabase. Сравниваются варианты:
+  direct      - прежнее поведение, коммит на каждую операцию;
+  group       - write-behind, add_message ждет коммита своей пачки;
+  async       - write-behind без ожидания коммита (DB_SYNC_COMMIT=0).
+
+Запуск:
+    python -m benchmarks.write_behind --updates 5000 --synchronous FULL
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import tempfile
+import time
+
+from benchmarks.utils import summarize
+from database import Database, AsyncDatabase, DEFAULT_PRAGMAS
+
+
+VARIANTS = {
+    "direct": {"write_behind": False},
+    "group": {"write_behind": True, "sync_commit": True},
+    "async": {"write_behind": True, "sync_commit": False},
+}
+
+
+async def run_variant(db, updates, concurrency, users):
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+
+    async def one(i):
+        async with semaphore:
+            start = time.perf_counter()
+            await db.add_or_update_user(i % users, username=f"user{i % users}")
+            await db.add_message(f"wb{i}", i % users, "x" * 200)
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(updates)))
+    elapsed = time.perf_counter() - start
+    return elapsed, latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--updates", type=int, default=5000)
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--synchronous", default="FULL", help="PRAGMA synchronous для прогона")
+    parser.add_argument("--flush-ms", type=int, default=50)
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--variants", default="direct,group,async")
+    args = parser.parse_args()
+
+    pragmas = dict(DEFAULT_PRAGMAS, synchronous=args.synchronous)
+    report = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for name in args.variants.split(","):
+            db = AsyncDatabase(Database(os.path.join(tmp, f"{name}.db"), pragmas=pragmas),
+                               flush_interval=args.flush_ms / 1000, batch_size=args.batch_size,
+                               **VARIANTS[name])
+            elapsed, latencies = asyncio.run(run_variant(db, args.updates, args.concurrency, args.users))
+            # Время закрытия включает запись остатка очереди
+            start = time.perf_counter()
+            db.close()
+            elapsed += time.perf_counter() - start
+
+            stored = Database(os.path.join(tmp, f"{name}.db"), pragmas=pragmas)
+            messages = stored.get_stats()["total_messages"]
+            stored.close()
+            report.append({
+                "variant": name,
+                "seconds": round(elapsed, 3),
+                "updates_per_sec": round(args.updates / elapsed, 1),
+                "stored_messages": messages,
+                **summarize(latencies, 0),
+            })
+
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -4,16 +4,32 @@ Anonymous Bot - Telegram бот для анонимных сообщений
 Версия 2.0 с SQLite базой данных
 """
 
+import argparse
+import asyncio
+import html
 import os
 import logging
+import queue
+import secrets
+import signal
+import time
 import uuid
+from collections import OrderedDict
+from typing import Dict, Optional
 from dotenv import load_dotenv
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
+from telegram.error import BadRequest
 from telegram.ext import (
     Application, CommandHandler, MessageHandler,
     ContextTypes, ConversationHandler, CallbackQueryHandler, filters
 )
-from database import Database
+from database import Database, AsyncDatabase
+from broadcast import Broadcaster
+from recipients import RecipientRegistry
+from state_store import StatePersistence, state_store_from_env
+from telegram_client import DEFAULT_BASE_URL
+from update_processor import PerChatUpdateProcessor
+from loop_monitor import LoopLagMonitor
 
 # Загружаем переменные окружения
 load_dotenv()
@@ -25,80 +41,219 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-# Глобальная переменная для хранения application (нужна для отправки логов)
-_bot_application = None
-
-
 class TelegramLogHandler(logging.Handler):
-    """Кастомный обработчик логов, который отправляет WARNING и ERROR в Telegram"""
+    """Обработчик логов, который присылает WARNING и ERROR в Telegram сводками
 
-    def __init__(self, admin_id: int):
+    emit() только кладет запись в ограниченную очередь и не блокирует
+    (его можно вызывать из любого потока). Фоновая задача в event loop бота
+    раз в interval секунд забирает накопленное, схлопывает одинаковые
+    сообщения со счетчиком и отправляет одно сообщение-сводку. Если очередь
+    переполнена, лишние записи отбрасываются, а в сводке указывается их число.
+    """
+
+    def __init__(self, admin_id: int, interval: float = 10.0, max_queue: int = 1000,
+                 max_length: int = 3800):
         super().__init__()
         self.admin_id = admin_id
+        self.interval = interval
+        self.max_length = max_length
         self.setLevel(logging.WARNING)  # Отправляем только WARNING и ERROR
+        self._queue: queue.Queue = queue.Queue(maxsize=max_queue)
+        self._dropped = 0
+        self._bot = None
+        self._task: Optional[asyncio.Task] = None
 
     def emit(self, record):
-        """Отправляет лог-сообщение в Telegram"""
-        global _bot_application
-
-        if _bot_application is None:
-            return
-
+        """Ставит запись в очередь на отправку"""
         try:
-            log_entry = self.format(record)
-            error_type = "⚠️ WARNING" if record.levelno == logging.WARNING else "🔴 ERROR"
-
-            # Ограничиваем длину
-            if len(log_entry) > 3800:
-                log_entry = log_entry[:3800] + "\n... (обрезано)"
-
-            message = f"{error_type}\n\n<code>{log_entry}</code>"
+            # Ключ для схлопывания - без времени, текст - первое вхождение целиком
+            key = (record.levelno, record.name, record.getMessage())
+            self._queue.put_nowait((key, self.format(record)))
+        except queue.Full:
+            self._dropped += 1
+        except Exception:
+            # Не логируем ошибки в самом обработчике логов, чтобы избежать рекурсии
+            pass
 
-            # Отправляем асинхронно
-            import asyncio
+    def start(self, bot) -> asyncio.Task:
+        """Запустить отправку сводок через bot в текущем event loop"""
+        self._bot = bot
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run())
+        return self._task
+
+    async def stop(self):
+        """Остановить отправку, предварительно отправив накопленное"""
+        if self._task is not None:
+            self._task.cancel()
             try:
-                loop = asyncio.get_event_loop()
-                if loop.is_running():
-                    # Если цикл уже запущен, создаем задачу
-                    asyncio.create_task(
-                        _bot_application.bot.send_message(
-                            chat_id=self.admin_id,
-                            text=message,
-                            parse_mode='HTML'
-                        )
-                    )
-                else:
-                    # Если цикла нет, запускаем синхронно
-                    loop.run_until_complete(
-                        _bot_application.bot.send_message(
-                            chat_id=self.admin_id,
-                            text=message,
-                            parse_mode='HTML'
-                        )
-                    )
-            except Exception:
-                # Если не получилось отправить, просто игнорируем
+                await self._task
+            except asyncio.CancelledError:
                 pass
-
+            self._task = None
+        await self.flush_digest()
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            await self.flush_digest()
+
+    def _drain(self):
+        """Забрать все из очереди: [(key, текст, количество)] в порядке появления"""
+        entries: Dict[tuple, list] = {}
+        while True:
+            try:
+                key, text = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if key in entries:
+                entries[key][1] += 1
+            else:
+                entries[key] = [text, 1]
+        return [(key, text, count) for key, (text, count) in entries.items()]
+
+    def build_digest(self) -> Optional[str]:
+        """Текст сводки из накопленных записей (None, если отправлять нечего)"""
+        entries = self._drain()
+        dropped, self._dropped = self._dropped, 0
+        if not entries and not dropped:
+            return None
+
+        total = sum(count for _, _, count in entries) + dropped
+        header = f"📋 Логи за {self.interval:.0f} с: {total} записей"
+        if dropped:
+            header += f" (отброшено при переполнении: {dropped})"
+
+        parts = [header]
+        length = len(header)
+        for index, ((levelno, _, _), text, count) in enumerate(entries):
+            error_type = "⚠️ WARNING" if levelno == logging.WARNING else "🔴 ERROR"
+            repeat = f" ×{count}" if count > 1 else ""
+            part = f"{error_type}{repeat}\n<code>{html.escape(text)}</code>"
+            if length + len(part) > self.max_length:
+                # Ограничиваем длину (лимит Telegram - 4096 символов)
+                parts.append(f"... и еще {len(entries) - index} сообщений (обрезано)")
+                break
+            parts.append(part)
+            length += len(part)
+
+        return "\n\n".join(parts)
+
+    async def flush_digest(self):
+        """Отправить одну сводку из всего, что накопилось"""
+        digest = self.build_digest()
+        if digest is None or self._bot is None:
+            return
+        try:
+            await self._bot.send_message(chat_id=self.admin_id, text=digest, parse_mode='HTML')
         except Exception:
-            # Не логируем ошибки в самом обработчике логов, чтобы избежать рекурсии
+            # Если не получилось отправить, просто игнорируем
             pass
 
+
 # Состояния для ConversationHandler
 WAITING_FOR_MESSAGE = 1
 WAITING_FOR_REPLY = 2
 
-# Глобальные переменные
-user_message = {}
-admin_awaiting_reply = {}  # {admin_id: message_id}
+# Сообщений на одной странице команды /messages
+MESSAGES_PAGE_SIZE = 10
+# Результатов поиска в ответе на /search
+SEARCH_RESULTS_LIMIT = 10
 
-# Инициализация базы данных
-db = Database()
+# Инициализация базы данных (обращения к диску выполняются вне event loop)
+db = AsyncDatabase.from_env(Database())
 logger.info("✅ База данных SQLite инициализирована")
 
+# Состояние диалогов: {admin_id: message_id} в AWAITING_REPLY. При
+# STATE_STORE=sqlite оно переживает перезапуск и общее для всех процессов бота
+state_store = state_store_from_env(db)
+AWAITING_REPLY = "awaiting_reply"
+
+
+class UserProfileCache:
+    """LRU-кэш последнего сохраненного профиля пользователя
+
+    Позволяет не перезаписывать строку users на каждое сообщение: запись
+    нужна, только если изменилось одно из полей профиля или last_seen в базе
+    старше granularity секунд.
+    """
+
+    def __init__(self, max_size: int = 10000, granularity: float = 300.0):
+        self.max_size = max_size
+        self.granularity = granularity
+        self._profiles = OrderedDict()  # {user_id: (профиль, время записи)}
+
+    def is_fresh(self, user_id: int, profile: tuple) -> bool:
+        """True, если такой профиль уже записан не раньше granularity секунд назад"""
+        cached = self._profiles.get(user_id)
+        if cached is None:
+            return False
+        self._profiles.move_to_end(user_id)
+        saved_profile, saved_at = cached
+        return saved_profile == profile and time.monotonic() - saved_at < self.granularity
+
+    def remember(self, user_id: int, profile: tuple):
+        """Запомнить профиль после успешной записи в базу"""
+        self._profiles[user_id] = (profile, time.monotonic())
+        self._profiles.move_to_end(user_id)
+        if len(self._profiles) > self.max_size:
+            self._profiles.popitem(last=False)
+
+
+profile_cache = UserProfileCache(
+    max_size=int(os.getenv('PROFILE_CACHE_SIZE', 10000)),
+    granularity=float(os.getenv('LAST_SEEN_GRANULARITY', 300))
+)
+
+
+async def save_user(user) -> None:
+    """Сохранить пользователя в базу, если профиль изменился или устарел last_seen"""
+    profile = (
+        user.username,
+        user.first_name,
+        user.last_name,
+        user.full_name,
+        user.is_bot,
+        user.is_premium if hasattr(user, 'is_premium') else False,
+        user.language_code
+    )
+    if profile_cache.is_fresh(user.id, profile):
+        return
+
+    username, first_name, last_name, full_name, is_bot, is_premium, language_code = profile
+    await db.add_or_update_user(
+        user_id=user.id,
+        username=username,
+        first_name=first_name,
+        last_name=last_name,
+        full_name=full_name,
+        is_bot=is_bot,
+        is_premium=is_premium,
+        language_code=language_code
+    )
+    profile_cache.remember(user.id, profile)
+
+
+# Рассылка получателям (параллельно, с учетом лимитов Telegram)
+broadcaster = Broadcaster.from_env()
+
+# Получатели анонимных сообщений (.env + таблица recipients)
+recipient_registry = RecipientRegistry(db)
+
+# Измерение задержки event loop
+loop_monitor = LoopLagMonitor()
+
 # ID администратора для отправки ошибок
 ERROR_REPORT_ADMIN_ID = 1873601165
 
+# WARNING и ERROR уходят администратору сводкой раз в LOG_DIGEST_INTERVAL секунд
+telegram_log_handler = TelegramLogHandler(
+    ERROR_REPORT_ADMIN_ID,
+    interval=float(os.getenv('LOG_DIGEST_INTERVAL', 10)),
+    max_queue=int(os.getenv('LOG_QUEUE_SIZE', 1000))
+)
+telegram_log_handler.setFormatter(logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s'))
+
 
 async def send_error_to_admin(context: ContextTypes.DEFAULT_TYPE, error_message: str, error_type: str = "ERROR") -> None:
     """Отправляет сообщение об ошибке администратору"""
@@ -150,23 +305,8 @@ async def error_handler(update: object, context: ContextTypes.DEFAULT_TYPE) -> N
 
 
 def get_recipients():
-    """Получает список ID получателей из переменной окружения"""
-    recipients_str = os.getenv('RECIPIENTS', os.getenv('ADMIN_ID', ''))
-    if not recipients_str:
-        logger.error("❌ Не указаны получатели сообщений (RECIPIENTS или ADMIN_ID)")
-        return []
-
-    recipients = []
-    for recipient_id in recipients_str.split(','):
-        recipient_id = recipient_id.strip()
-        if recipient_id:
-            try:
-                recipients.append(int(recipient_id))
-            except ValueError:
-                logger.warning(f"⚠️ Некорректный ID получателя: {recipient_id}")
-
-    logger.info(f"📋 Получатели сообщений: {recipients}")
-    return recipients
+    """Текущий набор ID получателей (frozenset, загружается при старте и по SIGHUP)"""
+    return recipient_registry.ids
 
 
 def generate_message_id():
@@ -177,24 +317,14 @@ def generate_message_id():
 async def send_to_all_recipients(context, text, reply_markup=None, parse_mode='HTML'):
     """Отправляет сообщение всем получателям (администраторам и группам)"""
     recipients = get_recipients()
-    success_count = 0
-    failed_recipients = []
 
-    for recipient_id in recipients:
-        try:
-            await context.bot.send_message(
-                chat_id=recipient_id,
-                text=text,
-                reply_markup=reply_markup,
-                parse_mode=parse_mode
-            )
-            success_count += 1
-            logger.info(f"✅ Сообщение отправлено получателю {recipient_id}")
-        except Exception as e:
-            logger.error(f"❌ Ошибка отправки получателю {recipient_id}: {e}")
-            failed_recipients.append(recipient_id)
-
-    return success_count, failed_recipients
+    return await broadcaster.send(
+        context.bot,
+        recipients,
+        text=text,
+        reply_markup=reply_markup,
+        parse_mode=parse_mode
+    )
 
 
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
@@ -204,16 +334,7 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     admin_id = int(os.getenv('ADMIN_ID'))
 
     # Сохраняем информацию о пользователе в базу данных
-    db.add_or_update_user(
-        user_id=user_id,
-        username=user.username,
-        first_name=user.first_name,
-        last_name=user.last_name,
-        full_name=user.full_name,
-        is_bot=user.is_bot,
-        is_premium=user.is_premium if hasattr(user, 'is_premium') else False,
-        language_code=user.language_code
-    )
+    await save_user(user)
 
     logger.info(f"👤 Пользователь {user_id} ({user.full_name}) использовал /start")
 
@@ -321,19 +442,10 @@ async def receive_message(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
         message_id = generate_message_id()
 
         # Обновляем информацию о пользователе
-        db.add_or_update_user(
-            user_id=user_id,
-            username=user.username,
-            first_name=user.first_name,
-            last_name=user.last_name,
-            full_name=user.full_name,
-            is_bot=user.is_bot,
-            is_premium=user.is_premium if hasattr(user, 'is_premium') else False,
-            language_code=user.language_code
-        )
+        await save_user(user)
 
         # Сохраняем сообщение в базу данных
-        db.add_message(
+        await db.add_message(
             message_id=message_id,
             user_id=user_id,
             message_text=message_text,
@@ -393,14 +505,14 @@ async def reply_button_pressed(update: Update, context: ContextTypes.DEFAULT_TYP
     logger.info(f"🔘 Администратор {admin_id} нажал кнопку 'Ответить' для сообщения {message_id}")
 
     # Проверяем, что сообщение существует в базе данных
-    message = db.get_message(message_id)
+    message = await db.get_message(message_id)
     if not message:
         await query.answer("❌ Сообщение не найдено в базе данных", show_alert=True)
         logger.warning(f"⚠️ Сообщение {message_id} не найдено в БД")
         return ConversationHandler.END
 
     # Сохраняем информацию о том, что администратор ждет ответа
-    admin_awaiting_reply[admin_id] = message_id
+    await state_store.set(AWAITING_REPLY, admin_id, message_id)
     logger.info(f"✅ Администратор {admin_id} переведен в состояние WAITING_FOR_REPLY для сообщения {message_id}")
 
     # Отправляем новое сообщение с запросом ответа (не изменяем оригинальное)
@@ -419,22 +531,22 @@ async def receive_reply(update: Update, context: ContextTypes.DEFAULT_TYPE) -> i
 
     logger.info(f"📝 Получен текст от администратора {admin_id} в состоянии WAITING_FOR_REPLY")
 
-    if admin_id not in admin_awaiting_reply:
-        logger.error(f"❌ Администратор {admin_id} не найден в admin_awaiting_reply")
+    message_id = await state_store.get(AWAITING_REPLY, admin_id)
+    if message_id is None:
+        logger.error(f"❌ Для администратора {admin_id} нет ожидающего ответа (истек или отменен)")
         await update.message.reply_text("❌ Ошибка: сеанс ответа не найден")
         return ConversationHandler.END
 
     reply_text = update.message.text
-    message_id = admin_awaiting_reply[admin_id]
 
     logger.info(f"📨 Администратор {admin_id} отправляет ответ на сообщение {message_id}: {reply_text[:50]}...")
 
     # Получаем сообщение из базы данных
-    message = db.get_message(message_id)
+    message = await db.get_message(message_id)
     if not message:
         logger.error(f"❌ Сообщение {message_id} не найдено в БД")
         await update.message.reply_text("❌ Исходное сообщение не найдено")
-        del admin_awaiting_reply[admin_id]
+        await state_store.delete(AWAITING_REPLY, admin_id)
         return ConversationHandler.END
 
     try:
@@ -447,7 +559,7 @@ async def receive_reply(update: Update, context: ContextTypes.DEFAULT_TYPE) -> i
         )
 
         # Сохраняем ответ администратора в базу данных
-        db.add_admin_reply(
+        await db.add_admin_reply(
             message_id=message_id,
             admin_id=admin_id,
             reply_text=reply_text
@@ -457,7 +569,7 @@ async def receive_reply(update: Update, context: ContextTypes.DEFAULT_TYPE) -> i
         await update.message.reply_text("✅ Ответ отправлен пользователю!")
 
         # Удаляем из очереди ожидания
-        del admin_awaiting_reply[admin_id]
+        await state_store.delete(AWAITING_REPLY, admin_id)
 
     except Exception as e:
         logger.error(f"Ошибка при отправке ответа: {e}")
@@ -465,8 +577,7 @@ async def receive_reply(update: Update, context: ContextTypes.DEFAULT_TYPE) -> i
             f"❌ Ошибка при отправке ответа: {e}\nПопробуйте позже."
         )
         # Удаляем из очереди ожидания даже при ошибке
-        if admin_id in admin_awaiting_reply:
-            del admin_awaiting_reply[admin_id]
+        await state_store.delete(AWAITING_REPLY, admin_id)
 
     return ConversationHandler.END
 
@@ -483,6 +594,8 @@ async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> No
 /help - Справка
 /myid - Узнать ваш ID
 /messages - Список сообщений в базе
+/search <слова> - Поиск по сообщениям и ответам
+/recipients - Получатели (reload, add <id>, remove <id>)
 
 📋 Как отвечать на сообщения:
 1. Дождитесь анонимного сообщения
@@ -519,6 +632,35 @@ async def myid_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> No
     await update.message.reply_text(f"🔍 Ваш ID: `{user_id}`", parse_mode="Markdown")
 
 
+async def render_messages_page(page: int):
+    """Текст и клавиатура страницы /messages (нумерация страниц с нуля)
+
+    Читается только сама страница и общее число сообщений, а не вся таблица.
+    """
+    total = await db.count_messages()
+    if not total:
+        return "📭 Нет сообщений в базе данных", None
+
+    pages = (total + MESSAGES_PAGE_SIZE - 1) // MESSAGES_PAGE_SIZE
+    page = max(0, min(page, pages - 1))
+    messages = await db.get_recent_messages(MESSAGES_PAGE_SIZE, page * MESSAGES_PAGE_SIZE)
+
+    message_list = f"📋 Сообщения в базе (страница {page + 1} из {pages}, всего {total}):\n\n"
+    for msg in messages:
+        message_text = msg['message_text']
+        message_list += f"ID: {msg['message_id']}\n"
+        message_list += f"От пользователя: {msg['user_id']}\n"
+        message_list += f"Сообщение: {message_text[:100]}{'...' if len(message_text) > 100 else ''}\n"
+        message_list += f"Статус: {'✅ Отвечено' if msg['has_reply'] else '⏳ Ожидает ответа'}\n\n"
+
+    buttons = []
+    if page > 0:
+        buttons.append(InlineKeyboardButton("⬅️ Новее", callback_data=f"messages_page_{page - 1}"))
+    if page < pages - 1:
+        buttons.append(InlineKeyboardButton("Старее ➡️", callback_data=f"messages_page_{page + 1}"))
+    return message_list, InlineKeyboardMarkup([buttons]) if buttons else None
+
+
 async def messages_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Обработчик команды /messages (только для администратора)"""
     user_id = update.effective_user.id
@@ -528,41 +670,110 @@ async def messages_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -
         await update.message.reply_text("❌ Эта команда доступна только администратору")
         return
 
-    # Получаем все сообщения из базы данных
-    messages = db.get_all_messages()
+    text, reply_markup = await render_messages_page(0)
+    await update.message.reply_text(text, reply_markup=reply_markup)
+
 
-    if not messages:
-        await update.message.reply_text("📭 Нет сообщений в базе данных")
+async def messages_page_pressed(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Обработчик кнопок листания списка /messages"""
+    query = update.callback_query
+
+    if query.from_user.id != int(os.getenv('ADMIN_ID')):
+        await query.answer("❌ Только для администратора", show_alert=True)
         return
 
-    message_list = "📋 Сообщения в базе:\n\n"
-    for msg in messages[:10]:  # Показываем только последние 10
-        message_id = msg['message_id']
-        user_id_msg = msg['user_id']
-        message_text = msg['message_text']
-        has_reply = db.has_reply(message_id)
+    await query.answer()
+    page = int(query.data[len("messages_page_"):])
+    text, reply_markup = await render_messages_page(page)
+    try:
+        await query.edit_message_text(text, reply_markup=reply_markup)
+    except BadRequest as e:
+        # Повторное нажатие той же кнопки: страница не изменилась
+        if "not modified" not in str(e).lower():
+            raise
 
-        message_list += f"ID: {message_id}\n"
-        message_list += f"От пользователя: {user_id_msg}\n"
-        message_list += f"Сообщение: {message_text[:100]}{'...' if len(message_text) > 100 else ''}\n"
-        message_list += f"Статус: {'✅ Отвечено' if has_reply else '⏳ Ожидает ответа'}\n\n"
 
-    if len(messages) > 10:
-        message_list += f"\n... и еще {len(messages) - 10} сообщений\n"
-        message_list += "\n🌐 Откройте веб-интерфейс для просмотра всех сообщений: http://localhost:5001"
+async def search_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Обработчик команды /search <запрос> (только для получателей)"""
+    if update.effective_user.id not in get_recipients():
+        await update.message.reply_text("❌ Эта команда доступна только получателям сообщений")
+        return
+
+    query = " ".join(context.args or [])
+    if not query.strip():
+        await update.message.reply_text("Использование: /search <слова> (слово* - поиск по началу слова)")
+        return
+
+    results = await db.search(query, limit=SEARCH_RESULTS_LIMIT)
+    if not results:
+        await update.message.reply_text("🔍 Ничего не найдено")
+        return
+
+    lines = [f"🔍 Результаты поиска «{html.escape(query)}»:\n"]
+    for result in results:
+        text = result['text']
+        author = html.escape(result['full_name'] or f"User {result['user_id']}")
+        if result['kind'] == 'reply':
+            header = f"↩️ Ответ пользователю {author} ({result['user_id']})"
+        else:
+            header = f"💬 От {author} ({result['user_id']})"
+        lines.append(
+            f"<b>{header}</b>, {result['timestamp']}\n"
+            f"ID: <code>{html.escape(result['message_id'])}</code>\n"
+            f"{html.escape(text[:200])}{'...' if len(text) > 200 else ''}\n"
+        )
+    await update.message.reply_text("\n".join(lines), parse_mode='HTML')
+
+
+async def recipients_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Обработчик команды /recipients (только для администратора)
+
+    /recipients - список, /recipients reload - перечитать .env и базу,
+    /recipients add <id>, /recipients remove <id> - изменить таблицу recipients.
+    """
+    user_id = update.effective_user.id
+    admin_id = int(os.getenv('ADMIN_ID'))
+
+    if user_id != admin_id:
+        await update.message.reply_text("❌ Эта команда доступна только администратору")
+        return
+
+    args = context.args or []
+    action = args[0].lower() if args else "list"
+
+    if action == "reload":
+        await recipient_registry.reload()
+    elif action in ("add", "remove") and len(args) == 2:
+        try:
+            chat_id = int(args[1])
+        except ValueError:
+            await update.message.reply_text(f"❌ Некорректный ID получателя: {args[1]}")
+            return
+        if action == "add":
+            changed = await recipient_registry.add(chat_id)
+        else:
+            changed = await recipient_registry.remove(chat_id)
+        if not changed:
+            await update.message.reply_text(
+                f"ℹ️ {chat_id} {'уже есть' if action == 'add' else 'нет'} в таблице получателей"
+            )
+        logger.info(f"📋 Получатель {chat_id}: {action} (администратор {user_id})")
+    elif action != "list":
+        await update.message.reply_text(
+            "Использование: /recipients [reload | add <id> | remove <id>]"
+        )
+        return
 
-    await update.message.reply_text(message_list)
+    recipients = sorted(recipient_registry.ids)
+    text = f"📋 Получатели ({len(recipients)}):\n" + "\n".join(str(chat_id) for chat_id in recipients)
+    await update.message.reply_text(text)
 
 
 async def cancel_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     """Обработчик команды /cancel"""
     user_id = update.effective_user.id
 
-    if user_id in user_message:
-        del user_message[user_id]
-
-    if user_id in admin_awaiting_reply:
-        del admin_awaiting_reply[user_id]
+    await state_store.delete(AWAITING_REPLY, user_id)
 
     await update.message.reply_text("❌ Операция отменена")
     return ConversationHandler.END
@@ -616,6 +827,11 @@ async def handle_any_message(update: Update, context: ContextTypes.DEFAULT_TYPE)
     # Если это сообщение от одного из получателей (администраторов), игнорируем
     # Это сообщение не должно обрабатываться как анонимное сообщение от пользователя
     if user_id in recipients:
+        # Разговор мог начаться в другом процессе бота (или до перезапуска,
+        # если PTB еще не сохранил состояние ConversationHandler)
+        if await state_store.get(AWAITING_REPLY, user_id) is not None:
+            await receive_reply(update, context)
+            return
         logger.debug(f"Игнорируем сообщение от получателя {user_id} (не в состоянии разговора)")
         return
 
@@ -627,22 +843,13 @@ async def handle_any_message(update: Update, context: ContextTypes.DEFAULT_TYPE)
     message_text = update.message.text
 
     # Обновляем информацию о пользователе
-    db.add_or_update_user(
-        user_id=user_id,
-        username=user.username,
-        first_name=user.first_name,
-        last_name=user.last_name,
-        full_name=user.full_name,
-        is_bot=user.is_bot,
-        is_premium=user.is_premium if hasattr(user, 'is_premium') else False,
-        language_code=user.language_code
-    )
+    await save_user(user)
 
     # Генерируем уникальный ID для сообщения
     message_id = generate_message_id()
 
     # Сохраняем сообщение в базу данных
-    db.add_message(
+    await db.add_message(
         message_id=message_id,
         user_id=user_id,
         message_text=message_text,
@@ -688,37 +895,43 @@ async def handle_any_message(update: Update, context: ContextTypes.DEFAULT_TYPE)
         )
 
 
-def main() -> None:
-    """Запуск бота"""
-    # Получаем токен из переменной окружения
-    token = os.getenv('TELEGRAM_BOT_TOKEN')
+async def post_init(application: Application) -> None:
+    """Запускается после инициализации приложения, в его event loop"""
+    loop_monitor.start()
+    telegram_log_handler.start(application.bot)
+    await recipient_registry.reload(reread_env=False)
 
-    if not token:
-        logger.error("TELEGRAM_BOT_TOKEN не установлен в .env файле!")
-        return
+    # kill -HUP <pid> перечитывает получателей без перезапуска
+    if hasattr(signal, 'SIGHUP'):
+        loop = asyncio.get_running_loop()
+        loop.add_signal_handler(signal.SIGHUP, lambda: loop.create_task(recipient_registry.reload()))
 
-    if not os.getenv('ADMIN_ID'):
-        logger.error("ADMIN_ID не установлен в .env файле!")
-        return
 
-    logger.info("✅ База данных SQLite готова к работе")
+async def post_stop(application: Application) -> None:
+    """Запускается после остановки приема апдейтов, пока Bot еще может отправлять"""
+    await telegram_log_handler.stop()
 
-    # Создаем приложение
-    application = Application.builder().token(token).build()
-
-    # Сохраняем application глобально для TelegramLogHandler
-    global _bot_application
-    _bot_application = application
 
-    # Добавляем Telegram обработчик для логов (WARNING и ERROR)
-    telegram_handler = TelegramLogHandler(ERROR_REPORT_ADMIN_ID)
-    telegram_handler.setFormatter(logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s'))
-    logger.addHandler(telegram_handler)
+async def post_shutdown(application: Application) -> None:
+    """Запускается при остановке бота"""
+    await loop_monitor.stop()
+    db.close()
 
-    # Также добавляем для root logger, чтобы ловить ошибки из других модулей
-    logging.getLogger().addHandler(telegram_handler)
 
-    logger.info(f"✅ Telegram обработчик логов настроен для администратора {ERROR_REPORT_ADMIN_ID}")
+def build_application(token: str) -> Application:
+    """Создать приложение с обработчиками бота"""
+    # Апдейты разных чатов обрабатываются параллельно, одного чата - по порядку
+    application = (
+        Application.builder()
+        .token(token)
+        .base_url(os.getenv('TELEGRAM_BASE_URL', DEFAULT_BASE_URL))
+        .concurrent_updates(PerChatUpdateProcessor.from_env())
+        .persistence(StatePersistence(state_store))
+        .post_init(post_init)
+        .post_stop(post_stop)
+        .post_shutdown(post_shutdown)
+        .build()
+    )
 
     # Добавляем обработчик ConversationHandler для отправки сообщений
     conv_handler = ConversationHandler(
@@ -737,6 +950,8 @@ def main() -> None:
             ],
         },
         fallbacks=[CommandHandler("cancel", cancel_command)],
+        name="anonymous_conversation",
+        persistent=True,
         per_message=False,
         per_chat=True,
         per_user=True,
@@ -747,6 +962,9 @@ def main() -> None:
     application.add_handler(CommandHandler("help", help_command))
     application.add_handler(CommandHandler("myid", myid_command))
     application.add_handler(CommandHandler("messages", messages_command))
+    application.add_handler(CallbackQueryHandler(messages_page_pressed, pattern=r"^messages_page_\d+$"))
+    application.add_handler(CommandHandler("recipients", recipients_command))
+    application.add_handler(CommandHandler("search", search_command))
     application.add_handler(CommandHandler("test_error", test_error_command))
 
     # ВАЖНО: ConversationHandler должен быть зарегистрирован ПЕРЕД общим обработчиком
@@ -762,9 +980,81 @@ def main() -> None:
     application.add_error_handler(error_handler)
     logger.info("✅ Обработчик ошибок зарегистрирован")
 
+    return application
+
+
+def run_webhook(application: Application) -> None:
+    """Получать апдейты через вебхук вместо long polling
+
+    Telegram присылает апдейты POST-запросами на WEBHOOK_URL/WEBHOOK_PATH,
+    встроенный сервер PTB слушает WEBHOOK_LISTEN:WEBHOOK_PORT (обычно за
+    reverse proxy с HTTPS) и проверяет заголовок с WEBHOOK_SECRET.
+    При старте вызывается setWebhook; накопившиеся апдейты не сбрасываются,
+    поэтому переключение с polling проходит без потерь. Обратно на polling
+    переключает run_polling: он сам вызывает deleteWebhook.
+    """
+    webhook_url = os.getenv('WEBHOOK_URL')
+    if not webhook_url:
+        logger.error("WEBHOOK_URL не установлен в .env файле!")
+        return
+
+    url_path = os.getenv('WEBHOOK_PATH', 'telegram').strip('/')
+    secret_token = os.getenv('WEBHOOK_SECRET')
+    if not secret_token:
+        # Без постоянного секрета генерируем новый: setWebhook передает его Telegram
+        secret_token = secrets.token_urlsafe(32)
+        logger.warning("⚠️ WEBHOOK_SECRET не задан, используется случайный секрет")
+
+    listen = os.getenv('WEBHOOK_LISTEN', '0.0.0.0')
+    port = int(os.getenv('WEBHOOK_PORT', '8443'))
+    logger.info(f"🤖 Бот запущен (webhook {webhook_url.rstrip('/')}/{url_path}, слушает {listen}:{port})...")
+    application.run_webhook(
+        listen=listen,
+        port=port,
+        url_path=url_path,
+        webhook_url=f"{webhook_url.rstrip('/')}/{url_path}",
+        secret_token=secret_token,
+        drop_pending_updates=False,
+    )
+
+
+def main(argv=None) -> None:
+    """Запуск бота"""
+    parser = argparse.ArgumentParser(description="Anonymous Bot")
+    parser.add_argument(
+        '--mode', choices=['polling', 'webhook'], default=os.getenv('BOT_MODE', 'polling'),
+        help="способ получения апдейтов (по умолчанию BOT_MODE или polling)"
+    )
+    args = parser.parse_args(argv)
+
+    # Получаем токен из переменной окружения
+    token = os.getenv('TELEGRAM_BOT_TOKEN')
+
+    if not token:
+        logger.error("TELEGRAM_BOT_TOKEN не установлен в .env файле!")
+        return
+
+    if not os.getenv('ADMIN_ID'):
+        logger.error("ADMIN_ID не установлен в .env файле!")
+        return
+
+    logger.info("✅ База данных SQLite готова к работе")
+
+    # Создаем приложение
+    application = build_application(token)
+
+    # Добавляем Telegram обработчик для логов (WARNING и ERROR) к root logger:
+    # записи этого и остальных модулей попадают в него через propagate
+    logging.getLogger().addHandler(telegram_log_handler)
+
+    logger.info(f"✅ Telegram обработчик логов настроен для администратора {ERROR_REPORT_ADMIN_ID}")
+
     # Запускаем бота
-    logger.info("🤖 Бот запущен...")
-    application.run_polling()
+    if args.mode == 'webhook':
+        run_webhook(application)
+    else:
+        logger.info("🤖 Бот запущен...")
+        application.run_polling()
 
 
 if __name__ == '__main__':
@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+"""
+Broadcast module для Anonymous Bot
+Параллельная рассылка сообщений получателям с учетом ограничений Telegram
+"""
+
+import asyncio
+import logging
+import os
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from telegram.error import RetryAfter
+
+logger = logging.getLogger(__name__)
+
+# Ограничения Telegram Bot API (https://core.telegram.org/bots/faq):
+# около 30 сообщений в секунду всего, не чаще 1 в секунду в один чат
+# и не больше 20 в минуту в одну группу
+DEFAULT_CONCURRENCY = 8
+DEFAULT_GLOBAL_RATE = 30.0
+DEFAULT_CHAT_RATE = 1.0
+DEFAULT_GROUP_RATE = 20 / 60
+DEFAULT_MAX_ATTEMPTS = 3
+
+
+class TokenBucket:
+    """Ведро токенов: в среднем не больше rate операций в секунду,
+    всплеск - до capacity операций подряд"""
+
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(1.0, rate)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._blocked_until = 0.0
+        self._lock = asyncio.Lock()
+
+    def pause(self, seconds: float):
+        """Не выдавать токены seconds секунд (после RetryAfter от Telegram)"""
+        self._blocked_until = max(self._blocked_until, time.monotonic() + seconds)
+        self._tokens = 0.0
+
+    async def acquire(self):
+        """Дождаться и забрать один токен"""
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if now < self._blocked_until:
+                    await asyncio.sleep(self._blocked_until - now)
+                    continue
+
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+def _retry_after_seconds(error: RetryAfter) -> float:
+    """RetryAfter.retry_after в секундах (int в PTB 21, timedelta в новых версиях)"""
+    retry_after = error.retry_after
+    if hasattr(retry_after, "total_seconds"):
+        return retry_after.total_seconds()
+    return float(retry_after)
+
+
+class Broadcaster:
+    """Рассылка одного сообщения многим получателям
+
+    Отправки идут параллельно (не больше concurrency одновременно), но
+    через общее ведро токенов на весь бот и отдельное ведро на каждый чат.
+    При RetryAfter чат ставится на паузу, а отправка возвращается в очередь
+    (не больше max_attempts попыток на получателя).
+    """
+
+    def __init__(self, concurrency: int = DEFAULT_CONCURRENCY,
+                 global_rate: float = DEFAULT_GLOBAL_RATE,
+                 chat_rate: float = DEFAULT_CHAT_RATE,
+                 group_rate: float = DEFAULT_GROUP_RATE,
+                 max_attempts: int = DEFAULT_MAX_ATTEMPTS):
+        self.concurrency = concurrency
+        self.chat_rate = chat_rate
+        self.group_rate = group_rate
+        self.max_attempts = max_attempts
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self._global_bucket = TokenBucket(global_rate)
+        self._chat_buckets: Dict[int, TokenBucket] = {}
+
+    @classmethod
+    def from_env(cls) -> "Broadcaster":
+        """Создать рассыльщик с настройками из переменных окружения
+
+        SEND_CONCURRENCY, TELEGRAM_GLOBAL_RATE, TELEGRAM_CHAT_RATE,
+        TELEGRAM_GROUP_RATE (сообщений в секунду), SEND_MAX_ATTEMPTS.
+        """
+        return cls(
+            concurrency=int(os.getenv("SEND_CONCURRENCY", DEFAULT_CONCURRENCY)),
+            global_rate=float(os.getenv("TELEGRAM_GLOBAL_RATE", DEFAULT_GLOBAL_RATE)),
+            chat_rate=float(os.getenv("TELEGRAM_CHAT_RATE", DEFAULT_CHAT_RATE)),
+            group_rate=float(os.getenv("TELEGRAM_GROUP_RATE", DEFAULT_GROUP_RATE)),
+            max_attempts=int(os.getenv("SEND_MAX_ATTEMPTS", DEFAULT_MAX_ATTEMPTS)),
+        )
+
+    def _chat_bucket(self, chat_id: int) -> TokenBucket:
+        """Ведро токенов чата (у групп отрицательный ID и более строгий лимит)"""
+        bucket = self._chat_buckets.get(chat_id)
+        if bucket is None:
+            rate = self.group_rate if chat_id < 0 else self.chat_rate
+            bucket = self._chat_buckets[chat_id] = TokenBucket(rate, capacity=1)
+        return bucket
+
+    async def _deliver(self, bot, chat_id: int, send_kwargs: dict) -> bool:
+        """Отправить сообщение одному получателю; True, если доставлено"""
+        chat_bucket = self._chat_bucket(chat_id)
+
+        for attempt in range(1, self.max_attempts + 1):
+            # Ожидание лимита чата не занимает слот параллельной отправки
+            await chat_bucket.acquire()
+            async with self._semaphore:
+                await self._global_bucket.acquire()
+                try:
+                    await bot.send_message(chat_id=chat_id, **send_kwargs)
+                    logger.info(f"✅ Сообщение отправлено получателю {chat_id}")
+                    return True
+                except RetryAfter as e:
+                    wait = _retry_after_seconds(e)
+                    chat_bucket.pause(wait)
+                    logger.warning(
+                        f"⚠️ Flood control для {chat_id}: повтор через {wait:.0f} с "
+                        f"(попытка {attempt}/{self.max_attempts})"
+                    )
+                except Exception as e:
+                    logger.error(f"❌ Ошибка отправки получателю {chat_id}: {e}")
+                    return False
+
+        logger.error(f"❌ Ошибка отправки получателю {chat_id}: превышено число попыток")
+        return False
+
+    async def send(self, bot, recipients: Iterable[int], **send_kwargs) -> Tuple[int, List[int]]:
+        """Отправить сообщение всем получателям
+
+        send_kwargs передаются в bot.send_message (text, reply_markup, parse_mode...).
+        Возвращает (количество успешных отправок, список ID с ошибками).
+        """
+        recipients = list(recipients)
+        results = await asyncio.gather(
+            *(self._deliver(bot, chat_id, send_kwargs) for chat_id in recipients)
+        )
+
+        success_count = sum(results)
+        failed_recipients = [chat_id for chat_id, ok in zip(recipients, results) if not ok]
+        return success_count, failed_recipients
@@ -4,97 +4,674 @@ Database module для Anonymous Bot
 Работа с SQLite базой данных
 """
 
+import asyncio
+import logging
+import os
+import queue
+import random
+import re
 import sqlite3
+import threading
+import time
 import json
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import contextmanager
 from datetime import datetime
+from functools import partial, wraps
 from pathlib import Path
-from typing import Optional, List, Dict, Any
+from typing import Optional, List, Dict, Any, Callable, Iterator, Tuple
+
+logger = logging.getLogger(__name__)
+
+# PRAGMA, которые применяются к каждому новому соединению.
+# WAL позволяет веб-интерфейсу читать, пока бот пишет (и наоборот),
+# а synchronous=NORMAL в режиме WAL безопасен и убирает fsync на каждый коммит.
+DEFAULT_PRAGMAS: Dict[str, Any] = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "busy_timeout": 5000,        # мс ожидания блокировки внутри SQLite
+    "cache_size": -16000,        # отрицательное значение - размер в КиБ (16 МБ)
+    "mmap_size": 67108864,       # 64 МБ
+    "temp_store": "MEMORY",
+}
+
+JOURNAL_MODES = {"DELETE", "TRUNCATE", "PERSIST", "MEMORY", "WAL", "OFF"}
+SYNCHRONOUS_MODES = {"OFF", "NORMAL", "FULL", "EXTRA"}
+
+# Длина превью последнего сообщения в постраничном списке чатов
+CHAT_PREVIEW_LENGTH = 100
+# Ключ сортировки списка чатов; по этому выражению построен индекс idx_users_chat_order
+CHAT_SORT_TIME = "COALESCE(last_message_time, last_seen, '')"
+
+# Повторы при SQLITE_BUSY, если busy_timeout не помог
+DEFAULT_BUSY_RETRIES = 5
+DEFAULT_BUSY_BACKOFF = 0.05      # секунды, удваивается на каждой попытке
+MAX_BUSY_BACKOFF = 1.0
+
+# Отложенная запись (WriteBehindQueue): пачка сбрасывается раз в интервал
+# или при накоплении указанного числа строк
+DEFAULT_FLUSH_INTERVAL = 0.05    # секунды
+DEFAULT_BATCH_SIZE = 500
+
+# Лента изменений (events): сколько последних событий хранить и как часто
+# удалять остальные при записи сообщений (Database.prune_events)
+EVENTS_KEEP = 10000
+EVENTS_PRUNE_INTERVAL = 60       # секунды
+
+# Архивация: сообщения старше указанного числа дней переносятся
+# в помесячные файлы архива (Database.archive_messages)
+DEFAULT_ARCHIVE_AFTER_DAYS = 180
+MESSAGE_COLUMNS = ("id, message_id, user_id, message_text, message_length, timestamp, "
+                   "admin_message_id, is_from_admin, is_answered")
+REPLY_COLUMNS = "id, message_id, admin_id, reply_text, timestamp"
+
+
+def _env_choice(name: str, default: str, choices: set) -> str:
+    """Прочитать из окружения значение из фиксированного набора"""
+    value = os.getenv(name, default).strip().upper()
+    if value not in choices:
+        raise ValueError(f"{name}={value!r}: допустимые значения {sorted(choices)}")
+    return value
+
+
+def _env_int(name: str, default: int) -> int:
+    """Прочитать целое число из окружения"""
+    value = os.getenv(name)
+    if value is None or not value.strip():
+        return default
+    try:
+        return int(value)
+    except ValueError:
+        raise ValueError(f"{name}={value!r}: ожидается целое число")
+
+
+def pragmas_from_env() -> Dict[str, Any]:
+    """Собрать PRAGMA для соединений из переменных окружения
+
+    DB_JOURNAL_MODE, DB_SYNCHRONOUS, DB_BUSY_TIMEOUT_MS, DB_CACHE_SIZE,
+    DB_MMAP_SIZE. Не заданные переменные берутся из DEFAULT_PRAGMAS.
+    """
+    pragmas = dict(DEFAULT_PRAGMAS)
+    pragmas["journal_mode"] = _env_choice("DB_JOURNAL_MODE", pragmas["journal_mode"], JOURNAL_MODES)
+    pragmas["synchronous"] = _env_choice("DB_SYNCHRONOUS", pragmas["synchronous"], SYNCHRONOUS_MODES)
+    pragmas["busy_timeout"] = _env_int("DB_BUSY_TIMEOUT_MS", pragmas["busy_timeout"])
+    pragmas["cache_size"] = _env_int("DB_CACHE_SIZE", pragmas["cache_size"])
+    pragmas["mmap_size"] = _env_int("DB_MMAP_SIZE", pragmas["mmap_size"])
+    return pragmas
+
+
+def is_busy_error(error: BaseException) -> bool:
+    """Проверить, что ошибка вызвана блокировкой базы (SQLITE_BUSY/SQLITE_LOCKED)"""
+    if not isinstance(error, sqlite3.OperationalError):
+        return False
+    code = getattr(error, "sqlite_errorcode", None)  # Python 3.11+
+    if code is not None:
+        return code & 0xFF in (sqlite3.SQLITE_BUSY, sqlite3.SQLITE_LOCKED)
+    message = str(error).lower()
+    return "locked" in message or "busy" in message
+
+
+def retry_on_busy(method):
+    """Декоратор для методов Database: повторяет операцию при SQLITE_BUSY
+    с экспоненциальной задержкой (не больше self.busy_retries повторов)"""
+    @wraps(method)
+    def wrapper(self, *args, **kwargs):
+        delay = self.busy_backoff
+        attempt = 0
+        while True:
+            try:
+                return method(self, *args, **kwargs)
+            except sqlite3.OperationalError as e:
+                if not is_busy_error(e) or attempt >= self.busy_retries:
+                    raise
+                attempt += 1
+                # Случайный разброс, чтобы конкурирующие процессы не просыпались одновременно
+                time.sleep(delay * random.uniform(0.5, 1.5))
+                delay = min(delay * 2, MAX_BUSY_BACKOFF)
+    return wrapper
+
+
+class ConnectionPool:
+    """Потокобезопасный пул соединений SQLite
+
+    Соединения создаются лениво (не больше size штук) и переиспользуются
+    между вызовами. Перед выдачей соединение, простаивавшее дольше
+    health_check_interval секунд, проверяется запросом SELECT 1 и
+    пересоздается, если оказалось неработоспособным.
+    """
+
+    def __init__(self, factory: Callable[[], sqlite3.Connection], size: int = 5,
+                 timeout: float = 30.0, health_check_interval: float = 30.0):
+        if size < 1:
+            raise ValueError("Размер пула должен быть не меньше 1")
+
+        self._factory = factory
+        self.size = size
+        self.timeout = timeout
+        self.health_check_interval = health_check_interval
+
+        # Свободные соединения: (соединение, время последнего возврата в пул)
+        self._idle: "queue.LifoQueue" = queue.LifoQueue()
+        # Ограничивает общее количество выданных и свободных соединений
+        self._slots = threading.BoundedSemaphore(size)
+        self._lock = threading.Lock()
+        self._connections: List[sqlite3.Connection] = []
+        self._closed = False
+
+    def _create(self) -> sqlite3.Connection:
+        """Создать новое соединение и зарегистрировать его в пуле"""
+        conn = self._factory()
+        with self._lock:
+            self._connections.append(conn)
+        return conn
+
+    def _discard(self, conn: sqlite3.Connection):
+        """Закрыть соединение и убрать его из пула"""
+        with self._lock:
+            if conn in self._connections:
+                self._connections.remove(conn)
+        try:
+            conn.close()
+        except sqlite3.Error:
+            pass
+
+    @staticmethod
+    def _is_healthy(conn: sqlite3.Connection) -> bool:
+        """Проверить, что соединение живо"""
+        try:
+            conn.execute("SELECT 1").fetchone()
+            return True
+        except sqlite3.Error:
+            return False
+
+    def acquire(self) -> sqlite3.Connection:
+        """Взять соединение из пула (или создать новое, если есть свободный слот)"""
+        if self._closed:
+            raise sqlite3.ProgrammingError("Пул соединений закрыт")
+
+        if not self._slots.acquire(timeout=self.timeout):
+            raise sqlite3.OperationalError(
+                f"Не удалось получить соединение из пула за {self.timeout} с"
+            )
+
+        try:
+            while True:
+                try:
+                    conn, released_at = self._idle.get_nowait()
+                except queue.Empty:
+                    return self._create()
+
+                if time.monotonic() - released_at < self.health_check_interval:
+                    return conn
+                if self._is_healthy(conn):
+                    return conn
+                self._discard(conn)
+        except BaseException:
+            self._slots.release()
+            raise
+
+    def release(self, conn: sqlite3.Connection):
+        """Вернуть соединение в пул"""
+        try:
+            if self._closed:
+                self._discard(conn)
+                return
+            try:
+                # Незавершенная транзакция не должна попасть к следующему владельцу
+                if conn.in_transaction:
+                    conn.rollback()
+            except sqlite3.Error:
+                self._discard(conn)
+                return
+            self._idle.put((conn, time.monotonic()))
+        finally:
+            self._slots.release()
+
+    @contextmanager
+    def connection(self) -> Iterator[sqlite3.Connection]:
+        """Контекстный менеджер: выдает соединение, фиксирует транзакцию
+        при успешном выходе и откатывает ее при исключении"""
+        conn = self.acquire()
+        try:
+            yield conn
+            conn.commit()
+        except BaseException:
+            try:
+                conn.rollback()
+            except sqlite3.Error:
+                pass
+            raise
+        finally:
+            self.release(conn)
+
+    def close(self):
+        """Закрыть все соединения пула"""
+        self._closed = True
+        while True:
+            try:
+                conn, _ = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            self._discard(conn)
 
 
 class Database:
     """Класс для работы с SQLite базой данных"""
     
-    def __init__(self, db_path: str = "anonymous_bot.db"):
-        """Инициализация базы данных"""
+    def __init__(self, db_path: str = "anonymous_bot.db", pool_size: Optional[int] = None,
+                 pragmas: Optional[Dict[str, Any]] = None,
+                 busy_retries: Optional[int] = None, archive_dir: Optional[str] = None):
+        """Инициализация базы данных
+
+        Не переданные параметры берутся из окружения: DB_POOL_SIZE,
+        DB_BUSY_RETRIES, DB_ARCHIVE_DIR (по умолчанию - каталог archive
+        рядом с базой) и PRAGMA из pragmas_from_env().
+        """
         self.db_path = db_path
+        if archive_dir is None:
+            archive_dir = os.getenv("DB_ARCHIVE_DIR") or Path(db_path).resolve().parent / "archive"
+        self.archive_dir = Path(archive_dir)
+        self._missing_archives: set = set()  # уже залогированные отсутствующие файлы архива
+        self._events_pruned_at = time.monotonic()  # init_database только что очистил ленту
+        self.pragmas = pragmas_from_env() if pragmas is None else dict(pragmas)
+        self.busy_retries = (_env_int("DB_BUSY_RETRIES", DEFAULT_BUSY_RETRIES)
+                             if busy_retries is None else busy_retries)
+        self.busy_backoff = DEFAULT_BUSY_BACKOFF
+        if pool_size is None:
+            pool_size = _env_int("DB_POOL_SIZE", 5)
+        self.pool = ConnectionPool(self.get_connection, size=pool_size)
         self.init_database()
     
     def get_connection(self):
-        """Получить соединение с базой данных"""
-        conn = sqlite3.connect(self.db_path)
+        """Получить новое соединение с базой данных (с примененными PRAGMA)"""
+        # check_same_thread=False: соединение из пула может использоваться
+        # разными потоками Flask, но не одновременно
+        conn = sqlite3.connect(self.db_path, check_same_thread=False)
         conn.row_factory = sqlite3.Row  # Для доступа к колонкам по имени
+        try:
+            for name, value in self.pragmas.items():
+                # Смена journal_mode требует эксклюзивной блокировки, поэтому
+                # не переключаем режим, если файл уже в нужном (WAL хранится в файле)
+                if name == "journal_mode":
+                    current = conn.execute("PRAGMA journal_mode").fetchone()[0]
+                    if str(current).upper() == str(value).upper():
+                        continue
+                conn.execute(f"PRAGMA {name} = {value}")
+        except sqlite3.Error:
+            conn.close()
+            raise
         return conn
+
+    def connection(self):
+        """Получить соединение из пула (контекстный менеджер)"""
+        return self.pool.connection()
+
+    def close(self):
+        """Закрыть все соединения с базой данных"""
+        self.pool.close()
     
+    @retry_on_busy
     def init_database(self):
         """Создать таблицы, если их нет"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
+        with self.connection() as conn:
+            cursor = conn.cursor()
         
-        # Таблица пользователей
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS users (
-                user_id INTEGER PRIMARY KEY,
-                username TEXT,
-                first_name TEXT,
-                last_name TEXT,
-                full_name TEXT,
-                is_bot INTEGER DEFAULT 0,
-                is_premium INTEGER DEFAULT 0,
-                language_code TEXT,
-                first_seen TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                last_seen TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        """)
+            # Таблица пользователей
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS users (
+                    user_id INTEGER PRIMARY KEY,
+                    username TEXT,
+                    first_name TEXT,
+                    last_name TEXT,
+                    full_name TEXT,
+                    is_bot INTEGER DEFAULT 0,
+                    is_premium INTEGER DEFAULT 0,
+                    language_code TEXT,
+                    first_seen TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    last_seen TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    last_message_time TIMESTAMP
+                )
+            """)
         
-        # Таблица сообщений
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS messages (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                message_id TEXT UNIQUE NOT NULL,
-                user_id INTEGER NOT NULL,
-                message_text TEXT NOT NULL,
-                message_length INTEGER,
-                timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                admin_message_id INTEGER,
-                is_from_admin INTEGER DEFAULT 0,
-                FOREIGN KEY (user_id) REFERENCES users(user_id)
-            )
-        """)
+            # Таблица сообщений
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS messages (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    message_id TEXT UNIQUE NOT NULL,
+                    user_id INTEGER NOT NULL,
+                    message_text TEXT NOT NULL,
+                    message_length INTEGER,
+                    timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    admin_message_id INTEGER,
+                    is_from_admin INTEGER DEFAULT 0,
+                    is_answered INTEGER NOT NULL DEFAULT 0,
+                    FOREIGN KEY (user_id) REFERENCES users(user_id)
+                )
+            """)
         
-        # Таблица ответов администратора
+            # Таблица ответов администратора
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS admin_replies (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    message_id TEXT NOT NULL,
+                    admin_id INTEGER NOT NULL,
+                    reply_text TEXT NOT NULL,
+                    timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    FOREIGN KEY (message_id) REFERENCES messages(message_id)
+                )
+            """)
+        
+            stats_exists = cursor.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'stats'"
+            ).fetchone() is not None
+
+            # Счетчики для get_stats (одна строка), поддерживаются триггерами ниже
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS stats (
+                    id INTEGER PRIMARY KEY CHECK (id = 1),
+                    total_users INTEGER NOT NULL DEFAULT 0,
+                    total_messages INTEGER NOT NULL DEFAULT 0,
+                    answered_messages INTEGER NOT NULL DEFAULT 0
+                )
+            """)
+
+            # Лента изменений для веб-интерфейса (Server-Sent Events).
+            # ref_id - rowid записи в users/messages/admin_replies
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS events (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    type TEXT NOT NULL,
+                    user_id INTEGER,
+                    message_id TEXT,
+                    ref_id INTEGER,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            """)
+
+            # Состояние диалогов бота (state_store.py): значение в JSON,
+            # expires_at - unix-время истечения или NULL (бессрочно)
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS state (
+                    namespace TEXT NOT NULL,
+                    key TEXT NOT NULL,
+                    value TEXT NOT NULL,
+                    expires_at REAL,
+                    PRIMARY KEY (namespace, key)
+                )
+            """)
+
+            # Получатели анонимных сообщений в дополнение к RECIPIENTS из .env
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS recipients (
+                    chat_id INTEGER PRIMARY KEY,
+                    added_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            """)
+
+            # Каталог помесячных архивов и счетчики перенесенных в них сообщений
+            # (для get_stats и count_messages без открытия файлов архива)
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS archives (
+                    month TEXT PRIMARY KEY,
+                    messages INTEGER NOT NULL DEFAULT 0,
+                    user_messages INTEGER NOT NULL DEFAULT 0,
+                    answered_messages INTEGER NOT NULL DEFAULT 0,
+                    archived_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            """)
+
+            self._migrate(cursor)
+            self._create_stats_triggers(cursor)
+            self._create_last_message_triggers(cursor)
+            self._create_event_triggers(cursor)
+            self._create_search_index(cursor)
+            if not stats_exists:
+                self._recompute_stats(cursor)
+            self._prune_events(conn, EVENTS_KEEP)
+
+            # Индексы для быстрого поиска
+            cursor.execute("CREATE INDEX IF NOT EXISTS idx_messages_user_id ON messages(user_id)")
+            cursor.execute("CREATE INDEX IF NOT EXISTS idx_messages_timestamp ON messages(timestamp)")
+            cursor.execute("CREATE INDEX IF NOT EXISTS idx_admin_replies_message_id ON admin_replies(message_id)")
+            # Порядок списка чатов (get_chats_page): страница - поиск по индексу, а не сортировка всех пользователей
+            cursor.execute(f"CREATE INDEX IF NOT EXISTS idx_users_chat_order ON users({CHAT_SORT_TIME}, user_id)")
+            # Счетчик неотвеченных сообщений пользователя читается только из индекса
+            cursor.execute("""
+                CREATE INDEX IF NOT EXISTS idx_messages_user_unanswered
+                ON messages(user_id, is_from_admin, is_answered)
+            """)
+
+    @staticmethod
+    def _create_stats_triggers(cursor: sqlite3.Cursor):
+        """Триггеры, обновляющие таблицу stats при каждой записи
+
+        Учитываются только сообщения пользователей (is_from_admin = 0);
+        сообщение считается отвеченным, когда у него выставлен is_answered.
+        """
+        triggers = {
+            "trg_stats_users_insert": """
+                AFTER INSERT ON users BEGIN
+                    UPDATE stats SET total_users = total_users + 1 WHERE id = 1;
+                END""",
+            "trg_stats_users_delete": """
+                AFTER DELETE ON users BEGIN
+                    UPDATE stats SET total_users = total_users - 1 WHERE id = 1;
+                END""",
+            "trg_stats_messages_insert": """
+                AFTER INSERT ON messages WHEN NEW.is_from_admin = 0 BEGIN
+                    UPDATE stats SET
+                        total_messages = total_messages + 1,
+                        answered_messages = answered_messages + NEW.is_answered
+                    WHERE id = 1;
+                END""",
+            "trg_stats_messages_delete": """
+                AFTER DELETE ON messages WHEN OLD.is_from_admin = 0 BEGIN
+                    UPDATE stats SET
+                        total_messages = total_messages - 1,
+                        answered_messages = answered_messages - OLD.is_answered
+                    WHERE id = 1;
+                END""",
+            "trg_stats_messages_answered": """
+                AFTER UPDATE OF is_answered ON messages
+                WHEN NEW.is_from_admin = 0 AND NEW.is_answered != OLD.is_answered BEGIN
+                    UPDATE stats SET
+                        answered_messages = answered_messages + NEW.is_answered - OLD.is_answered
+                    WHERE id = 1;
+                END""",
+        }
+        for name, body in triggers.items():
+            cursor.execute(f"CREATE TRIGGER IF NOT EXISTS {name} {body}")
+
+    @staticmethod
+    def _create_last_message_triggers(cursor: sqlite3.Cursor):
+        """Триггеры, хранящие в users.last_message_time время последнего сообщения
+
+        Последним считается сообщение с наибольшим id, как в списке чатов.
+        При удалении (в том числе архивации) время берется у оставшихся
+        сообщений, а если их нет - становится NULL.
+        """
+        triggers = {
+            "trg_users_last_message_insert": """
+                AFTER INSERT ON messages BEGIN
+                    UPDATE users SET last_message_time = NEW.timestamp WHERE user_id = NEW.user_id;
+                END""",
+            # Сообщения, записанные раньше пользователя
+            "trg_users_last_message_user_insert": """
+                AFTER INSERT ON users BEGIN
+                    UPDATE users SET last_message_time = (
+                        SELECT timestamp FROM messages WHERE user_id = NEW.user_id ORDER BY id DESC LIMIT 1
+                    ) WHERE user_id = NEW.user_id;
+                END""",
+            "trg_users_last_message_delete": """
+                AFTER DELETE ON messages BEGIN
+                    UPDATE users SET last_message_time = (
+                        SELECT timestamp FROM messages WHERE user_id = OLD.user_id ORDER BY id DESC LIMIT 1
+                    ) WHERE user_id = OLD.user_id;
+                END""",
+            "trg_users_last_message_update": """
+                AFTER UPDATE OF timestamp ON messages BEGIN
+                    UPDATE users SET last_message_time = (
+                        SELECT timestamp FROM messages WHERE user_id = NEW.user_id ORDER BY id DESC LIMIT 1
+                    ) WHERE user_id = NEW.user_id;
+                END""",
+        }
+        for name, body in triggers.items():
+            cursor.execute(f"CREATE TRIGGER IF NOT EXISTS {name} {body}")
+
+    @staticmethod
+    def _create_event_triggers(cursor: sqlite3.Cursor):
+        """Триггеры, записывающие новые пользователи, сообщения и ответы в events
+
+        Запись в ленту происходит в той же транзакции, что и сама вставка,
+        поэтому событие видно ровно тогда, когда видны данные.
+        """
+        triggers = {
+            "trg_events_new_user": """
+                AFTER INSERT ON users BEGIN
+                    INSERT INTO events (type, user_id, ref_id)
+                    VALUES ('new_user', NEW.user_id, NEW.user_id);
+                END""",
+            # Изменение профиля - чтобы версия данных (get_data_version) сменилась
+            "trg_events_user_updated": """
+                AFTER UPDATE OF username, first_name, last_name, full_name ON users
+                WHEN OLD.username IS NOT NEW.username OR OLD.first_name IS NOT NEW.first_name
+                  OR OLD.last_name IS NOT NEW.last_name OR OLD.full_name IS NOT NEW.full_name
+                BEGIN
+                    INSERT INTO events (type, user_id, ref_id)
+                    VALUES ('user_updated', NEW.user_id, NEW.user_id);
+                END""",
+            "trg_events_new_message": """
+                AFTER INSERT ON messages BEGIN
+                    INSERT INTO events (type, user_id, message_id, ref_id)
+                    VALUES ('new_message', NEW.user_id, NEW.message_id, NEW.id);
+                END""",
+            "trg_events_new_reply": """
+                AFTER INSERT ON admin_replies BEGIN
+                    INSERT INTO events (type, user_id, message_id, ref_id)
+                    VALUES ('new_reply',
+                            (SELECT user_id FROM messages WHERE message_id = NEW.message_id),
+                            NEW.message_id, NEW.id);
+                END""",
+        }
+        for name, body in triggers.items():
+            cursor.execute(f"CREATE TRIGGER IF NOT EXISTS {name} {body}")
+
+    @staticmethod
+    def _create_search_index(cursor: sqlite3.Cursor):
+        """Полнотекстовые индексы FTS5 по сообщениям и ответам (для search)
+
+        Индексы хранят только словарь и ссылки на строки (external content),
+        сам текст остается в messages и admin_replies. Триггеры обновляют
+        индекс в той же транзакции, что и запись. Индекс, добавленный к уже
+        заполненной базе, строится по существующим строкам.
+        """
+        indexes = {"messages_fts": ("messages", "message_text"),
+                   "admin_replies_fts": ("admin_replies", "reply_text")}
+        for index, (table, column) in indexes.items():
+            exists = cursor.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (index,)
+            ).fetchone() is not None
+            cursor.execute(f"""
+                CREATE VIRTUAL TABLE IF NOT EXISTS {index} USING fts5(
+                    {column}, content='{table}', content_rowid='id',
+                    tokenize='unicode61 remove_diacritics 2'
+                )
+            """)
+            triggers = {
+                f"trg_{index}_insert": f"""
+                    AFTER INSERT ON {table} BEGIN
+                        INSERT INTO {index} (rowid, {column}) VALUES (NEW.id, NEW.{column});
+                    END""",
+                f"trg_{index}_delete": f"""
+                    AFTER DELETE ON {table} BEGIN
+                        INSERT INTO {index} ({index}, rowid, {column}) VALUES ('delete', OLD.id, OLD.{column});
+                    END""",
+                f"trg_{index}_update": f"""
+                    AFTER UPDATE OF {column} ON {table} BEGIN
+                        INSERT INTO {index} ({index}, rowid, {column}) VALUES ('delete', OLD.id, OLD.{column});
+                        INSERT INTO {index} (rowid, {column}) VALUES (NEW.id, NEW.{column});
+                    END""",
+            }
+            for name, body in triggers.items():
+                cursor.execute(f"CREATE TRIGGER IF NOT EXISTS {name} {body}")
+            if not exists:
+                cursor.execute(f"INSERT INTO {index} ({index}) VALUES ('rebuild')")
+
+    @staticmethod
+    def _recompute_stats(cursor: sqlite3.Cursor) -> Dict[str, int]:
+        """Пересчитать флаги is_answered и счетчики stats по исходным таблицам"""
         cursor.execute("""
-            CREATE TABLE IF NOT EXISTS admin_replies (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                message_id TEXT NOT NULL,
-                admin_id INTEGER NOT NULL,
-                reply_text TEXT NOT NULL,
-                timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (message_id) REFERENCES messages(message_id)
+            UPDATE messages SET is_answered = (
+                message_id IN (SELECT message_id FROM admin_replies)
             )
+            WHERE is_answered != (message_id IN (SELECT message_id FROM admin_replies))
         """)
-        
-        # Индексы для быстрого поиска
-        cursor.execute("CREATE INDEX IF NOT EXISTS idx_messages_user_id ON messages(user_id)")
-        cursor.execute("CREATE INDEX IF NOT EXISTS idx_messages_timestamp ON messages(timestamp)")
-        cursor.execute("CREATE INDEX IF NOT EXISTS idx_admin_replies_message_id ON admin_replies(message_id)")
-        
-        conn.commit()
-        conn.close()
+
+        total_users = cursor.execute("SELECT COUNT(*) FROM users").fetchone()[0]
+        total_messages, answered_messages = cursor.execute("""
+            SELECT COUNT(*), COALESCE(SUM(is_answered), 0)
+            FROM messages WHERE is_from_admin = 0
+        """).fetchone()
+
+        cursor.execute("""
+            INSERT INTO stats (id, total_users, total_messages, answered_messages)
+            VALUES (1, ?, ?, ?)
+            ON CONFLICT(id) DO UPDATE SET
+                total_users = excluded.total_users,
+                total_messages = excluded.total_messages,
+                answered_messages = excluded.answered_messages
+        """, (total_users, total_messages, answered_messages))
+
+        return {
+            "total_users": total_users,
+            "total_messages": total_messages,
+            "answered_messages": answered_messages,
+        }
+
+    @staticmethod
+    def _migrate(cursor: sqlite3.Cursor):
+        """Обновить схему базы, созданной предыдущими версиями"""
+        columns = {row['name'] for row in cursor.execute("PRAGMA table_info(messages)")}
+        user_columns = {row['name'] for row in cursor.execute("PRAGMA table_info(users)")}
+
+        # Время последнего сообщения - ключ сортировки списка чатов
+        if 'last_message_time' not in user_columns:
+            cursor.execute("ALTER TABLE users ADD COLUMN last_message_time TIMESTAMP")
+            cursor.execute("""
+                UPDATE users SET last_message_time = (
+                    SELECT timestamp FROM messages WHERE user_id = users.user_id ORDER BY id DESC LIMIT 1
+                )
+            """)
+
+        # Флаг is_answered заменяет поиск сообщения в admin_replies
+        if 'is_answered' not in columns:
+            cursor.execute("ALTER TABLE messages ADD COLUMN is_answered INTEGER NOT NULL DEFAULT 0")
+            cursor.execute("""
+                UPDATE messages SET is_answered = 1
+                WHERE message_id IN (SELECT message_id FROM admin_replies)
+            """)
     
     # ==================== ПОЛЬЗОВАТЕЛИ ====================
     
+    @retry_on_busy
     def add_or_update_user(self, user_id: int, username: str = None, first_name: str = None,
                           last_name: str = None, full_name: str = None, is_bot: bool = False,
                           is_premium: bool = False, language_code: str = None):
         """Добавить или обновить пользователя"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        
+        with self.connection() as conn:
+            self._upsert_user(conn, user_id, username, first_name, last_name, full_name,
+                              is_bot, is_premium, language_code)
+
+    @staticmethod
+    def _upsert_user(conn: sqlite3.Connection, user_id: int, username: str = None,
+                     first_name: str = None, last_name: str = None, full_name: str = None,
+                     is_bot: bool = False, is_premium: bool = False, language_code: str = None):
+        """UPSERT пользователя на переданном соединении (без коммита)"""
         # Безопасное преобразование в int (обработка None)
         is_bot_int = int(is_bot) if is_bot is not None else 0
         is_premium_int = int(is_premium) if is_premium is not None else 0
 
-        cursor.execute("""
+        conn.execute("""
             INSERT INTO users (user_id, username, first_name, last_name, full_name,
                              is_bot, is_premium, language_code, first_seen, last_seen)
             VALUES (?, ?, ?, ?, ?, ?, ?, ?, CURRENT_TIMESTAMP, CURRENT_TIMESTAMP)
@@ -109,151 +686,309 @@ class Database:
                 last_seen = CURRENT_TIMESTAMP
         """, (user_id, username, first_name, last_name, full_name,
               is_bot_int, is_premium_int, language_code))
-        
-        conn.commit()
-        conn.close()
     
+    @retry_on_busy
     def get_user(self, user_id: int) -> Optional[Dict[str, Any]]:
         """Получить информацию о пользователе"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        
-        cursor.execute("SELECT * FROM users WHERE user_id = ?", (user_id,))
-        row = cursor.fetchone()
-        conn.close()
+        with self.connection() as conn:
+            row = conn.execute("SELECT * FROM users WHERE user_id = ?", (user_id,)).fetchone()
         
         if row:
             return dict(row)
         return None
     
+    @retry_on_busy
     def get_all_users(self) -> List[Dict[str, Any]]:
         """Получить всех пользователей"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        
-        cursor.execute("SELECT * FROM users ORDER BY last_seen DESC")
-        rows = cursor.fetchall()
-        conn.close()
+        with self.connection() as conn:
+            rows = conn.execute("SELECT * FROM users ORDER BY last_seen DESC").fetchall()
         
         return [dict(row) for row in rows]
     
     # ==================== СООБЩЕНИЯ ====================
     
+    @retry_on_busy
     def add_message(self, message_id: str, user_id: int, message_text: str,
                    admin_message_id: int = None, is_from_admin: bool = False) -> bool:
         """Добавить сообщение"""
         try:
-            conn = self.get_connection()
-            cursor = conn.cursor()
-
-            cursor.execute("""
-                INSERT INTO messages (message_id, user_id, message_text, message_length,
-                                    admin_message_id, is_from_admin)
-                VALUES (?, ?, ?, ?, ?, ?)
-            """, (message_id, user_id, message_text, len(message_text),
-                  admin_message_id, int(is_from_admin)))
-
-            conn.commit()
-            conn.close()
+            with self.connection() as conn:
+                self._insert_message(conn, message_id, user_id, message_text,
+                                     admin_message_id, is_from_admin)
+                self._prune_events_if_due(conn)
             return True
         except sqlite3.IntegrityError:
             return False
 
-    def get_message(self, message_id: str) -> Optional[Dict[str, Any]]:
-        """Получить сообщение по ID"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
+    @staticmethod
+    def _insert_message(conn: sqlite3.Connection, message_id: str, user_id: int, message_text: str,
+                        admin_message_id: int = None, is_from_admin: bool = False):
+        """Вставить сообщение на переданном соединении (без коммита)"""
+        conn.execute("""
+            INSERT INTO messages (message_id, user_id, message_text, message_length,
+                                admin_message_id, is_from_admin)
+            VALUES (?, ?, ?, ?, ?, ?)
+        """, (message_id, user_id, message_text, len(message_text),
+              admin_message_id, int(is_from_admin)))
+
+    @retry_on_busy
+    def write_batch(self, users: List[Dict[str, Any]], messages: List[Dict[str, Any]]) -> List[bool]:
+        """Записать пачку пользователей и сообщений одной транзакцией
 
-        cursor.execute("SELECT * FROM messages WHERE message_id = ?", (message_id,))
-        row = cursor.fetchone()
-        conn.close()
+        users и messages - списки именованных аргументов add_or_update_user
+        и add_message. Пользователи пишутся первыми. Возвращает для каждого
+        сообщения то же, что вернул бы add_message (False - дубликат message_id).
+        """
+        results = []
+        with self.connection() as conn:
+            for user in users:
+                self._upsert_user(conn, **user)
+            for message in messages:
+                try:
+                    self._insert_message(conn, **message)
+                    results.append(True)
+                except sqlite3.IntegrityError:
+                    # Откатывается только эта вставка, транзакция продолжается
+                    results.append(False)
+            self._prune_events_if_due(conn)
+        return results
+
+    @retry_on_busy
+    def get_message(self, message_id: str) -> Optional[Dict[str, Any]]:
+        """Получить сообщение по ID (если его нет в основной базе - из архива)"""
+        with self.connection() as conn:
+            row = conn.execute("SELECT * FROM messages WHERE message_id = ?", (message_id,)).fetchone()
+            if row is None:
+                row = self._find_archived_message(conn, message_id)
 
         if row:
             return dict(row)
         return None
 
+    @retry_on_busy
     def get_user_messages(self, user_id: int) -> List[Dict[str, Any]]:
-        """Получить все сообщения пользователя"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
-
-        cursor.execute("""
-            SELECT * FROM messages
-            WHERE user_id = ?
-            ORDER BY timestamp ASC
-        """, (user_id,))
-        rows = cursor.fetchall()
-        conn.close()
+        """Получить все сообщения пользователя, включая архивные"""
+        query = "SELECT * FROM {schema}.messages WHERE user_id = ? ORDER BY timestamp ASC"
+        with self.connection() as conn:
+            rows = conn.execute(query.format(schema="main"), (user_id,)).fetchall()
+            # Архивы идут от новых к старым, каждый следующий - перед уже прочитанным
+            for month in self._archive_months(conn):
+                with self._archive(conn, month) as attached:
+                    if attached:
+                        rows = conn.execute(query.format(schema="archive"), (user_id,)).fetchall() + rows
 
         return [dict(row) for row in rows]
 
-    def get_all_messages(self) -> List[Dict[str, Any]]:
-        """Получить все сообщения"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
+    @retry_on_busy
+    def get_user_messages_page(self, user_id: int, limit: Optional[int] = 50,
+                               before: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Получить страницу сообщений пользователя вместе с ответами
+
+        Keyset-пагинация по messages(user_id, id): возвращаются limit последних
+        сообщений с id < before (все сообщения, если limit=None) в порядке
+        возрастания id. Ответы загружаются одним запросом на всю страницу
+        и лежат в ключе "replies" каждого сообщения. Если в основной базе
+        сообщений на страницу не хватает, страница дополняется из архивов.
+        """
+        def page_query(schema: str, before: Optional[int], limit: Optional[int]):
+            conditions = ["user_id = ?"]
+            params: List[Any] = [user_id]
+            if before is not None:
+                conditions.append("id < ?")
+                params.append(before)
+            query = f"SELECT * FROM {schema}.messages WHERE {' AND '.join(conditions)} ORDER BY id DESC"
+            if limit is not None:
+                query += " LIMIT ?"
+                params.append(limit)
+            return query, params
+
+        with self.connection() as conn:
+            # Сообщения и ответы читаются из одного снимка базы
+            conn.execute("BEGIN")
+            messages = [dict(row) for row in conn.execute(*page_query("main", before, limit)).fetchall()]
 
-        cursor.execute("SELECT * FROM messages ORDER BY timestamp DESC")
-        rows = cursor.fetchall()
-        conn.close()
+            replies_by_message: Dict[str, List[Dict[str, Any]]] = {}
+            if messages:
+                rows = conn.execute("""
+                    SELECT r.* FROM admin_replies r
+                    JOIN messages m ON m.message_id = r.message_id
+                    WHERE m.user_id = ? AND m.id BETWEEN ? AND ?
+                    ORDER BY r.timestamp ASC, r.id ASC
+                """, (user_id, messages[-1]['id'], messages[0]['id']))
+                for row in rows:
+                    replies_by_message.setdefault(row['message_id'], []).append(dict(row))
+            conn.rollback()  # ATTACH невозможен внутри транзакции
+
+            if limit is None or len(messages) < limit:
+                for month in self._archive_months(conn):
+                    if limit is not None and len(messages) >= limit:
+                        break
+                    with self._archive(conn, month) as attached:
+                        if not attached:
+                            continue
+                        older_than = messages[-1]['id'] if messages else before
+                        remaining = None if limit is None else limit - len(messages)
+                        archived = [dict(row) for row in
+                                    conn.execute(*page_query("archive", older_than, remaining)).fetchall()]
+                        messages.extend(archived)
+                        for reply in self._archived_replies(conn, [m['message_id'] for m in archived]):
+                            replies_by_message.setdefault(reply['message_id'], []).append(reply)
+
+        messages.reverse()
+        for message in messages:
+            message['replies'] = replies_by_message.get(message['message_id'], [])
+        return messages
+
+    @retry_on_busy
+    def get_all_messages(self) -> List[Dict[str, Any]]:
+        """Получить все сообщения, включая архивные"""
+        query = "SELECT * FROM {schema}.messages ORDER BY timestamp DESC"
+        with self.connection() as conn:
+            rows = conn.execute(query.format(schema="main")).fetchall()
+            for month in self._archive_months(conn):
+                with self._archive(conn, month) as attached:
+                    if attached:
+                        rows += conn.execute(query.format(schema="archive")).fetchall()
 
         return [dict(row) for row in rows]
 
+    @retry_on_busy
+    def get_recent_messages(self, limit: int = 10, offset: int = 0,
+                            with_reply_status: bool = True) -> List[Dict[str, Any]]:
+        """Получить limit последних сообщений, пропустив offset самых новых
+
+        Сообщения читаются по индексу idx_messages_timestamp, поэтому стоимость
+        запроса зависит от размера страницы, а не от числа сообщений в базе.
+        При with_reply_status у каждого сообщения есть ключ has_reply - он
+        вычисляется тем же запросом по idx_admin_replies_message_id.
+        Страницы за пределами основной базы читаются из архивов: все
+        архивные сообщения старше оставшихся в основной базе.
+        """
+        def page_query(schema: str) -> str:
+            reply_status = ""
+            if with_reply_status:
+                # На архивное сообщение могли ответить уже после архивации
+                reply_status = f""",
+                    EXISTS(SELECT 1 FROM {schema}.admin_replies r WHERE r.message_id = m.message_id)
+                    OR EXISTS(SELECT 1 FROM main.admin_replies r WHERE r.message_id = m.message_id)
+                    AS has_reply"""
+            return f"""
+                SELECT m.*{reply_status}
+                FROM {schema}.messages m
+                ORDER BY m.timestamp DESC, m.id DESC
+                LIMIT ? OFFSET ?
+            """
+
+        with self.connection() as conn:
+            rows = conn.execute(page_query("main"), (limit, offset)).fetchall()
+            if len(rows) < limit:
+                # Сколько сообщений основной базы осталось позади этой страницы
+                if rows:
+                    offset = 0
+                else:
+                    offset -= conn.execute("SELECT COUNT(*) FROM messages").fetchone()[0]
+                for month, count in self._archive_counts(conn):
+                    if len(rows) >= limit:
+                        break
+                    if offset >= count:
+                        offset -= count  # архив целиком до начала страницы - не открываем
+                        continue
+                    with self._archive(conn, month) as attached:
+                        if attached:
+                            rows += conn.execute(page_query("archive"), (limit - len(rows), offset)).fetchall()
+                    offset = 0
+
+        messages = [dict(row) for row in rows]
+        if with_reply_status:
+            for message in messages:
+                message['has_reply'] = bool(message['has_reply'])
+        return messages
+
+    @retry_on_busy
+    def count_messages(self) -> int:
+        """Число всех сообщений, включая сообщения администратора и архивные"""
+        with self.connection() as conn:
+            return conn.execute("""
+                SELECT (SELECT COUNT(*) FROM messages)
+                     + (SELECT COALESCE(SUM(messages), 0) FROM archives)
+            """).fetchone()[0]
+
     # ==================== ОТВЕТЫ АДМИНИСТРАТОРА ====================
 
+    @retry_on_busy
     def add_admin_reply(self, message_id: str, admin_id: int, reply_text: str) -> bool:
-        """Добавить ответ администратора"""
-        try:
-            conn = self.get_connection()
-            cursor = conn.cursor()
-
-            cursor.execute("""
-                INSERT INTO admin_replies (message_id, admin_id, reply_text)
-                VALUES (?, ?, ?)
-            """, (message_id, admin_id, reply_text))
+        """Добавить ответ администратора
 
-            conn.commit()
-            conn.close()
-            return True
+        Ответ всегда пишется в основную базу; если сообщение уже в архиве,
+        флаг is_answered и счетчик каталога archives обновляются там.
+        """
+        try:
+            with self.connection() as conn:
+                conn.execute("""
+                    INSERT INTO admin_replies (message_id, admin_id, reply_text)
+                    VALUES (?, ?, ?)
+                """, (message_id, admin_id, reply_text))
+                in_main = conn.execute("""
+                    UPDATE messages SET is_answered = 1
+                    WHERE message_id = ? AND is_answered = 0
+                """, (message_id,)).rowcount > 0 or conn.execute(
+                    "SELECT 1 FROM messages WHERE message_id = ?", (message_id,)
+                ).fetchone() is not None
         except Exception as e:
+            if is_busy_error(e):
+                raise  # Повтор выполнит retry_on_busy
             print(f"Ошибка при добавлении ответа: {e}")
             return False
 
-    def get_message_replies(self, message_id: str) -> List[Dict[str, Any]]:
-        """Получить все ответы на сообщение"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
+        if not in_main:
+            # Ответ уже записан, повторять его нельзя; расхождение исправит recompute_stats
+            try:
+                self._mark_archived_answered(message_id)
+            except sqlite3.Error as e:
+                print(f"Ошибка при обновлении архива: {e}")
+        return True
 
-        cursor.execute("""
-            SELECT * FROM admin_replies
-            WHERE message_id = ?
-            ORDER BY timestamp ASC
-        """, (message_id,))
-        rows = cursor.fetchall()
-        conn.close()
+    @retry_on_busy
+    def get_message_replies(self, message_id: str) -> List[Dict[str, Any]]:
+        """Получить все ответы на сообщение (для архивного сообщения - и из архива)"""
+        with self.connection() as conn:
+            rows = conn.execute("""
+                SELECT * FROM admin_replies
+                WHERE message_id = ?
+                ORDER BY timestamp ASC
+            """, (message_id,)).fetchall()
+            if conn.execute("SELECT 1 FROM messages WHERE message_id = ?", (message_id,)).fetchone() is None:
+                for month in self._archive_months(conn):
+                    with self._archive(conn, month) as attached:
+                        if attached and conn.execute(
+                            "SELECT 1 FROM archive.messages WHERE message_id = ?", (message_id,)
+                        ).fetchone() is not None:
+                            return self._archived_replies(conn, [message_id])
 
         return [dict(row) for row in rows]
 
+    @retry_on_busy
     def has_reply(self, message_id: str) -> bool:
         """Проверить, есть ли ответ на сообщение"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
+        with self.connection() as conn:
+            row = conn.execute("""
+                SELECT COUNT(*) as count FROM admin_replies WHERE message_id = ?
+            """, (message_id,)).fetchone()
 
-        cursor.execute("""
-            SELECT COUNT(*) as count FROM admin_replies WHERE message_id = ?
-        """, (message_id,))
-        row = cursor.fetchone()
-        conn.close()
-
-        return row['count'] > 0
+        return row['count'] > 0 or bool(self.get_message_replies(message_id))
 
     # ==================== ЧАТЫ (для веб-интерфейса) ====================
 
+    @retry_on_busy
     def get_chats_with_last_message(self) -> List[Dict[str, Any]]:
         """Получить список всех чатов с последним сообщением"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
+        with self.connection() as conn:
+            return self._select_chats(conn)
 
-        cursor.execute("""
+    @staticmethod
+    def _select_chats(conn: sqlite3.Connection) -> List[Dict[str, Any]]:
+        """Запрос списка чатов с последним сообщением на переданном соединении"""
+        rows = conn.execute("""
             SELECT
                 u.user_id,
                 u.username,
@@ -261,46 +996,149 @@ class Database:
                 u.last_name,
                 u.full_name,
                 u.last_seen,
-                (SELECT message_text FROM messages WHERE user_id = u.user_id
-                 ORDER BY timestamp DESC LIMIT 1) as last_message,
-                (SELECT timestamp FROM messages WHERE user_id = u.user_id
-                 ORDER BY timestamp DESC LIMIT 1) as last_message_time,
+                lm.message_text as last_message,
+                lm.timestamp as last_message_time,
                 (SELECT COUNT(*) FROM messages WHERE user_id = u.user_id
-                 AND message_id NOT IN (SELECT message_id FROM admin_replies)) as unread_count
+                 AND is_from_admin = 0 AND is_answered = 0) as unread_count
             FROM users u
+            LEFT JOIN messages lm ON lm.id = (
+                SELECT MAX(id) FROM messages WHERE user_id = u.user_id
+            )
             ORDER BY COALESCE(last_message_time, u.last_seen) DESC
-        """)
-        rows = cursor.fetchall()
-        conn.close()
+        """).fetchall()
 
         return [dict(row) for row in rows]
 
-    # ==================== СТАТИСТИКА ====================
+    @retry_on_busy
+    def get_chats_page(self, limit: int = 50, after: Optional[Tuple[str, int]] = None) -> List[Dict[str, Any]]:
+        """Получить страницу списка чатов без истории сообщений
 
-    def get_stats(self) -> Dict[str, Any]:
-        """Получить статистику"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
+        Чаты упорядочены по (sort_time, user_id) по убыванию, где
+        sort_time = COALESCE(время последнего сообщения, last_seen).
+        after - ключ (sort_time, user_id) последнего чата предыдущей страницы.
+        Страница читается по индексу idx_users_chat_order начиная с after,
+        поэтому ее стоимость не зависит от числа пользователей; последнее
+        сообщение и счетчик непрочитанных ищутся только для чатов страницы.
+        """
+        page = "SELECT *, " + CHAT_SORT_TIME + " AS sort_time FROM users {where} ORDER BY {order} LIMIT ?"
+        order = f"{CHAT_SORT_TIME} DESC, user_id DESC"
+        if after is None:
+            source, params = page.format(where="", order=order), [limit]
+        else:
+            # Два поиска по индексу: остаток чатов с тем же sort_time и чаты старше.
+            # Сравнение пар (sort_time, user_id) < (?, ?) SQLite выполнил бы обходом индекса с начала
+            after_time, after_user_id = after
+            source = f"""
+                SELECT * FROM ({page.format(where=f"WHERE {CHAT_SORT_TIME} = ? AND user_id < ?",
+                                            order="user_id DESC")})
+                UNION ALL
+                SELECT * FROM ({page.format(where=f"WHERE {CHAT_SORT_TIME} < ?", order=order)})
+                ORDER BY sort_time DESC, user_id DESC
+                LIMIT ?
+            """
+            params = [after_time, after_user_id, limit, after_time, limit, limit]
 
-        # Общее количество пользователей
-        cursor.execute("SELECT COUNT(*) as count FROM users")
-        total_users = cursor.fetchone()['count']
+        with self.connection() as conn:
+            rows = conn.execute(f"""
+                SELECT
+                    u.user_id,
+                    u.username,
+                    u.first_name,
+                    u.last_name,
+                    u.full_name,
+                    u.last_seen,
+                    substr(lm.message_text, 1, ?) as last_message,
+                    lm.timestamp as last_message_time,
+                    u.sort_time,
+                    (SELECT COUNT(*) FROM messages WHERE user_id = u.user_id
+                     AND is_from_admin = 0 AND is_answered = 0) as unread_count
+                FROM ({source}) u
+                LEFT JOIN messages lm ON lm.id = (
+                    SELECT MAX(id) FROM messages WHERE user_id = u.user_id
+                )
+                ORDER BY u.sort_time DESC, u.user_id DESC
+            """, [CHAT_PREVIEW_LENGTH] + params).fetchall()
 
-        # Общее количество сообщений
-        cursor.execute("SELECT COUNT(*) as count FROM messages WHERE is_from_admin = 0")
-        total_messages = cursor.fetchone()['count']
+        return [dict(row) for row in rows]
 
-        # Количество отвеченных сообщений
-        cursor.execute("""
-            SELECT COUNT(DISTINCT message_id) as count FROM admin_replies
-        """)
-        answered_messages = cursor.fetchone()['count']
+    @retry_on_busy
+    def get_chats_with_messages(self) -> List[Dict[str, Any]]:
+        """Получить все чаты вместе с сообщениями и ответами на них
+
+        Вместо отдельного запроса на каждого пользователя и каждое сообщение
+        выполняется два запроса (список чатов и все сообщения с ответами
+        через LEFT JOIN), а результат группируется за один проход.
+        Каждый чат содержит ключ "messages", каждое сообщение - ключ "replies".
+        """
+        with self.connection() as conn:
+            # Оба запроса читают один и тот же снимок базы
+            conn.execute("BEGIN")
+            chats = self._select_chats(conn)
+            # Сообщения читаются в порядке вставки (id растет вместе с timestamp),
+            # так что таблица сканируется последовательно и без сортировки
+            cursor = conn.cursor()
+            cursor.row_factory = None
+            cursor.execute("""
+                SELECT
+                    m.message_id,
+                    m.user_id,
+                    m.message_text,
+                    m.timestamp,
+                    m.is_from_admin,
+                    r.id,
+                    r.admin_id,
+                    r.reply_text,
+                    r.timestamp
+                FROM messages m
+                LEFT JOIN admin_replies r ON r.message_id = m.message_id
+                ORDER BY m.id, r.id
+            """)
+
+            messages_by_user: Dict[int, List[Dict[str, Any]]] = {}
+            current = None
+            for (message_id, user_id, message_text, timestamp, is_from_admin,
+                 reply_id, admin_id, reply_text, reply_timestamp) in cursor:
+                if current is None or current["message_id"] != message_id:
+                    current = {
+                        "message_id": message_id,
+                        "user_id": user_id,
+                        "message_text": message_text,
+                        "timestamp": timestamp,
+                        "is_from_admin": is_from_admin,
+                        "replies": [],
+                    }
+                    messages_by_user.setdefault(user_id, []).append(current)
+                if reply_id is not None:
+                    current["replies"].append({
+                        "admin_id": admin_id,
+                        "reply_text": reply_text,
+                        "timestamp": reply_timestamp,
+                    })
+
+        for chat in chats:
+            chat["messages"] = messages_by_user.get(chat["user_id"], [])
+        return chats
+
+    # ==================== СТАТИСТИКА ====================
+
+    @retry_on_busy
+    def get_stats(self) -> Dict[str, Any]:
+        """Получить статистику (счетчики из таблицы stats, без подсчета строк)"""
+        with self.connection() as conn:
+            # Сообщения, перенесенные в архив, учитываются по каталогу archives
+            row = conn.execute("""
+                SELECT
+                    total_users,
+                    total_messages + (SELECT COALESCE(SUM(user_messages), 0) FROM archives),
+                    answered_messages + (SELECT COALESCE(SUM(answered_messages), 0) FROM archives)
+                FROM stats WHERE id = 1
+            """).fetchone()
+
+        total_users, total_messages, answered_messages = row if row else (0, 0, 0)
 
         # Количество неотвеченных сообщений
         unanswered_messages = total_messages - answered_messages
 
-        conn.close()
-
         return {
             "total_users": total_users,
             "total_messages": total_messages,
@@ -308,18 +1146,763 @@ class Database:
             "unanswered_messages": unanswered_messages
         }
 
+    @retry_on_busy
+    def recompute_stats(self) -> Dict[str, Any]:
+        """Пересчитать статистику по исходным таблицам и архивам (исправляет расхождения)"""
+        with self.connection() as conn:
+            self._recompute_stats(conn.cursor())
+            conn.commit()  # ATTACH невозможен внутри транзакции
+            for month in self._archive_months(conn):
+                with self._archive(conn, month) as attached:
+                    if attached:
+                        self._recompute_archive_stats(conn, month)
+                        conn.commit()
+            # Событие меняет версию данных: ETag /api/stats и списков устаревает
+            conn.execute("INSERT INTO events (type) VALUES ('stats_recomputed')")
+
+        return self.get_stats()
+
+    # ==================== ЛЕНТА ИЗМЕНЕНИЙ ====================
+
+    @retry_on_busy
+    def get_last_event_id(self) -> int:
+        """ID последнего события в ленте (0, если лента пуста)"""
+        with self.connection() as conn:
+            row = conn.execute("SELECT MAX(id) FROM events").fetchone()
+
+        return row[0] or 0
+
+    @retry_on_busy
+    def get_data_version(self) -> int:
+        """Версия данных: растет при каждом событии в ленте и никогда не уменьшается
+
+        Берется из sqlite_sequence (AUTOINCREMENT), поэтому не сбрасывается
+        ни при очистке ленты, ни после prune_events. Чтение - один поиск по ключу.
+        """
+        with self.connection() as conn:
+            row = conn.execute("SELECT seq FROM sqlite_sequence WHERE name = 'events'").fetchone()
+
+        return row[0] if row else 0
+
+    @retry_on_busy
+    def get_events(self, after_id: int, limit: int = 100) -> List[Dict[str, Any]]:
+        """Получить события с id > after_id вместе с данными, на которые они ссылаются
+
+        Каждое событие содержит id, type ('new_user', 'new_message', 'new_reply'),
+        user_id, message_id, актуальный unread_count пользователя и словари
+        "user", "message" и "reply" (заполнены в зависимости от типа).
+        """
+        with self.connection() as conn:
+            rows = conn.execute("""
+                SELECT
+                    e.id, e.type, e.user_id, e.message_id,
+                    u.username, u.first_name, u.last_name, u.full_name, u.last_seen,
+                    m.id AS m_id, m.message_text, m.timestamp AS m_timestamp, m.is_from_admin,
+                    r.id AS r_id, r.admin_id, r.reply_text, r.timestamp AS r_timestamp,
+                    (SELECT COUNT(*) FROM messages WHERE user_id = e.user_id
+                     AND is_from_admin = 0 AND is_answered = 0) AS unread_count
+                FROM events e
+                LEFT JOIN users u ON u.user_id = e.user_id
+                LEFT JOIN messages m ON e.type = 'new_message' AND m.id = e.ref_id
+                LEFT JOIN admin_replies r ON e.type = 'new_reply' AND r.id = e.ref_id
+                WHERE e.id > ?
+                ORDER BY e.id
+                LIMIT ?
+            """, (after_id, limit)).fetchall()
+
+        events = []
+        for row in rows:
+            event = {
+                "id": row['id'],
+                "type": row['type'],
+                "user_id": row['user_id'],
+                "message_id": row['message_id'],
+                "unread_count": row['unread_count'],
+                "user": {
+                    "user_id": row['user_id'],
+                    "username": row['username'],
+                    "first_name": row['first_name'],
+                    "last_name": row['last_name'],
+                    "full_name": row['full_name'],
+                    "last_seen": row['last_seen'],
+                },
+                "message": None,
+                "reply": None,
+            }
+            if row['m_id'] is not None:
+                event["message"] = {
+                    "id": row['m_id'],
+                    "message_id": row['message_id'],
+                    "message_text": row['message_text'],
+                    "timestamp": row['m_timestamp'],
+                    "is_from_admin": row['is_from_admin'],
+                }
+            if row['r_id'] is not None:
+                event["reply"] = {
+                    "id": row['r_id'],
+                    "admin_id": row['admin_id'],
+                    "reply_text": row['reply_text'],
+                    "timestamp": row['r_timestamp'],
+                }
+            events.append(event)
+
+        return events
+
+    @retry_on_busy
+    def prune_events(self, keep: int = EVENTS_KEEP) -> int:
+        """Удалить из ленты все события, кроме последних keep; вернуть число удаленных"""
+        with self.connection() as conn:
+            return self._prune_events(conn, keep)
+
+    @staticmethod
+    def _prune_events(conn: sqlite3.Connection, keep: int) -> int:
+        """Удалить старые события на переданном соединении (без коммита)"""
+        cursor = conn.execute("""
+            DELETE FROM events WHERE id <= (SELECT MAX(id) FROM events) - ?
+        """, (keep,))
+        return cursor.rowcount
+
+    def _prune_events_if_due(self, conn: sqlite3.Connection):
+        """Очистить ленту в транзакции записи, если с прошлой очистки прошло EVENTS_PRUNE_INTERVAL
+
+        Триггеры пишут событие на каждого пользователя, сообщение и ответ,
+        поэтому лента очищается и тогда, когда консоль (SSE) не подключена.
+        """
+        now = time.monotonic()
+        if now - self._events_pruned_at >= EVENTS_PRUNE_INTERVAL:
+            self._events_pruned_at = now
+            self._prune_events(conn, EVENTS_KEEP)
+
+    # ==================== ПОИСК ====================
+
+    @staticmethod
+    def _fts_query(text: str) -> str:
+        """Запрос FTS5 из пользовательского текста
+
+        Все слова должны встретиться в тексте; слово со звездочкой на конце
+        ищется по префиксу ("заказ*" находит "заказа"). Слова берутся в
+        кавычки, поэтому операторы FTS5 во вводе (AND, NEAR, "-") не ломают запрос.
+        """
+        return " ".join(f'"{word}"{star}' for word, star in re.findall(r"(\w+)(\*?)", text))
+
+    def search(self, query: str, limit: int = 20, cursor: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Полнотекстовый поиск по сообщениям и ответам администратора (см. search_page)"""
+        return self.search_page(query, limit, cursor)[0]
+
+    @retry_on_busy
+    def search_page(self, query: str, limit: int = 20,
+                    cursor: Optional[int] = None) -> Tuple[List[Dict[str, Any]], Optional[int]]:
+        """Страница полнотекстового поиска и курсор следующей страницы
+
+        Результаты упорядочены по релевантности (bm25), у каждого есть kind
+        ('message' или 'reply'), id строки, message_id, user_id, text,
+        timestamp, rank и данные пользователя (username, full_name).
+        cursor - число уже показанных совпадений (смещение в выдаче).
+        Следующий курсор считается по совпадениям в индексе, а не по
+        найденным строкам, поэтому выпавшая строка не обрывает выдачу
+        (None - совпадений больше нет).
+        """
+        match = self._fts_query(query)
+        if not match:
+            return [], None
+        offset = cursor or 0
+        # Из каждого индекса нужно не больше offset + limit лучших совпадений,
+        # поэтому соединение с таблицами выполняется только для страницы
+        top = offset + limit
+
+        with self.connection() as conn:
+            conn.execute("BEGIN")
+            hits = conn.execute("""
+                SELECT * FROM (
+                    SELECT 'message' AS kind, rowid AS id, rank FROM messages_fts
+                    WHERE messages_fts MATCH :match ORDER BY rank LIMIT :top
+                )
+                UNION ALL
+                SELECT * FROM (
+                    SELECT 'reply' AS kind, rowid AS id, rank FROM admin_replies_fts
+                    WHERE admin_replies_fts MATCH :match ORDER BY rank LIMIT :top
+                )
+                ORDER BY rank, kind, id
+                LIMIT :limit OFFSET :offset
+            """, {"match": match, "top": top, "limit": limit, "offset": offset}).fetchall()
+
+            results = []
+            for hit in hits:
+                if hit['kind'] == 'message':
+                    row = conn.execute("""
+                        SELECT m.id, m.message_id, m.user_id, m.message_text AS text, m.timestamp,
+                               m.is_from_admin, u.username, u.full_name
+                        FROM messages m LEFT JOIN users u ON u.user_id = m.user_id
+                        WHERE m.id = ?
+                    """, (hit['id'],)).fetchone()
+                else:
+                    # Сообщение, на которое ответили, может быть уже в архиве
+                    row = conn.execute("""
+                        SELECT r.id, r.message_id, m.user_id, r.reply_text AS text, r.timestamp,
+                               1 AS is_from_admin, u.username, u.full_name
+                        FROM admin_replies r
+                        LEFT JOIN messages m ON m.message_id = r.message_id
+                        LEFT JOIN users u ON u.user_id = m.user_id
+                        WHERE r.id = ?
+                    """, (hit['id'],)).fetchone()
+                if row is not None:
+                    results.append({"kind": hit['kind'], "rank": hit['rank'], **dict(row)})
+            conn.rollback()  # ATTACH невозможен внутри транзакции
+
+            for result in results:
+                if result['user_id'] is None:
+                    archived = self._find_archived_message(conn, result['message_id'])
+                    if archived is not None:
+                        user = conn.execute("SELECT username, full_name FROM users WHERE user_id = ?",
+                                            (archived['user_id'],)).fetchone()
+                        result.update(user_id=archived['user_id'], **(dict(user) if user else {}))
+
+        return results, (offset + limit if len(hits) == limit else None)
+
+    # ==================== ПОЛУЧАТЕЛИ ====================
+
+    @retry_on_busy
+    def get_recipients(self) -> List[int]:
+        """Получить ID получателей из таблицы recipients"""
+        with self.connection() as conn:
+            rows = conn.execute("SELECT chat_id FROM recipients ORDER BY added_at, chat_id").fetchall()
+        return [row[0] for row in rows]
+
+    @retry_on_busy
+    def add_recipient(self, chat_id: int) -> bool:
+        """Добавить получателя; False, если он уже есть"""
+        with self.connection() as conn:
+            cursor = conn.execute("INSERT OR IGNORE INTO recipients (chat_id) VALUES (?)", (chat_id,))
+            return cursor.rowcount > 0
+
+    @retry_on_busy
+    def remove_recipient(self, chat_id: int) -> bool:
+        """Удалить получателя; False, если его не было"""
+        with self.connection() as conn:
+            cursor = conn.execute("DELETE FROM recipients WHERE chat_id = ?", (chat_id,))
+            return cursor.rowcount > 0
+
+    # ==================== СОСТОЯНИЕ ДИАЛОГОВ ====================
+
+    @retry_on_busy
+    def get_state(self, namespace: str, key: str) -> Optional[Any]:
+        """Получить значение состояния (None, если его нет или оно истекло)"""
+        with self.connection() as conn:
+            row = conn.execute("""
+                SELECT value FROM state
+                WHERE namespace = ? AND key = ? AND (expires_at IS NULL OR expires_at > ?)
+            """, (namespace, str(key), time.time())).fetchone()
+
+        return json.loads(row[0]) if row else None
+
+    @retry_on_busy
+    def get_states(self, namespace: str) -> Dict[str, Any]:
+        """Получить все неистекшие значения пространства имен {key: value}"""
+        with self.connection() as conn:
+            rows = conn.execute("""
+                SELECT key, value FROM state
+                WHERE namespace = ? AND (expires_at IS NULL OR expires_at > ?)
+            """, (namespace, time.time())).fetchall()
+
+        return {key: json.loads(value) for key, value in rows}
+
+    @retry_on_busy
+    def set_state(self, namespace: str, key: str, value: Any, ttl: Optional[float] = None):
+        """Сохранить значение состояния; ttl - срок жизни в секундах (None - бессрочно)"""
+        expires_at = time.time() + ttl if ttl else None
+        with self.connection() as conn:
+            conn.execute("""
+                INSERT INTO state (namespace, key, value, expires_at) VALUES (?, ?, ?, ?)
+                ON CONFLICT(namespace, key) DO UPDATE SET
+                    value = excluded.value,
+                    expires_at = excluded.expires_at
+            """, (namespace, str(key), json.dumps(value), expires_at))
+
+    @retry_on_busy
+    def delete_state(self, namespace: str, key: str) -> bool:
+        """Удалить значение состояния; False, если его не было"""
+        with self.connection() as conn:
+            cursor = conn.execute("DELETE FROM state WHERE namespace = ? AND key = ?",
+                                  (namespace, str(key)))
+            return cursor.rowcount > 0
+
+    @retry_on_busy
+    def prune_state(self) -> int:
+        """Удалить истекшие значения состояния; вернуть число удаленных"""
+        with self.connection() as conn:
+            cursor = conn.execute("DELETE FROM state WHERE expires_at <= ?", (time.time(),))
+            return cursor.rowcount
+
+    # ==================== АРХИВ ====================
+
+    def archive_path(self, month: str) -> Path:
+        """Файл архива за месяц 'YYYY-MM'"""
+        return self.archive_dir / f"{Path(self.db_path).stem}-{month}.db"
+
+    @staticmethod
+    def _archive_months(conn: sqlite3.Connection) -> List[str]:
+        """Месяцы, для которых есть архивы, от новых к старым"""
+        return [row[0] for row in conn.execute("SELECT month FROM archives ORDER BY month DESC")]
+
+    @staticmethod
+    def _archive_counts(conn: sqlite3.Connection) -> List[Tuple[str, int]]:
+        """(месяц, число сообщений в архиве) от новых к старым"""
+        return [(row[0], row[1]) for row in
+                conn.execute("SELECT month, messages FROM archives ORDER BY month DESC")]
+
+    @contextmanager
+    def _archive(self, conn: sqlite3.Connection, month: str, create: bool = False) -> Iterator[bool]:
+        """Подключить архив месяца к соединению под именем archive
+
+        Возвращает False, если файла нет (и create=False) - тогда архив
+        пропускается. После выхода архив отключается, и соединение
+        возвращается в пул в прежнем виде.
+        """
+        path = self.archive_path(month)
+        if not create and not path.exists():
+            # Проверяется при каждом чтении, поэтому сообщаем один раз на файл
+            if path not in self._missing_archives:
+                self._missing_archives.add(path)
+                logger.warning("Архив %s не найден, сообщения за %s недоступны", path, month)
+            yield False
+            return
+
+        if create:
+            path.parent.mkdir(parents=True, exist_ok=True)
+        conn.execute("ATTACH DATABASE ? AS archive", (str(path),))
+        try:
+            yield True
+        finally:
+            if conn.in_transaction:
+                conn.rollback()
+            conn.execute("DETACH DATABASE archive")
+
+    def _find_archived_message(self, conn: sqlite3.Connection, message_id: str) -> Optional[sqlite3.Row]:
+        """Найти сообщение в архивах (от новых к старым)"""
+        for month in self._archive_months(conn):
+            with self._archive(conn, month) as attached:
+                if not attached:
+                    continue
+                row = conn.execute("SELECT * FROM archive.messages WHERE message_id = ?",
+                                   (message_id,)).fetchone()
+                if row is not None:
+                    return row
+        return None
+
+    @staticmethod
+    def _archived_replies(conn: sqlite3.Connection, message_ids: List[str]) -> List[Dict[str, Any]]:
+        """Ответы на сообщения подключенного архива
+
+        Ответы, отправленные уже после архивации, лежат в основной базе,
+        поэтому читаются обе таблицы.
+        """
+        if not message_ids:
+            return []
+        placeholders = ", ".join("?" * len(message_ids))
+        rows = conn.execute(f"""
+            SELECT * FROM archive.admin_replies WHERE message_id IN ({placeholders})
+            UNION ALL
+            SELECT * FROM main.admin_replies WHERE message_id IN ({placeholders})
+            ORDER BY timestamp ASC, id ASC
+        """, message_ids + message_ids).fetchall()
+        return [dict(row) for row in rows]
+
+    @retry_on_busy
+    def _mark_archived_answered(self, message_id: str) -> bool:
+        """Отметить архивное сообщение отвеченным; False, если его нет в архивах"""
+        with self.connection() as conn:
+            for month in self._archive_months(conn):
+                with self._archive(conn, month) as attached:
+                    if not attached:
+                        continue
+                    if conn.execute("""
+                        UPDATE archive.messages SET is_answered = 1
+                        WHERE message_id = ? AND is_answered = 0
+                    """, (message_id,)).rowcount:
+                        conn.execute("""
+                            UPDATE archives SET answered_messages = answered_messages + 1
+                            WHERE month = ? AND EXISTS (
+                                SELECT 1 FROM archive.messages WHERE message_id = ? AND is_from_admin = 0
+                            )
+                        """, (month, message_id))
+                        conn.commit()
+                        return True
+                    if conn.execute("SELECT 1 FROM archive.messages WHERE message_id = ?",
+                                    (message_id,)).fetchone() is not None:
+                        return True  # Уже отмечено
+        return False
+
+    @staticmethod
+    def _update_archive_catalog(conn: sqlite3.Connection, month: str):
+        """Пересчитать строку каталога archives по подключенному архиву (без коммита)"""
+        conn.execute("""
+            INSERT INTO archives (month, messages, user_messages, answered_messages)
+            SELECT ?, COUNT(*), COALESCE(SUM(is_from_admin = 0), 0),
+                   COALESCE(SUM(is_from_admin = 0 AND is_answered), 0)
+            FROM archive.messages
+            WHERE true  -- без WHERE SQLite принял бы ON CONFLICT за часть SELECT
+            ON CONFLICT(month) DO UPDATE SET
+                messages = excluded.messages,
+                user_messages = excluded.user_messages,
+                answered_messages = excluded.answered_messages,
+                archived_at = CURRENT_TIMESTAMP
+        """, (month,))
+
+    @classmethod
+    def _recompute_archive_stats(cls, conn: sqlite3.Connection, month: str):
+        """Пересчитать is_answered в подключенном архиве и его строку каталога (без коммита)
+
+        Ответ на архивное сообщение может лежать и в архиве, и в основной базе.
+        """
+        answered = """(message_id IN (SELECT message_id FROM archive.admin_replies)
+                       OR message_id IN (SELECT message_id FROM main.admin_replies))"""
+        conn.execute(f"UPDATE archive.messages SET is_answered = {answered} WHERE is_answered != {answered}")
+        cls._update_archive_catalog(conn, month)
+
+    @staticmethod
+    def _create_archive_schema(conn: sqlite3.Connection):
+        """Таблицы и индексы в подключенном архиве (те же, что в основной базе)"""
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS archive.messages (
+                id INTEGER PRIMARY KEY,
+                message_id TEXT UNIQUE NOT NULL,
+                user_id INTEGER NOT NULL,
+                message_text TEXT NOT NULL,
+                message_length INTEGER,
+                timestamp TIMESTAMP,
+                admin_message_id INTEGER,
+                is_from_admin INTEGER DEFAULT 0,
+                is_answered INTEGER NOT NULL DEFAULT 0
+            )
+        """)
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS archive.admin_replies (
+                id INTEGER PRIMARY KEY,
+                message_id TEXT NOT NULL,
+                admin_id INTEGER NOT NULL,
+                reply_text TEXT NOT NULL,
+                timestamp TIMESTAMP
+            )
+        """)
+        conn.execute("CREATE INDEX IF NOT EXISTS archive.idx_messages_user_id ON messages(user_id)")
+        conn.execute("CREATE INDEX IF NOT EXISTS archive.idx_messages_timestamp ON messages(timestamp)")
+        conn.execute("CREATE INDEX IF NOT EXISTS archive.idx_admin_replies_message_id ON admin_replies(message_id)")
+
+    def archive_messages(self, older_than_days: int = DEFAULT_ARCHIVE_AFTER_DAYS) -> Dict[str, int]:
+        """Перенести сообщения старше older_than_days дней в помесячные архивы
+
+        Сообщения и ответы на них переносятся в файлы archive_path(месяц),
+        основная база остается небольшой. Методы чтения сообщений
+        (get_message, get_user_messages_page, get_recent_messages и другие)
+        продолжают находить перенесенные сообщения в архивах, а get_stats
+        учитывает их по каталогу archives. Поиск (search) и список чатов
+        работают только по основной базе. Возвращает {месяц: перенесено}.
+        """
+        with self.connection() as conn:
+            cutoff = conn.execute("SELECT datetime('now', ?)", (f"-{int(older_than_days)} days",)).fetchone()[0]
+            months = [row[0] for row in conn.execute("""
+                SELECT DISTINCT strftime('%Y-%m', timestamp) FROM messages
+                WHERE timestamp < ? ORDER BY 1
+            """, (cutoff,))]
+
+        return {month: self._archive_month(month, cutoff) for month in months}
+
+    @retry_on_busy
+    def _archive_month(self, month: str, cutoff: str) -> int:
+        """Перенести в архив сообщения месяца month старше cutoff
+
+        Сначала строки копируются в архив и фиксируются там, затем
+        удаляются из основной базы - те и только те, что уже есть в архиве.
+        Транзакции в разных файлах WAL не атомарны вместе, поэтому сбой
+        между шагами оставляет лишь копию, которую следующий запуск допишет.
+        """
+        start = f"{month}-01"
+        condition = "m.timestamp >= ? AND m.timestamp < date(?, '+1 month') AND m.timestamp < ?"
+        params = (start, start, cutoff)
+
+        with self.connection() as conn, self._archive(conn, month, create=True):
+            self._create_archive_schema(conn)
+            conn.execute(f"""
+                INSERT OR REPLACE INTO archive.messages ({MESSAGE_COLUMNS})
+                SELECT {MESSAGE_COLUMNS} FROM main.messages m WHERE {condition}
+            """, params)
+            conn.execute(f"""
+                INSERT OR IGNORE INTO archive.admin_replies ({REPLY_COLUMNS})
+                SELECT {', '.join('r.' + column for column in REPLY_COLUMNS.split(', '))}
+                FROM main.admin_replies r JOIN main.messages m ON m.message_id = r.message_id
+                WHERE {condition}
+            """, params)
+            conn.commit()
+
+            conn.execute("BEGIN IMMEDIATE")
+            # Ответы, пришедшие после копирования, остаются в основной базе,
+            # но флаг отвеченного нужно перенести в архив до удаления
+            conn.execute("""
+                UPDATE archive.messages SET is_answered = 1
+                WHERE is_answered = 0 AND id IN (SELECT id FROM main.messages WHERE is_answered = 1)
+            """)
+            conn.execute("DELETE FROM main.admin_replies WHERE id IN (SELECT id FROM archive.admin_replies)")
+            moved = conn.execute("DELETE FROM main.messages WHERE id IN (SELECT id FROM archive.messages)").rowcount
+            self._update_archive_catalog(conn, month)
+            # Событие меняет версию данных, чтобы закешированные страницы веб-интерфейса обновились
+            conn.execute("INSERT INTO events (type, message_id, ref_id) VALUES ('archived', ?, ?)",
+                         (month, moved))
+            conn.commit()
+
+        return moved
+
     # ==================== УТИЛИТЫ ====================
 
+    @retry_on_busy
     def clear_all_data(self):
         """Очистить все данные (для тестирования)"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
+        with self.connection() as conn:
+            cursor = conn.cursor()
 
-        cursor.execute("DELETE FROM admin_replies")
-        cursor.execute("DELETE FROM messages")
-        cursor.execute("DELETE FROM users")
+            cursor.execute("DELETE FROM admin_replies")
+            cursor.execute("DELETE FROM messages")
+            cursor.execute("DELETE FROM users")
+            cursor.execute("DELETE FROM events")
+            months = self._archive_months(conn)
+            cursor.execute("DELETE FROM archives")
+
+        for month in months:
+            self.archive_path(month).unlink(missing_ok=True)
 
-        conn.commit()
-        conn.close()
         print("✅ Все данные удалены из базы данных")
 
+
+class WriteBehindQueue:
+    """Очередь отложенной записи пользователей и сообщений
+
+    Вызовы add_or_update_user и add_message копятся в памяти и пишутся
+    одной транзакцией (Database.write_batch) раз в flush_interval секунд
+    или при накоплении max_batch строк. Повторные обновления одного
+    пользователя внутри пачки схлопываются в одно. Вместо коммита на каждое
+    сообщение получается один коммит на пачку.
+
+    Для сообщений возвращается Future с результатом add_message. При
+    sync_commit сообщения не ждут конца интервала: поток пишет их, как только
+    освободится, а все, что пришло за время предыдущего коммита, уходит одной
+    пачкой (групповой коммит). При close() все накопленное записывается.
+    """
+
+    def __init__(self, database: Database, flush_interval: float = DEFAULT_FLUSH_INTERVAL,
+                 max_batch: int = DEFAULT_BATCH_SIZE, sync_commit: bool = False):
+        self.database = database
+        self.flush_interval = flush_interval
+        self.max_batch = max_batch
+        self.sync_commit = sync_commit
+        self._users: Dict[int, Dict[str, Any]] = {}
+        self._messages: List[Tuple[Dict[str, Any], Future]] = []
+        self._flushed: List[Future] = []
+        self._in_flight = False  # поток пишет пачку, уже изъятую из очереди
+        self._cond = threading.Condition()
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name="db-write-behind", daemon=True)
+        self._thread.start()
+
+    def _pending(self) -> int:
+        return len(self._users) + len(self._messages)
+
+    def _ready(self) -> bool:
+        """Пора писать, не дожидаясь конца интервала (вызывается под _cond)"""
+        return (self._closed or bool(self._flushed) or self._pending() >= self.max_batch
+                or (self.sync_commit and bool(self._messages)))
+
+    def _submit(self):
+        """Разбудить поток записи, если пора писать (вызывается под _cond)"""
+        if self._closed:
+            raise RuntimeError("WriteBehindQueue закрыта")
+        if self._ready():
+            self._cond.notify()
+
+    def add_or_update_user(self, user_id: int, **fields):
+        """Поставить обновление пользователя в очередь"""
+        with self._cond:
+            self._users[user_id] = dict(fields, user_id=user_id)
+            self._submit()
+
+    def add_message(self, message_id: str, user_id: int, message_text: str,
+                    admin_message_id: int = None, is_from_admin: bool = False) -> Future:
+        """Поставить сообщение в очередь; Future получит результат add_message"""
+        future = Future()
+        with self._cond:
+            self._messages.append(({
+                "message_id": message_id,
+                "user_id": user_id,
+                "message_text": message_text,
+                "admin_message_id": admin_message_id,
+                "is_from_admin": is_from_admin,
+            }, future))
+            self._submit()
+        return future
+
+    def flush(self):
+        """Записать все накопленное и дождаться коммита
+
+        Пачка, которую поток уже забрал из очереди, тоже дожидается коммита:
+        маркер обрабатывается только на следующем проходе потока.
+        """
+        with self._cond:
+            if not self._pending() and not self._in_flight:
+                return
+            marker = Future()
+            self._flushed.append(marker)
+            self._cond.notify()
+        marker.result()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                deadline = time.monotonic() + self.flush_interval
+                while not self._ready():
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                users, self._users = list(self._users.values()), {}
+                messages, self._messages = self._messages, []
+                flushed, self._flushed = self._flushed, []
+                closed = self._closed
+                self._in_flight = bool(users or messages)
+
+            if users or messages:
+                try:
+                    self._write(users, messages)
+                finally:
+                    with self._cond:
+                        self._in_flight = False
+            for marker in flushed:
+                marker.set_result(None)
+            if closed:
+                return
+
+    def _write(self, users: List[Dict[str, Any]], messages: List[Tuple[Dict[str, Any], Future]]):
+        try:
+            results = self.database.write_batch(users, [message for message, _ in messages])
+        except Exception as e:
+            print(f"Ошибка отложенной записи ({len(users)} польз., {len(messages)} сообщ.): {e}")
+            for _, future in messages:
+                future.set_exception(e)
+            return
+        for (_, future), result in zip(messages, results):
+            future.set_result(result)
+
+    def close(self):
+        """Записать накопленное и остановить поток"""
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+        self._thread.join()
+
+
+class AsyncDatabase:
+    """Асинхронная обертка над Database для обработчиков на asyncio
+
+    Методы Database вызываются через await и выполняются вне event loop:
+    запись - в одном выделенном потоке (SQLite все равно допускает только
+    одного писателя), чтение - в небольшом пуле потоков. Так медленный
+    fsync не останавливает обработку остальных апдейтов.
+    """
+
+    READ_METHODS = frozenset({
+        "get_user", "get_all_users", "get_message", "get_user_messages",
+        "get_user_messages_page", "get_all_messages", "get_recent_messages",
+        "count_messages", "get_message_replies", "has_reply",
+        "get_chats_with_last_message", "get_chats_page", "get_chats_with_messages",
+        "get_stats", "get_last_event_id", "get_data_version", "get_events", "search",
+        "search_page", "get_recipients", "get_state", "get_states",
+    })
+    WRITE_METHODS = frozenset({
+        "add_or_update_user", "add_message", "add_admin_reply",
+        "recompute_stats", "prune_events", "clear_all_data",
+        "add_recipient", "remove_recipient", "set_state", "delete_state", "prune_state",
+        "archive_messages",
+    })
+
+    def __init__(self, database: Database, read_workers: Optional[int] = None,
+                 write_behind: bool = False, sync_commit: bool = True,
+                 flush_interval: float = DEFAULT_FLUSH_INTERVAL,
+                 batch_size: int = DEFAULT_BATCH_SIZE):
+        self.sync = database
+        if read_workers is None:
+            # Одно соединение из пула оставляем потоку записи
+            read_workers = max(1, database.pool.size - 1)
+        self._reader = ThreadPoolExecutor(max_workers=read_workers, thread_name_prefix="db-read")
+        self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="db-write")
+        # При write_behind пользователи и сообщения пишутся пачками. sync_commit:
+        # add_message ждет коммита своей пачки (иначе возвращает True сразу,
+        # и сообщения за последние flush_interval могут потеряться при сбое)
+        self.sync_commit = sync_commit
+        self.write_queue = (WriteBehindQueue(database, flush_interval, batch_size, sync_commit)
+                            if write_behind else None)
+
+    @classmethod
+    def from_env(cls, database: Database) -> "AsyncDatabase":
+        """Создать обертку с настройками из переменных окружения
+
+        DB_WRITE_BEHIND (1/0), DB_SYNC_COMMIT (1/0), DB_FLUSH_INTERVAL_MS,
+        DB_BATCH_SIZE.
+        """
+        return cls(
+            database,
+            write_behind=bool(_env_int("DB_WRITE_BEHIND", 0)),
+            sync_commit=bool(_env_int("DB_SYNC_COMMIT", 1)),
+            flush_interval=_env_int("DB_FLUSH_INTERVAL_MS", int(DEFAULT_FLUSH_INTERVAL * 1000)) / 1000,
+            batch_size=_env_int("DB_BATCH_SIZE", DEFAULT_BATCH_SIZE),
+        )
+
+    async def add_or_update_user(self, user_id: int, **fields):
+        """Добавить или обновить пользователя"""
+        if self.write_queue is None:
+            return await self._call(self._writer, self.sync.add_or_update_user, user_id, **fields)
+        self.write_queue.add_or_update_user(user_id, **fields)
+
+    async def add_message(self, *args, **kwargs) -> bool:
+        """Добавить сообщение"""
+        if self.write_queue is None:
+            return await self._call(self._writer, self.sync.add_message, *args, **kwargs)
+        future = self.write_queue.add_message(*args, **kwargs)
+        if not self.sync_commit:
+            return True
+        return await asyncio.wrap_future(future)
+
+    async def _call(self, executor: ThreadPoolExecutor, method, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        if self.write_queue is not None:
+            # Остальные операции видят все, что стоит в очереди отложенной записи
+            method = self._after_flush(method)
+        return await loop.run_in_executor(executor, partial(method, *args, **kwargs))
+
+    def _after_flush(self, method):
+        @wraps(method)
+        def call(*args, **kwargs):
+            self.write_queue.flush()
+            return method(*args, **kwargs)
+        return call
+
+    def __getattr__(self, name):
+        if name in self.WRITE_METHODS:
+            executor = self._writer
+        elif name in self.READ_METHODS:
+            executor = self._reader
+        else:
+            raise AttributeError(f"AsyncDatabase не поддерживает {name!r}")
+
+        method = getattr(self.sync, name)
+
+        async def call(*args, **kwargs):
+            return await self._call(executor, method, *args, **kwargs)
+
+        call.__name__ = name
+        call.__doc__ = method.__doc__
+        return call
+
+    def close(self):
+        """Дождаться завершения запущенных операций и закрыть базу"""
+        if self.write_queue is not None:
+            self.write_queue.close()
+        self._writer.shutdown(wait=True)
+        self._reader.shutdown(wait=True)
+        self.sync.close()
@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""
+Loop monitor для Anonymous Bot
+Измерение задержки event loop (loop lag)
+"""
+
+import asyncio
+import logging
+import time
+from collections import deque
+from typing import Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class LoopLagMonitor:
+    """Фоновая задача, измеряющая задержку event loop
+
+    Каждые interval секунд задача засыпает и смотрит, насколько позже
+    запланированного она проснулась. Если какой-то обработчик блокирует
+    loop (например, синхронным обращением к диску), задержка растет.
+    Раз в report_every секунд в лог пишется сводка p50/p99/max.
+    """
+
+    def __init__(self, interval: float = 0.1, report_every: float = 60.0, window: int = 10000):
+        self.interval = interval
+        self.report_every = report_every
+        self._samples: deque = deque(maxlen=window)
+        self._max_lag = 0.0
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self) -> asyncio.Task:
+        """Запустить измерение в текущем event loop"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run())
+        return self._task
+
+    async def stop(self):
+        """Остановить измерение"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        last_report = time.monotonic()
+        while True:
+            expected = time.monotonic() + self.interval
+            await asyncio.sleep(self.interval)
+            now = time.monotonic()
+            lag = max(0.0, now - expected)
+            self._samples.append(lag)
+            self._max_lag = max(self._max_lag, lag)
+
+            if now - last_report >= self.report_every:
+                stats = self.snapshot(reset=True)
+                logger.info(
+                    f"⏱️ Задержка event loop: p50={stats['p50_ms']} мс, "
+                    f"p99={stats['p99_ms']} мс, max={stats['max_ms']} мс"
+                )
+                last_report = now
+
+    def snapshot(self, reset: bool = False) -> Dict[str, float]:
+        """Сводка задержек (мс) за текущее окно; reset - начать новое окно"""
+        samples = sorted(self._samples)
+
+        def at(p):
+            if not samples:
+                return 0.0
+            return round(samples[min(len(samples) - 1, int(p / 100 * len(samples)))] * 1000, 2)
+
+        stats = {
+            "samples": len(samples),
+            "p50_ms": at(50),
+            "p99_ms": at(99),
+            "max_ms": round(self._max_lag * 1000, 2),
+        }
+        if reset:
+            self._samples.clear()
+            self._max_lag = 0.0
+        return stats
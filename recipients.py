@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""
+Recipients module для Anonymous Bot
+Реестр получателей анонимных сообщений: RECIPIENTS из .env и таблица recipients
+"""
+
+import logging
+import os
+from typing import FrozenSet
+
+from dotenv import load_dotenv
+
+logger = logging.getLogger(__name__)
+
+
+def parse_recipients(value: str) -> FrozenSet[int]:
+    """Разобрать список ID через запятую, пропуская некорректные"""
+    recipients = set()
+    for recipient_id in value.split(','):
+        recipient_id = recipient_id.strip()
+        if recipient_id:
+            try:
+                recipients.add(int(recipient_id))
+            except ValueError:
+                logger.warning(f"⚠️ Некорректный ID получателя: {recipient_id}")
+    return frozenset(recipients)
+
+
+class RecipientRegistry:
+    """Набор получателей, загруженный один раз и заменяемый целиком
+
+    ids - неизменяемый frozenset: проверка «это получатель?» - O(1), а
+    обработчики, которые уже взяли набор, не видят его изменения посреди
+    рассылки. reload() перечитывает .env (RECIPIENTS, по умолчанию ADMIN_ID)
+    и таблицу recipients в базе и подменяет набор.
+    """
+
+    def __init__(self, db=None):
+        self.db = db
+        self.ids: FrozenSet[int] = frozenset()
+        self._env_ids: FrozenSet[int] = frozenset()
+
+    def __contains__(self, chat_id: int) -> bool:
+        return chat_id in self.ids
+
+    def __iter__(self):
+        return iter(self.ids)
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    @staticmethod
+    def from_env() -> FrozenSet[int]:
+        """Получатели из переменной окружения RECIPIENTS (или ADMIN_ID)"""
+        return parse_recipients(os.getenv('RECIPIENTS', os.getenv('ADMIN_ID', '')))
+
+    async def reload(self, reread_env: bool = True) -> FrozenSet[int]:
+        """Перечитать получателей из .env и базы (db - AsyncDatabase)"""
+        if reread_env:
+            load_dotenv(override=True)
+        self._env_ids = self.from_env()
+        ids = set(self._env_ids)
+        if self.db is not None:
+            ids.update(await self.db.get_recipients())
+
+        self.ids = frozenset(ids)
+        if not self.ids:
+            logger.error("❌ Не указаны получатели сообщений (RECIPIENTS, ADMIN_ID или таблица recipients)")
+        logger.info(f"📋 Получатели сообщений: {sorted(self.ids)}")
+        return self.ids
+
+    async def add(self, chat_id: int) -> bool:
+        """Добавить получателя в базу и в текущий набор"""
+        if self.db is None:
+            raise RuntimeError("Реестр получателей не подключен к базе")
+        added = await self.db.add_recipient(chat_id)
+        self.ids = self.ids | {chat_id}
+        return added
+
+    async def remove(self, chat_id: int) -> bool:
+        """Удалить получателя из базы; получатели из .env остаются"""
+        if self.db is None:
+            raise RuntimeError("Реестр получателей не подключен к базе")
+        removed = await self.db.remove_recipient(chat_id)
+        if chat_id not in self._env_ids:
+            self.ids = self.ids - {chat_id}
+        return removed
@@ -0,0 +1,37 @@
+#!/usr/bin/env python3
+"""
+Пересчет статистики базы данных
+
+Счетчики в таблице stats обновляются триггерами. Если они разошлись с
+реальными данными (например, после ручного редактирования базы),
+этот скрипт пересчитывает их и флаги is_answered заново, в том числе
+в архивах и каталоге archives.
+"""
+
+from database import Database
+
+
+def main():
+    print("🔄 Пересчет статистики")
+    print("=" * 50)
+
+    db = Database()
+    before = db.get_stats()
+    after = db.recompute_stats()
+    db.close()
+
+    for key, title in [
+        ("total_users", "Пользователей"),
+        ("total_messages", "Сообщений"),
+        ("answered_messages", "Отвеченных"),
+        ("unanswered_messages", "Неотвеченных"),
+    ]:
+        mark = "✅" if before[key] == after[key] else "🔧"
+        print(f"   {mark} {title}: {before[key]} → {after[key]}")
+
+    print("\n" + "=" * 50)
+    print("✅ Статистика пересчитана")
+
+
+if __name__ == "__main__":
+    main()
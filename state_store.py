@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+"""
+State store module для Anonymous Bot
+Хранилище состояния диалогов: в памяти процесса или в SQLite с истечением по TTL
+"""
+
+import json
+import logging
+import os
+import time
+from typing import Any, Dict, Optional, Tuple
+
+from telegram.ext import BasePersistence, PersistenceInput
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_STATE_TTL = 3600          # секунды
+STATE_PRUNE_INTERVAL = 600        # как часто удалять истекшие записи из SQLite
+
+
+class MemoryStateStore:
+    """Состояние в памяти процесса (теряется при перезапуске)"""
+
+    def __init__(self, ttl: Optional[float] = DEFAULT_STATE_TTL):
+        self.ttl = ttl
+        self._values: Dict[Tuple[str, str], Tuple[Any, Optional[float]]] = {}
+
+    async def get(self, namespace: str, key) -> Optional[Any]:
+        item = self._values.get((namespace, str(key)))
+        if item is None:
+            return None
+        value, expires_at = item
+        if expires_at is not None and expires_at <= time.monotonic():
+            del self._values[(namespace, str(key))]
+            return None
+        return value
+
+    async def get_all(self, namespace: str) -> Dict[str, Any]:
+        now = time.monotonic()
+        return {
+            key: value for (ns, key), (value, expires_at) in list(self._values.items())
+            if ns == namespace and (expires_at is None or expires_at > now)
+        }
+
+    async def set(self, namespace: str, key, value: Any):
+        expires_at = time.monotonic() + self.ttl if self.ttl else None
+        self._values[(namespace, str(key))] = (value, expires_at)
+
+    async def delete(self, namespace: str, key) -> bool:
+        return self._values.pop((namespace, str(key)), None) is not None
+
+
+class SQLiteStateStore:
+    """Состояние в таблице state базы бота
+
+    Переживает перезапуск и общее для всех процессов бота, работающих с
+    одной базой. db - AsyncDatabase. Истекшие записи не возвращаются и
+    время от времени удаляются.
+    """
+
+    def __init__(self, db, ttl: Optional[float] = DEFAULT_STATE_TTL):
+        self.db = db
+        self.ttl = ttl
+        self._last_pruned = 0.0
+
+    async def get(self, namespace: str, key) -> Optional[Any]:
+        return await self.db.get_state(namespace, key)
+
+    async def get_all(self, namespace: str) -> Dict[str, Any]:
+        return await self.db.get_states(namespace)
+
+    async def set(self, namespace: str, key, value: Any):
+        await self.db.set_state(namespace, key, value, self.ttl)
+
+        now = time.monotonic()
+        if now - self._last_pruned >= STATE_PRUNE_INTERVAL:
+            self._last_pruned = now
+            await self.db.prune_state()
+
+    async def delete(self, namespace: str, key) -> bool:
+        return await self.db.delete_state(namespace, key)
+
+
+def state_store_from_env(db):
+    """Хранилище по STATE_STORE (sqlite или memory) и STATE_TTL (секунды, 0 - бессрочно)"""
+    kind = os.getenv('STATE_STORE', 'sqlite').strip().lower()
+    ttl = float(os.getenv('STATE_TTL', DEFAULT_STATE_TTL)) or None
+    if kind == 'memory':
+        return MemoryStateStore(ttl)
+    if kind != 'sqlite':
+        raise ValueError(f"STATE_STORE={kind!r}: допустимые значения 'sqlite', 'memory'")
+    return SQLiteStateStore(db, ttl)
+
+
+class StatePersistence(BasePersistence):
+    """Persistence для PTB: сохраняет только состояния ConversationHandler
+
+    Состояния лежат в том же хранилище (пространство имен
+    "conversation:<имя обработчика>"), поэтому при SQLiteStateStore
+    разговор, начатый до перезапуска бота, продолжается после него.
+    PTB читает состояния один раз при запуске, а записывает их раз в
+    update_interval секунд и при остановке.
+    """
+
+    def __init__(self, store, update_interval: float = 5):
+        super().__init__(
+            store_data=PersistenceInput(bot_data=False, chat_data=False, user_data=False, callback_data=False),
+            update_interval=update_interval,
+        )
+        self.store = store
+
+    @staticmethod
+    def _namespace(name: str) -> str:
+        return f"conversation:{name}"
+
+    async def get_conversations(self, name: str) -> Dict[tuple, object]:
+        states = await self.store.get_all(self._namespace(name))
+        return {tuple(json.loads(key)): state for key, state in states.items()}
+
+    async def update_conversation(self, name: str, key: tuple, new_state: Optional[object]) -> None:
+        store_key = json.dumps(list(key))
+        if new_state is None:
+            await self.store.delete(self._namespace(name), store_key)
+        else:
+            await self.store.set(self._namespace(name), store_key, new_state)
+
+    # Данные пользователей, чатов и бота не сохраняются (store_data выше)
+
+    async def get_bot_data(self):
+        return {}
+
+    async def update_bot_data(self, data) -> None:
+        pass
+
+    async def refresh_bot_data(self, bot_data) -> None:
+        pass
+
+    async def get_chat_data(self):
+        return {}
+
+    async def update_chat_data(self, chat_id: int, data) -> None:
+        pass
+
+    async def refresh_chat_data(self, chat_id: int, chat_data) -> None:
+        pass
+
+    async def drop_chat_data(self, chat_id: int) -> None:
+        pass
+
+    async def get_user_data(self):
+        return {}
+
+    async def update_user_data(self, user_id: int, data) -> None:
+        pass
+
+    async def refresh_user_data(self, user_id: int, user_data) -> None:
+        pass
+
+    async def drop_user_data(self, user_id: int) -> None:
+        pass
+
+    async def get_callback_data(self):
+        return None
+
+    async def update_callback_data(self, data) -> None:
+        pass
+
+    async def flush(self) -> None:
+        pass
@@ -3,11 +3,35 @@ let currentUserId = null;
 let currentMessageId = null;
 let chatsData = [];
 
+// Условные запросы: для каждого URL запоминаем последний ETag и ответ.
+// Если данные не менялись, сервер отвечает 304, ничего не пересчитывая.
+const etagCache = new Map();
+
+async function fetchJson(url, conditional) {
+    const cached = conditional ? etagCache.get(url) : null;
+    const headers = cached ? { 'If-None-Match': cached.etag } : {};
+    // no-store: кешем управляем сами, иначе браузер подменит 304 своим ответом
+    const response = await fetch(url, { headers: headers, cache: 'no-store' });
+
+    if (response.status === 304 && cached) {
+        return { data: cached.data, modified: false };
+    }
+
+    const data = await response.json();
+    const etag = response.headers.get('ETag');
+    if (conditional && response.ok && etag) {
+        etagCache.set(url, { etag: etag, data: data });
+    }
+    return { data: data, modified: true };
+}
+
 // Загрузка статистики
 async function loadStats() {
     try {
-        const response = await fetch('/api/stats');
-        const stats = await response.json();
+        const { data: stats, modified } = await fetchJson('/api/stats', true);
+        if (!modified) {
+            return;
+        }
         
         document.getElementById('total-messages').textContent = stats.total_messages;
         document.getElementById('unanswered-messages').textContent = stats.unanswered_messages;
@@ -17,11 +41,63 @@ async function loadStats() {
     }
 }
 
-// Загрузка списка чатов
+// Постраничная загрузка списка чатов
+const CHATS_PAGE_SIZE = 50;
+const CHATS_PAGE_MAX = 200;
+let chatsCursor = null;  // Курсор следующей страницы (null - больше страниц нет)
+let chatsLoading = false;
+
+// Первая страница запрашивается условно (см. fetchJson), остальные - всегда целиком
+async function fetchChatsPage(cursor, limit) {
+    const params = new URLSearchParams({ limit: limit });
+    if (cursor) {
+        params.set('cursor', cursor);
+    }
+    return fetchJson(`/api/chats?${params}`, !cursor);
+}
+
+// Создать элемент списка чатов
+function createChatItem(chat) {
+    const chatItem = document.createElement('div');
+    chatItem.className = 'chat-item';
+    chatItem.dataset.userId = chat.user_id;
+    if (currentUserId === chat.user_id) {
+        chatItem.classList.add('active');
+    }
+
+    const userName = chat.user_info.full_name !== 'N/A'
+        ? chat.user_info.full_name
+        : `User ${chat.user_id}`;
+
+    const lastMessage = chat.last_message;
+    const messagePreview = lastMessage ? escapeHtml(lastMessage.substring(0, 50)) : '👋 Нажал /start';
+
+    // Определяем время для отображения
+    const displayTime = chat.last_message_time || chat.last_seen;
+
+    chatItem.innerHTML = `
+        <div class="chat-item-header">
+            <span class="chat-user-name">${userName}</span>
+            ${chat.unread_count > 0 ? `<span class="chat-badge">${chat.unread_count}</span>` : ''}
+        </div>
+        <div class="chat-preview">${messagePreview}${lastMessage && lastMessage.length > 50 ? '...' : ''}</div>
+        <div class="chat-time">${formatTime(displayTime)}</div>
+    `;
+
+    chatItem.onclick = function() { openChat(chat.user_id, this); };
+    return chatItem;
+}
+
+// Загрузка списка чатов (первая страница; при обновлении - столько, сколько уже показано)
 async function loadChats() {
     try {
-        const response = await fetch('/api/chats');
-        chatsData = await response.json();
+        const limit = Math.min(Math.max(CHATS_PAGE_SIZE, chatsData.length), CHATS_PAGE_MAX);
+        const { data: page, modified } = await fetchChatsPage(null, limit);
+        if (!modified) {
+            return;  // С прошлого раза ничего не изменилось
+        }
+        chatsData = page.chats;
+        chatsCursor = page.next_cursor;
         
         const chatsList = document.getElementById('chats-list');
         
@@ -31,40 +107,45 @@ async function loadChats() {
         }
         
         chatsList.innerHTML = '';
+        chatsData.forEach(chat => chatsList.appendChild(createChatItem(chat)));
+        fillChatsList();
         
-        chatsData.forEach(chat => {
-            const chatItem = document.createElement('div');
-            chatItem.className = 'chat-item';
-            if (currentUserId === chat.user_id) {
-                chatItem.classList.add('active');
-            }
-            
-            const userName = chat.user_info.full_name !== 'N/A'
-                ? chat.user_info.full_name
-                : `User ${chat.user_id}`;
+        loadStats();
+    } catch (error) {
+        console.error('Ошибка загрузки чатов:', error);
+    }
+}
 
-            const lastMessage = chat.messages && chat.messages.length > 0 ? chat.messages[chat.messages.length - 1] : null;
-            const messagePreview = lastMessage ? lastMessage.text.substring(0, 50) : '👋 Нажал /start';
+// Подгрузка следующей страницы чатов при прокрутке списка
+async function loadMoreChats() {
+    if (chatsLoading || !chatsCursor) {
+        return;
+    }
 
-            // Определяем время для отображения
-            const displayTime = chat.last_message_time || chat.last_seen;
+    chatsLoading = true;
+    try {
+        const { data: page } = await fetchChatsPage(chatsCursor, CHATS_PAGE_SIZE);
+        const chatsList = document.getElementById('chats-list');
 
-            chatItem.innerHTML = `
-                <div class="chat-item-header">
-                    <span class="chat-user-name">${userName}</span>
-                    ${chat.unread_count > 0 ? `<span class="chat-badge">${chat.unread_count}</span>` : ''}
-                </div>
-                <div class="chat-preview">${messagePreview}${lastMessage && lastMessage.text.length > 50 ? '...' : ''}</div>
-                <div class="chat-time">${formatTime(displayTime)}</div>
-            `;
-            
-            chatItem.onclick = function() { openChat(chat.user_id, this); };
-            chatsList.appendChild(chatItem);
-        });
-        
-        loadStats();
+        // Чат мог уже подняться наверх по событию из потока
+        const newChats = page.chats.filter(chat => !chatsData.some(item => item.user_id === chat.user_id));
+
+        chatsData = chatsData.concat(newChats);
+        chatsCursor = page.next_cursor;
+        newChats.forEach(chat => chatsList.appendChild(createChatItem(chat)));
     } catch (error) {
         console.error('Ошибка загрузки чатов:', error);
+    } finally {
+        chatsLoading = false;
+    }
+    fillChatsList();
+}
+
+// Если список не заполняет панель целиком, прокрутка невозможна - подгружаем сразу
+function fillChatsList() {
+    const chatsList = document.getElementById('chats-list');
+    if (chatsCursor && chatsList.scrollHeight <= chatsList.clientHeight) {
+        loadMoreChats();
     }
 }
 
@@ -88,40 +169,108 @@ async function openChat(userId, clickedElement) {
     await loadMessages(userId);
 }
 
-// Загрузка сообщений пользователя
+// Постраничная загрузка сообщений открытого чата
+const MESSAGES_PAGE_SIZE = 50;
+let messagesBefore = null;  // id для загрузки более старой страницы (null - больше страниц нет)
+let messagesLoading = false;
+
+// Последняя страница запрашивается условно (см. fetchJson), более старые - всегда целиком
+async function fetchMessagesPage(userId, before) {
+    const params = new URLSearchParams({ limit: MESSAGES_PAGE_SIZE });
+    if (before) {
+        params.set('before', before);
+    }
+    return fetchJson(`/api/messages/${userId}?${params}`, !before);
+}
+
+// Создать блок сообщения вместе с ответами администратора
+function createMessageGroup(message) {
+    const messageGroup = document.createElement('div');
+    messageGroup.className = 'message-group';
+    messageGroup.dataset.id = message.id;
+    messageGroup.dataset.messageId = message.message_id;
+    messageGroup.dataset.fromAdmin = message.is_from_admin ? '1' : '0';
+    messageGroup.dataset.answered = message.replies.length > 0 ? '1' : '0';
+
+    // Сообщение пользователя (или администратора, отправленное из веб-интерфейса)
+    const messageBubble = document.createElement('div');
+    messageBubble.className = message.is_from_admin
+        ? 'message-bubble admin-message'
+        : 'message-bubble user-message';
+    messageBubble.innerHTML = `
+        <div class="message-header">
+            <span>${message.is_from_admin ? '👨‍💼 Администратор' : '👤 Пользователь'}</span>
+            <span>ID: ${message.message_id}</span>
+        </div>
+        <div class="message-text">${escapeHtml(message.text)}</div>
+        <div class="message-time">${formatTime(message.timestamp)}</div>
+    `;
+    messageGroup.appendChild(messageBubble);
+
+    // Ответы администратора
+    message.replies.forEach(reply => {
+        messageGroup.appendChild(createReplyBubble(reply));
+    });
+
+    return messageGroup;
+}
+
+// Создать блок ответа администратора
+function createReplyBubble(reply) {
+    const adminBubble = document.createElement('div');
+    adminBubble.className = 'message-bubble admin-message';
+    adminBubble.dataset.replyId = reply.id;
+    adminBubble.innerHTML = `
+        <div class="message-header">
+            <span>👨‍💼 Администратор</span>
+        </div>
+        <div class="message-text">${escapeHtml(reply.reply_text)}</div>
+        <div class="message-time">${formatTime(reply.timestamp)}</div>
+    `;
+    return adminBubble;
+}
+
+// Ответ отправляется на последнее неотвеченное сообщение пользователя
+// (если все отвечены - на последнее сообщение пользователя)
+function updateCurrentMessageId() {
+    const groups = Array.from(document.querySelectorAll('#messages-container .message-group'))
+        .filter(group => group.dataset.fromAdmin === '0')
+        .reverse();
+    const unanswered = groups.find(group => group.dataset.answered === '0');
+    const target = unanswered || groups[0];
+    currentMessageId = target ? target.dataset.messageId : null;
+}
+
+// Обновить заголовок чата
+function updateChatHeader(userId, userInfo) {
+    const chatData = chatsData.find(chat => chat.user_id === userId);
+    const info = chatData ? chatData.user_info : userInfo;
+
+    if (info && info.full_name) {
+        const userName = info.full_name !== 'N/A' ? info.full_name : `User ${userId}`;
+        document.getElementById('chat-user-name').textContent = userName;
+    }
+    document.getElementById('chat-user-id').textContent = `ID: ${userId}`;
+}
+
+// Загрузка сообщений пользователя (последняя страница)
 async function loadMessages(userId) {
     try {
-        const response = await fetch(`/api/messages/${userId}`);
-        const messages = await response.json();
+        const { data: page } = await fetchMessagesPage(userId, null);
+        if (currentUserId !== userId) {
+            return;  // Пока шел запрос, администратор открыл другой чат
+        }
 
         const messagesContainer = document.getElementById('messages-container');
-        const chatUserName = document.getElementById('chat-user-name');
-        const chatUserId = document.getElementById('chat-user-id');
-
-        // Находим информацию о пользователе из chatsData
-        const chatData = chatsData.find(chat => chat.user_id === userId);
-
-        // Обновляем заголовок
-        if (chatData) {
-            const userName = chatData.user_info.full_name !== 'N/A'
-                ? chatData.user_info.full_name
-                : `User ${userId}`;
-            chatUserName.textContent = userName;
-            chatUserId.textContent = `ID: ${userId}`;
-        } else if (messages.length > 0) {
-            const userInfo = messages[0].user_info;
-            const userName = userInfo.full_name !== 'N/A'
-                ? userInfo.full_name
-                : `User ${userId}`;
-            chatUserName.textContent = userName;
-            chatUserId.textContent = `ID: ${userId}`;
-        }
+        updateChatHeader(userId, page.user_info);
+        messagesBefore = page.next_before;
 
         // Очищаем контейнер
         messagesContainer.innerHTML = '';
+        currentMessageId = null;
 
         // Если нет сообщений, показываем информацию
-        if (messages.length === 0) {
+        if (page.messages.length === 0) {
             messagesContainer.innerHTML = `
                 <div class="no-messages">
                     <p>📭 Пользователь еще не отправлял сообщений</p>
@@ -132,42 +281,10 @@ async function loadMessages(userId) {
         }
 
         // Отображаем сообщения
-        messages.forEach(message => {
-            const messageGroup = document.createElement('div');
-            messageGroup.className = 'message-group';
-            
-            // Сообщение пользователя
-            const userBubble = document.createElement('div');
-            userBubble.className = 'message-bubble user-message';
-            userBubble.innerHTML = `
-                <div class="message-header">
-                    <span>👤 Пользователь</span>
-                    <span>ID: ${message.message_id}</span>
-                </div>
-                <div class="message-text">${escapeHtml(message.text)}</div>
-                <div class="message-time">${formatTime(message.timestamp)}</div>
-            `;
-            messageGroup.appendChild(userBubble);
-            
-            // Ответ администратора (если есть)
-            if (message.admin_reply) {
-                const adminBubble = document.createElement('div');
-                adminBubble.className = 'message-bubble admin-message';
-                adminBubble.innerHTML = `
-                    <div class="message-header">
-                        <span>👨‍💼 Администратор</span>
-                    </div>
-                    <div class="message-text">${escapeHtml(message.admin_reply)}</div>
-                    <div class="message-time">${formatTime(message.admin_reply_timestamp)}</div>
-                `;
-                messageGroup.appendChild(adminBubble);
-            } else {
-                // Сохраняем ID последнего неотвеченного сообщения
-                currentMessageId = message.message_id;
-            }
-            
-            messagesContainer.appendChild(messageGroup);
+        page.messages.forEach(message => {
+            messagesContainer.appendChild(createMessageGroup(message));
         });
+        updateCurrentMessageId();
         
         // Прокручиваем вниз
         messagesContainer.scrollTop = messagesContainer.scrollHeight;
@@ -176,6 +293,77 @@ async function loadMessages(userId) {
     }
 }
 
+// Подгрузка более старых сообщений при прокрутке вверх
+async function loadOlderMessages() {
+    if (messagesLoading || !messagesBefore || !currentUserId) {
+        return;
+    }
+
+    const userId = currentUserId;
+    messagesLoading = true;
+    try {
+        const { data: page } = await fetchMessagesPage(userId, messagesBefore);
+        if (currentUserId !== userId) {
+            return;
+        }
+
+        const messagesContainer = document.getElementById('messages-container');
+        const previousHeight = messagesContainer.scrollHeight;
+        const fragment = document.createDocumentFragment();
+        page.messages.forEach(message => fragment.appendChild(createMessageGroup(message)));
+        messagesContainer.insertBefore(fragment, messagesContainer.firstChild);
+        messagesBefore = page.next_before;
+        updateCurrentMessageId();
+
+        // Сохраняем позицию прокрутки, чтобы текст не «прыгал»
+        messagesContainer.scrollTop += messagesContainer.scrollHeight - previousHeight;
+    } catch (error) {
+        console.error('Ошибка загрузки сообщений:', error);
+    } finally {
+        messagesLoading = false;
+    }
+}
+
+// Обновление открытого чата: перезапрашиваем только последнюю страницу,
+// заменяем изменившиеся сообщения и добавляем новые
+async function refreshMessages(userId) {
+    try {
+        const { data: page, modified } = await fetchMessagesPage(userId, null);
+        if (currentUserId !== userId || !modified) {
+            return;
+        }
+
+        const messagesContainer = document.getElementById('messages-container');
+        if (page.messages.length === 0) {
+            return;
+        }
+        if (!messagesContainer.querySelector('.message-group')) {
+            await loadMessages(userId);  // До этого сообщений не было
+            return;
+        }
+
+        const atBottom = messagesContainer.scrollTop + messagesContainer.clientHeight
+            >= messagesContainer.scrollHeight - 50;
+
+        page.messages.forEach(message => {
+            const group = createMessageGroup(message);
+            const existing = messagesContainer.querySelector(`.message-group[data-id="${message.id}"]`);
+            if (existing) {
+                existing.replaceWith(group);
+            } else {
+                messagesContainer.appendChild(group);
+            }
+        });
+        updateCurrentMessageId();
+
+        if (atBottom) {
+            messagesContainer.scrollTop = messagesContainer.scrollHeight;
+        }
+    } catch (error) {
+        console.error('Ошибка загрузки сообщений:', error);
+    }
+}
+
 // Переключение формы нового сообщения
 function toggleNewMessageForm() {
     const form = document.getElementById('new-message-form');
@@ -268,8 +456,8 @@ async function sendReply() {
             // Очищаем поле ввода
             replyInput.value = '';
 
-            // Перезагружаем сообщения
-            await loadMessages(currentUserId);
+            // Обновляем сообщения
+            await refreshMessages(currentUserId);
 
             // Перезагружаем список чатов
             await loadChats();
@@ -341,17 +529,194 @@ function showNotification(message, type = 'info') {
     }, 3000);
 }
 
-// Автообновление каждые 10 секунд
-setInterval(() => {
+// Обновления в реальном времени приходят через Server-Sent Events (/api/events).
+// Пока поток недоступен, работает опрос сервера каждые 10 секунд.
+const POLL_INTERVAL = 10000;
+let pollTimer = null;
+let statsTimer = null;
+
+function pollUpdates() {
     loadChats();
     if (currentUserId) {
-        loadMessages(currentUserId);
+        refreshMessages(currentUserId);
+    }
+}
+
+function startPolling() {
+    if (!pollTimer) {
+        pollTimer = setInterval(pollUpdates, POLL_INTERVAL);
     }
-}, 10000);
+}
+
+function stopPolling() {
+    if (pollTimer) {
+        clearInterval(pollTimer);
+        pollTimer = null;
+    }
+}
+
+// Несколько событий подряд - один запрос статистики
+function scheduleStatsReload() {
+    if (!statsTimer) {
+        statsTimer = setTimeout(() => {
+            statsTimer = null;
+            loadStats();
+        }, 500);
+    }
+}
+
+// Обновить чат в списке; moveToTop - поднять его в начало (новое сообщение)
+function upsertChat(data, updates, moveToTop) {
+    const chatsList = document.getElementById('chats-list');
+    let chat = chatsData.find(item => item.user_id === data.user_id);
+    const isNew = !chat;
+
+    if (isNew) {
+        chat = {
+            user_id: data.user_id,
+            last_message: null,
+            last_message_time: null,
+            last_seen: data.last_seen
+        };
+    }
+    Object.assign(chat, updates, {
+        user_info: data.user_info,
+        unread_count: data.unread_count
+    });
+
+    const item = createChatItem(chat);
+    const oldItem = chatsList.querySelector(`.chat-item[data-user-id="${data.user_id}"]`);
+
+    if (isNew || moveToTop) {
+        if (!isNew) {
+            chatsData.splice(chatsData.indexOf(chat), 1);
+        }
+        chatsData.unshift(chat);
+        if (oldItem) {
+            oldItem.remove();
+        }
+        const placeholder = chatsList.querySelector('.loading');
+        if (placeholder) {
+            placeholder.remove();
+        }
+        chatsList.insertBefore(item, chatsList.firstChild);
+    } else if (oldItem) {
+        oldItem.replaceWith(item);
+    }
+}
+
+// Добавить новое сообщение в открытый чат
+function appendMessage(message) {
+    const messagesContainer = document.getElementById('messages-container');
+    if (messagesContainer.querySelector(`.message-group[data-id="${message.id}"]`)) {
+        return;  // Уже показано (например, после обновления)
+    }
+
+    const atBottom = messagesContainer.scrollTop + messagesContainer.clientHeight
+        >= messagesContainer.scrollHeight - 50;
+    const placeholder = messagesContainer.querySelector('.no-messages');
+    if (placeholder) {
+        placeholder.remove();
+    }
+
+    messagesContainer.appendChild(createMessageGroup(message));
+    updateCurrentMessageId();
+    if (atBottom) {
+        messagesContainer.scrollTop = messagesContainer.scrollHeight;
+    }
+}
+
+// Добавить ответ администратора к сообщению в открытом чате
+function appendReply(messageId, reply) {
+    const group = document.querySelector(`#messages-container .message-group[data-message-id="${messageId}"]`);
+    if (!group || group.querySelector(`[data-reply-id="${reply.id}"]`)) {
+        return;
+    }
+    group.appendChild(createReplyBubble(reply));
+    group.dataset.answered = '1';
+    updateCurrentMessageId();
+}
+
+// Применить событие из потока к списку чатов и открытому чату
+function applyEvent(type, data) {
+    if (type === 'new_user') {
+        if (!chatsData.some(chat => chat.user_id === data.user_id)) {
+            upsertChat(data, { last_seen: data.last_seen }, true);
+        }
+    } else if (type === 'new_message') {
+        upsertChat(data, {
+            last_message: data.message.text,
+            last_message_time: data.message.timestamp,
+            last_seen: data.last_seen
+        }, true);
+        if (currentUserId === data.user_id) {
+            appendMessage(data.message);
+        }
+    } else if (type === 'new_reply') {
+        upsertChat(data, {}, false);
+        if (currentUserId === data.user_id) {
+            appendReply(data.message_id, data.reply);
+        }
+    } else if (type === 'user_updated') {
+        // Новое имя пользователя: правим чат, только если он уже в списке
+        if (chatsData.some(chat => chat.user_id === data.user_id)) {
+            upsertChat(data, {}, false);
+        }
+        if (currentUserId === data.user_id) {
+            updateChatHeader(data.user_id, data.user_info);
+        }
+    } else if (type === 'archived' || type === 'stats_recomputed') {
+        // Старые сообщения перенесены в архив или пересчитаны флаги ответов:
+        // превью и счетчики в списке чатов и открытый чат перечитываются с сервера
+        loadChats();
+        if (currentUserId) {
+            loadMessages(currentUserId);
+        }
+    }
+    scheduleStatsReload();
+}
+
+function connectEvents() {
+    if (!window.EventSource) {
+        startPolling();
+        return;
+    }
+
+    const source = new EventSource('/api/events');
+    source.onopen = () => {
+        // После работы в режиме опроса один раз синхронизируемся целиком
+        if (pollTimer) {
+            stopPolling();
+            pollUpdates();
+        }
+    };
+    // Браузер сам переподключается; до этого момента опрашиваем сервер
+    source.onerror = () => startPolling();
+
+    ['new_user', 'user_updated', 'new_message', 'new_reply', 'archived', 'stats_recomputed'].forEach(type => {
+        source.addEventListener(type, event => applyEvent(type, JSON.parse(event.data)));
+    });
+}
 
 // Обработка Enter в поле ввода
 document.addEventListener('DOMContentLoaded', () => {
     const replyInput = document.getElementById('reply-input');
+    const chatsList = document.getElementById('chats-list');
+
+    // Подгружаем чаты, когда до конца списка осталось меньше 100px
+    chatsList.addEventListener('scroll', () => {
+        if (chatsList.scrollTop + chatsList.clientHeight >= chatsList.scrollHeight - 100) {
+            loadMoreChats();
+        }
+    });
+
+    // Подгружаем более старые сообщения, когда чат прокручен к началу
+    const messagesContainer = document.getElementById('messages-container');
+    messagesContainer.addEventListener('scroll', () => {
+        if (messagesContainer.scrollTop < 100) {
+            loadOlderMessages();
+        }
+    });
 
     replyInput.addEventListener('keydown', (e) => {
         if (e.key === 'Enter' && !e.shiftKey) {
@@ -363,6 +728,7 @@ document.addEventListener('DOMContentLoaded', () => {
     // Загружаем данные при старте
     loadChats();
     loadStats();
+    connectEvents();
 });
 
 // Добавляем CSS анимации
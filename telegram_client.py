@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""
+Telegram client module для Anonymous Bot
+Долгоживущий Bot в фоновом event loop для синхронного кода (веб-интерфейс)
+"""
+
+import asyncio
+import atexit
+import logging
+import os
+import threading
+from typing import Optional
+
+from telegram import Bot
+from telegram.request import HTTPXRequest
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BASE_URL = "https://api.telegram.org/bot"
+DEFAULT_POOL_SIZE = 8
+DEFAULT_SEND_TIMEOUT = 30.0
+
+
+class BackgroundBot:
+    """Один инициализированный Bot на отдельном потоке с event loop
+
+    Flask-обработчики синхронные: раньше каждый запрос создавал новый Bot
+    и вызывал asyncio.run(), то есть новый event loop, HTTP-клиент и
+    TLS-рукопожатие. Здесь loop и Bot (с пулом HTTP-соединений) создаются
+    один раз при первом обращении, а обработчики отправляют в loop корутины
+    через run() и ждут результата.
+    """
+
+    def __init__(self, token: str, base_url: str = DEFAULT_BASE_URL,
+                 pool_size: int = DEFAULT_POOL_SIZE, timeout: float = DEFAULT_SEND_TIMEOUT):
+        self.token = token
+        self.base_url = base_url
+        self.pool_size = pool_size
+        self.timeout = timeout
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._bot: Optional[Bot] = None
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls) -> "BackgroundBot":
+        """Создать клиент с настройками из переменных окружения
+
+        TELEGRAM_BOT_TOKEN, TELEGRAM_BASE_URL (например, адрес локального
+        тестового сервера), TELEGRAM_POOL_SIZE.
+        """
+        return cls(
+            token=os.getenv('TELEGRAM_BOT_TOKEN'),
+            base_url=os.getenv('TELEGRAM_BASE_URL', DEFAULT_BASE_URL),
+            pool_size=int(os.getenv('TELEGRAM_POOL_SIZE', DEFAULT_POOL_SIZE)),
+        )
+
+    def _start(self) -> asyncio.AbstractEventLoop:
+        """Запустить поток с event loop (один раз)"""
+        with self._lock:
+            if self._loop is None:
+                loop = asyncio.new_event_loop()
+                self._thread = threading.Thread(
+                    target=loop.run_forever, name="telegram-client", daemon=True
+                )
+                self._thread.start()
+                self._loop = loop
+                atexit.register(self.close)
+        return self._loop
+
+    async def _get_bot(self) -> Bot:
+        """Bot, инициализированный в фоновом loop (выполняется в нем же)"""
+        if self._bot is None:
+            request = HTTPXRequest(connection_pool_size=self.pool_size)
+            self._bot = Bot(token=self.token, base_url=self.base_url, request=request)
+        # Если инициализация не удалась, следующий вызов повторит ее
+        await self._bot.initialize()
+        return self._bot
+
+    def run(self, coroutine_factory):
+        """Выполнить coroutine_factory(bot) в фоновом loop и вернуть результат"""
+        loop = self._start()
+
+        async def call():
+            return await coroutine_factory(await self._get_bot())
+
+        future = asyncio.run_coroutine_threadsafe(call(), loop)
+        try:
+            return future.result(self.timeout)
+        except TimeoutError:
+            # Иначе сообщение может уйти уже после ошибки, и повтор из консоли его задублирует
+            future.cancel()
+            raise
+
+    def send_message(self, chat_id: int, text: str, **kwargs):
+        """Синхронная обертка над Bot.send_message"""
+        return self.run(lambda bot: bot.send_message(chat_id=chat_id, text=text, **kwargs))
+
+    def close(self):
+        """Закрыть HTTP-соединения и остановить поток"""
+        with self._lock:
+            loop, self._loop = self._loop, None
+        if loop is None:
+            return
+
+        if self._bot is not None:
+            try:
+                asyncio.run_coroutine_threadsafe(self._bot.shutdown(), loop).result(self.timeout)
+            except Exception as e:
+                logger.warning(f"⚠️ Ошибка при закрытии Telegram клиента: {e}")
+            self._bot = None
+        loop.call_soon_threadsafe(loop.stop)
+        self._thread.join()
+        loop.close()
@@ -0,0 +1,54 @@
+"""Тесты WriteBehindQueue"""
+
+import os
+import tempfile
+import threading
+import unittest
+
+from database import Database, WriteBehindQueue
+
+
+class FlushTest(unittest.TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.db = Database(os.path.join(tmp.name, "test.db"))
+        self.addCleanup(self.db.close)
+        self.db.add_or_update_user(1)
+        self.queue = WriteBehindQueue(self.db, flush_interval=0.01, sync_commit=True)
+        self.addCleanup(self.queue.close)
+
+    def test_flush_waits_for_batch_being_written(self):
+        """flush не возвращается, пока пачка, уже забранная потоком, не зафиксирована"""
+        writing, release = threading.Event(), threading.Event()
+        write_batch = self.db.write_batch
+
+        def blocked_write_batch(users, messages):
+            writing.set()
+            release.wait()
+            return write_batch(users, messages)
+
+        self.db.write_batch = blocked_write_batch
+        self.addCleanup(release.set)  # до close(): иначе при провале поток записи ждал бы вечно
+        self.queue.add_message("m1", 1, "текст")
+        self.assertTrue(writing.wait(5))
+
+        flushed = threading.Event()
+        flusher = threading.Thread(target=lambda: (self.queue.flush(), flushed.set()))
+        flusher.start()
+        self.assertFalse(flushed.wait(0.2))
+
+        release.set()
+        self.assertTrue(flushed.wait(5))
+        flusher.join()
+        self.assertIsNotNone(self.db.get_message("m1"))
+
+    def test_flush_without_pending_writes_returns(self):
+        self.queue.flush()
+        self.queue.add_message("m2", 1, "текст")
+        self.queue.flush()
+        self.assertIsNotNone(self.db.get_message("m2"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+Update processor module для Anonymous Bot
+Параллельная обработка апдейтов с сохранением порядка внутри одного чата
+"""
+
+import asyncio
+import os
+import sys
+from typing import Any, Awaitable, Dict, Optional
+
+from telegram import Update
+from telegram.ext import BaseUpdateProcessor
+
+DEFAULT_UPDATE_CONCURRENCY = 16
+
+
+def serialization_key(update: object) -> Optional[int]:
+    """Ключ, апдейты с которым обрабатываются строго по очереди
+
+    Чат апдейта (для нажатий кнопок - чат сообщения с кнопкой), иначе
+    пользователь. ConversationHandler бота хранит состояние по паре
+    (чат, пользователь), поэтому его переходы тоже остаются последовательными.
+    """
+    if not isinstance(update, Update):
+        return None
+    if update.effective_chat is not None:
+        return update.effective_chat.id
+    if update.effective_user is not None:
+        return update.effective_user.id
+    return None
+
+
+class PerChatUpdateProcessor(BaseUpdateProcessor):
+    """Обработчик апдейтов: разные чаты - параллельно, один чат - по порядку
+
+    Не больше max_concurrent_updates апдейтов выполняются одновременно.
+    Апдейты одного чата ждут своей очереди на блокировке чата еще до того,
+    как займут слот, поэтому длинная очередь одного пользователя не мешает
+    остальным. asyncio.Lock пропускает ожидающих в порядке прихода, а PTB
+    передает апдейты в порядке получения - так сохраняется порядок сообщений.
+    """
+
+    __slots__ = ("_limit", "_slots", "_chat_locks", "_waiters")
+
+    def __init__(self, max_concurrent_updates: int = DEFAULT_UPDATE_CONCURRENCY):
+        if max_concurrent_updates < 1:
+            raise ValueError("max_concurrent_updates должен быть положительным")
+        self._limit = max_concurrent_updates
+        # Семафор базового класса захватывается до блокировки чата,
+        # поэтому ограничение делаем сами, уже после нее
+        super().__init__(sys.maxsize)
+        self._slots = asyncio.BoundedSemaphore(max_concurrent_updates)
+        self._chat_locks: Dict[int, asyncio.Lock] = {}
+        self._waiters: Dict[int, int] = {}
+
+    @classmethod
+    def from_env(cls) -> "PerChatUpdateProcessor":
+        """Создать обработчик с UPDATE_CONCURRENCY из окружения"""
+        return cls(int(os.getenv('UPDATE_CONCURRENCY', DEFAULT_UPDATE_CONCURRENCY)))
+
+    @property
+    def max_concurrent_updates(self) -> int:
+        return self._limit
+
+    async def do_process_update(self, update: object, coroutine: Awaitable[Any]) -> None:
+        key = serialization_key(update)
+        if key is None:
+            async with self._slots:
+                await coroutine
+            return
+
+        lock = self._chat_locks.get(key)
+        if lock is None:
+            lock = self._chat_locks[key] = asyncio.Lock()
+        self._waiters[key] = self._waiters.get(key, 0) + 1
+        try:
+            async with lock:
+                async with self._slots:
+                    await coroutine
+        finally:
+            # Блокировка больше никому не нужна - не держим ее в памяти
+            self._waiters[key] -= 1
+            if not self._waiters[key]:
+                del self._waiters[key]
+                del self._chat_locks[key]
+
+    async def initialize(self) -> None:
+        pass
+
+    async def shutdown(self) -> None:
+        pass
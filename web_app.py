@@ -6,13 +6,19 @@ Web Interface для Anonymous Bot
 """
 
 import os
-import asyncio
+import json
+import time
 from datetime import datetime
-from flask import Flask, render_template, request, jsonify
+from functools import wraps
+from flask import Flask, Response, render_template, request, jsonify, make_response
 from flask_cors import CORS
 from dotenv import load_dotenv
-from telegram import Bot
-from database import Database
+from database import Database, EVENTS_KEEP, EVENTS_PRUNE_INTERVAL
+from telegram_client import BackgroundBot
+from web_common import (
+    format_chat, format_chats_page, format_messages, format_event, format_search_results,
+    parse_chats_args, parse_messages_args, parse_search_args
+)
 
 # Загружаем переменные окружения
 load_dotenv()
@@ -23,9 +29,37 @@ CORS(app)
 # Инициализация базы данных
 db = Database()
 
-# Telegram Bot
+# Telegram Bot: один клиент с пулом соединений на весь процесс
 BOT_TOKEN = os.getenv('TELEGRAM_BOT_TOKEN')
 ADMIN_ID = int(os.getenv('ADMIN_ID'))
+telegram_bot = BackgroundBot.from_env()
+
+# Server-Sent Events: как часто проверять ленту изменений и слать keepalive
+EVENTS_POLL_INTERVAL = float(os.getenv('EVENTS_POLL_INTERVAL', '1'))
+EVENTS_KEEPALIVE_INTERVAL = 15
+
+
+def etag_cached(view):
+    """Условный GET по версии данных
+
+    ETag - версия ленты изменений (db.get_data_version()). Если клиент
+    прислал ту же версию в If-None-Match, отвечаем 304 без запросов к
+    таблицам и без сериализации JSON.
+    """
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        etag = f"v{db.get_data_version()}"
+        if request.if_none_match.contains(etag):
+            response = Response(status=304)
+        else:
+            response = make_response(view(*args, **kwargs))
+            if response.status_code != 200:
+                return response
+        response.set_etag(etag)
+        # Кешировать можно, но перед использованием нужно свериться с сервером
+        response.headers['Cache-Control'] = 'no-cache'
+        return response
+    return wrapper
 
 
 @app.route('/')
@@ -35,99 +69,64 @@ def index():
 
 
 @app.route('/api/chats')
+@etag_cached
 def get_chats():
-    """Получить список всех чатов (пользователей)"""
-    chats_data = db.get_chats_with_last_message()
-
-    # Форматируем данные для фронтенда
-    chats_list = []
-    for chat in chats_data:
-        user_info = {
-            "user_id": chat['user_id'],
-            "username": chat['username'] or "N/A",
-            "first_name": chat['first_name'] or "N/A",
-            "last_name": chat['last_name'] or "N/A",
-            "full_name": chat['full_name'] or f"User {chat['user_id']}",
-        }
-
-        # Получаем сообщения пользователя
-        messages = db.get_user_messages(chat['user_id'])
-
-        # Форматируем сообщения
-        formatted_messages = []
-        for msg in messages:
-            # Получаем ответы на это сообщение
-            replies = db.get_message_replies(msg['message_id'])
-
-            formatted_msg = {
-                "message_id": msg['message_id'],
-                "text": msg['message_text'],
-                "timestamp": msg['timestamp'],
-                "is_from_admin": bool(msg['is_from_admin']),
-                "replies": []
-            }
-
-            # Добавляем ответы
-            for reply in replies:
-                formatted_msg["replies"].append({
-                    "reply_text": reply['reply_text'],
-                    "timestamp": reply['timestamp'],
-                    "admin_id": reply['admin_id']
-                })
-
-            formatted_messages.append(formatted_msg)
-
-        chat_item = {
-            "user_id": chat['user_id'],
-            "user_info": user_info,
-            "messages": formatted_messages,
-            "unread_count": chat['unread_count'],
-            "last_message_time": chat['last_message_time'],
-            "last_seen": chat['last_seen']
-        }
-
-        chats_list.append(chat_item)
-
-    return jsonify(chats_list)
+    """Получить список всех чатов (пользователей)
+
+    С параметрами cursor и/или limit возвращает страницу кратких записей
+    (без истории сообщений) и курсор следующей страницы.
+    """
+    if 'cursor' in request.args or 'limit' in request.args:
+        return get_chats_page()
+
+    chats_data = db.get_chats_with_messages()
+    return jsonify([format_chat(chat) for chat in chats_data])
+
+
+def get_chats_page():
+    """Страница списка чатов: превью последнего сообщения, счетчик и время"""
+    try:
+        limit, after = parse_chats_args(request.args)
+    except ValueError as e:
+        return jsonify({"success": False, "error": str(e)}), 400
+
+    rows = db.get_chats_page(limit=limit, after=after)
+    return jsonify(format_chats_page(rows, limit))
 
 
 @app.route('/api/messages/<int:user_id>')
+@etag_cached
 def get_messages(user_id):
-    """Получить все сообщения от конкретного пользователя"""
-    messages = db.get_user_messages(user_id)
+    """Получить все сообщения от конкретного пользователя
+
+    С параметрами before и/или limit возвращает страницу последних
+    сообщений с id < before и значение before для следующей (более старой) страницы.
+    """
+    try:
+        paged, limit, before = parse_messages_args(request.args)
+    except ValueError as e:
+        return jsonify({"success": False, "error": str(e)}), 400
+
+    messages = db.get_user_messages_page(user_id, limit=limit, before=before)
     user = db.get_user(user_id)
+    return jsonify(format_messages(messages, user, paged, limit))
 
-    formatted_messages = []
-    for msg in messages:
-        # Получаем ответы на это сообщение
-        replies = db.get_message_replies(msg['message_id'])
-
-        formatted_msg = {
-            "message_id": msg['message_id'],
-            "text": msg['message_text'],
-            "timestamp": msg['timestamp'],
-            "is_from_admin": bool(msg['is_from_admin']),
-            "user_info": {
-                "user_id": user['user_id'],
-                "username": user['username'] or "N/A",
-                "first_name": user['first_name'] or "N/A",
-                "last_name": user['last_name'] or "N/A",
-                "full_name": user['full_name'] or f"User {user['user_id']}",
-            } if user else {},
-            "replies": []
-        }
-
-        # Добавляем ответы
-        for reply in replies:
-            formatted_msg["replies"].append({
-                "reply_text": reply['reply_text'],
-                "timestamp": reply['timestamp'],
-                "admin_id": reply['admin_id']
-            })
-
-        formatted_messages.append(formatted_msg)
-
-    return jsonify(formatted_messages)
+
+@app.route('/api/search')
+@etag_cached
+def search():
+    """Полнотекстовый поиск по сообщениям и ответам
+
+    Параметры: q - запрос, limit - размер страницы, cursor - из next_cursor
+    предыдущей страницы. Результаты упорядочены по релевантности.
+    """
+    try:
+        query, limit, cursor = parse_search_args(request.args)
+    except ValueError as e:
+        return jsonify({"success": False, "error": str(e)}), 400
+
+    results, next_cursor = db.search_page(query, limit=limit, cursor=cursor)
+    return jsonify(format_search_results(results, next_cursor))
 
 
 @app.route('/api/send_reply', methods=['POST'])
@@ -149,17 +148,10 @@ def send_reply():
 
     try:
         # Отправляем сообщение через Telegram Bot
-        bot = Bot(token=BOT_TOKEN)
-
-        # Используем asyncio для отправки сообщения
-        async def send_message():
-            await bot.send_message(
-                chat_id=user_id,
-                text=f"💬 Ответ на ваше анонимное сообщение:\n\n{reply_text}"
-            )
-
-        # Запускаем асинхронную функцию
-        asyncio.run(send_message())
+        telegram_bot.send_message(
+            chat_id=user_id,
+            text=f"💬 Ответ на ваше анонимное сообщение:\n\n{reply_text}"
+        )
 
         # Сохраняем ответ в базу данных
         db.add_admin_reply(
@@ -186,17 +178,10 @@ def send_message():
 
     try:
         # Отправляем сообщение через Telegram Bot
-        bot = Bot(token=BOT_TOKEN)
-
-        # Используем asyncio для отправки сообщения
-        async def send_msg():
-            await bot.send_message(
-                chat_id=user_id,
-                text=f"📩 Новое сообщение:\n\n{message_text}"
-            )
-
-        # Запускаем асинхронную функцию
-        asyncio.run(send_msg())
+        telegram_bot.send_message(
+            chat_id=user_id,
+            text=f"📩 Новое сообщение:\n\n{message_text}"
+        )
 
         # Сохраняем сообщение в базу данных как сообщение от администратора
         import uuid
@@ -214,7 +199,58 @@ def send_message():
         return jsonify({"success": False, "error": str(e)}), 500
 
 
+@app.route('/api/events')
+def events_stream():
+    """Поток Server-Sent Events: new_user, new_message, new_reply
+
+    События берутся из ленты изменений в базе, которую пополняют и бот,
+    и веб-интерфейс. При переподключении браузер присылает Last-Event-ID,
+    и поток продолжается с того места, где прервался.
+    """
+    last_event_id = request.headers.get('Last-Event-ID') or request.args.get('last_event_id')
+    try:
+        last_id = int(last_event_id) if last_event_id else db.get_last_event_id()
+    except ValueError:
+        last_id = db.get_last_event_id()
+
+    def generate():
+        nonlocal last_id
+        last_sent = time.monotonic()
+        last_pruned = 0.0
+        # Подсказка браузеру, через сколько переподключаться
+        yield "retry: 3000\n\n"
+
+        while True:
+            events = db.get_events(last_id)
+            for event in events:
+                last_id = event['id']
+                data = json.dumps(format_event(event), ensure_ascii=False)
+                yield f"id: {event['id']}\nevent: {event['type']}\ndata: {data}\n\n"
+
+            now = time.monotonic()
+            if events:
+                last_sent = now
+            elif now - last_sent >= EVENTS_KEEPALIVE_INTERVAL:
+                # Комментарий не виден в браузере, но не дает прокси закрыть соединение
+                yield ": keepalive\n\n"
+                last_sent = now
+
+            if now - last_pruned >= EVENTS_PRUNE_INTERVAL:
+                db.prune_events(EVENTS_KEEP)
+                last_pruned = now
+
+            if not events:
+                time.sleep(EVENTS_POLL_INTERVAL)
+
+    return Response(
+        generate(),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+
 @app.route('/api/stats')
+@etag_cached
 def get_stats():
     """Получить статистику"""
     stats = db.get_stats()
@@ -0,0 +1,298 @@
+#!/usr/bin/env python3
+"""
+ASGI-версия веб-интерфейса Anonymous Bot
+Тот же API, что у web_app.py, но на asyncio: база через AsyncDatabase,
+отправка в Telegram - в том же event loop, без блокировки воркеров
+
+Запуск:
+    python web_asgi.py
+    uvicorn web_asgi:app --host 0.0.0.0 --port 5000 --workers 4
+"""
+
+import asyncio
+import json
+import os
+import time
+import uuid
+from contextlib import asynccontextmanager
+from functools import wraps
+from pathlib import Path
+
+from dotenv import load_dotenv
+from starlette.applications import Starlette
+from starlette.middleware import Middleware
+from starlette.middleware.cors import CORSMiddleware
+from starlette.responses import FileResponse, JSONResponse, Response, StreamingResponse
+from starlette.routing import Mount, Route
+from starlette.staticfiles import StaticFiles
+from telegram import Bot
+from telegram.request import HTTPXRequest
+
+from database import Database, AsyncDatabase, EVENTS_KEEP, EVENTS_PRUNE_INTERVAL
+from telegram_client import DEFAULT_BASE_URL, DEFAULT_POOL_SIZE
+from web_common import (
+    format_chat, format_chats_page, format_messages, format_event, format_search_results,
+    parse_chats_args, parse_messages_args, parse_search_args
+)
+
+# Загружаем переменные окружения
+load_dotenv()
+
+BASE_DIR = Path(__file__).resolve().parent
+
+# Telegram Bot
+BOT_TOKEN = os.getenv('TELEGRAM_BOT_TOKEN')
+ADMIN_ID = int(os.getenv('ADMIN_ID'))
+
+# Server-Sent Events: как часто проверять ленту изменений и слать keepalive
+EVENTS_POLL_INTERVAL = float(os.getenv('EVENTS_POLL_INTERVAL', '1'))
+EVENTS_KEEPALIVE_INTERVAL = 15
+
+# База и Bot создаются при старте воркера (в его event loop)
+db: AsyncDatabase = None
+bot: Bot = None
+
+
+@asynccontextmanager
+async def lifespan(app):
+    """Открыть базу и HTTP-клиент Telegram на время работы воркера"""
+    global db, bot
+    db = AsyncDatabase.from_env(Database())
+    bot = Bot(
+        token=BOT_TOKEN,
+        base_url=os.getenv('TELEGRAM_BASE_URL', DEFAULT_BASE_URL),
+        request=HTTPXRequest(connection_pool_size=int(os.getenv('TELEGRAM_POOL_SIZE', DEFAULT_POOL_SIZE)))
+    )
+    # Без initialize() Bot.shutdown() ничего не делает и пул HTTPX не закрывается
+    await bot.initialize()
+    try:
+        yield
+    finally:
+        await bot.shutdown()
+        db.close()
+
+
+def error(message, status_code):
+    return JSONResponse({"success": False, "error": message}, status_code=status_code)
+
+
+def etag_matches(header, etag):
+    """Есть ли etag в значении If-None-Match"""
+    if not header:
+        return False
+    tags = [tag.strip() for tag in header.split(',')]
+    return '*' in tags or any(tag.removeprefix('W/') == etag for tag in tags)
+
+
+def etag_cached(view):
+    """Условный GET по версии данных (как etag_cached в web_app)"""
+    @wraps(view)
+    async def wrapper(request):
+        etag = f'"v{await db.get_data_version()}"'
+        if etag_matches(request.headers.get('if-none-match'), etag):
+            response = Response(status_code=304)
+        else:
+            response = await view(request)
+            if response.status_code != 200:
+                return response
+        response.headers['ETag'] = etag
+        # Кешировать можно, но перед использованием нужно свериться с сервером
+        response.headers['Cache-Control'] = 'no-cache'
+        return response
+    return wrapper
+
+
+async def index(request):
+    """Главная страница"""
+    return FileResponse(BASE_DIR / 'templates' / 'index.html')
+
+
+@etag_cached
+async def get_chats(request):
+    """Список чатов; с cursor и/или limit - страница кратких записей"""
+    if 'cursor' in request.query_params or 'limit' in request.query_params:
+        try:
+            limit, after = parse_chats_args(request.query_params)
+        except ValueError as e:
+            return error(str(e), 400)
+        rows = await db.get_chats_page(limit=limit, after=after)
+        return JSONResponse(format_chats_page(rows, limit))
+
+    chats_data = await db.get_chats_with_messages()
+    return JSONResponse([format_chat(chat) for chat in chats_data])
+
+
+@etag_cached
+async def get_messages(request):
+    """Сообщения пользователя; с before и/или limit - страница"""
+    user_id = request.path_params['user_id']
+    try:
+        paged, limit, before = parse_messages_args(request.query_params)
+    except ValueError as e:
+        return error(str(e), 400)
+
+    messages, user = await asyncio.gather(
+        db.get_user_messages_page(user_id, limit=limit, before=before),
+        db.get_user(user_id)
+    )
+    return JSONResponse(format_messages(messages, user, paged, limit))
+
+
+@etag_cached
+async def search(request):
+    """Полнотекстовый поиск: q, limit, cursor (next_cursor предыдущей страницы)"""
+    try:
+        query, limit, cursor = parse_search_args(request.query_params)
+    except ValueError as e:
+        return error(str(e), 400)
+
+    results, next_cursor = await db.search_page(query, limit=limit, cursor=cursor)
+    return JSONResponse(format_search_results(results, next_cursor))
+
+
+async def read_json(request):
+    """Тело запроса как dict; None, если это не JSON-объект"""
+    try:
+        data = await request.json()
+    except ValueError:
+        return None
+    return data if isinstance(data, dict) else None
+
+
+async def send_reply(request):
+    """Отправить ответ пользователю"""
+    data = await read_json(request)
+    if data is None:
+        return error("Ожидается JSON", 400)
+    message_id = data.get('message_id')
+    reply_text = data.get('reply_text')
+
+    if not message_id or not reply_text:
+        return error("Не указан message_id или reply_text", 400)
+
+    message = await db.get_message(message_id)
+    if not message:
+        return error("Сообщение не найдено", 404)
+
+    try:
+        # Ожидание Telegram не занимает воркер: loop обслуживает другие запросы
+        await bot.send_message(
+            chat_id=message['user_id'],
+            text=f"💬 Ответ на ваше анонимное сообщение:\n\n{reply_text}"
+        )
+
+        await db.add_admin_reply(
+            message_id=message_id,
+            admin_id=ADMIN_ID,
+            reply_text=reply_text
+        )
+
+        return JSONResponse({"success": True, "message": "Ответ отправлен!"})
+
+    except Exception as e:
+        return error(str(e), 500)
+
+
+async def send_message(request):
+    """Отправить новое сообщение пользователю от имени администратора"""
+    data = await read_json(request)
+    if data is None:
+        return error("Ожидается JSON", 400)
+    user_id = data.get('user_id')
+    message_text = data.get('message_text')
+
+    if not user_id or not message_text:
+        return error("Не указан user_id или message_text", 400)
+
+    try:
+        await bot.send_message(
+            chat_id=user_id,
+            text=f"📩 Новое сообщение:\n\n{message_text}"
+        )
+
+        await db.add_message(
+            message_id=str(uuid.uuid4())[:8],
+            user_id=user_id,
+            message_text=message_text,
+            is_from_admin=True
+        )
+
+        return JSONResponse({"success": True, "message": "Сообщение отправлено!"})
+
+    except Exception as e:
+        return error(str(e), 500)
+
+
+async def events_stream(request):
+    """Поток Server-Sent Events (как /api/events в web_app)"""
+    last_event_id = request.headers.get('last-event-id') or request.query_params.get('last_event_id')
+    try:
+        last_id = int(last_event_id) if last_event_id else await db.get_last_event_id()
+    except ValueError:
+        last_id = await db.get_last_event_id()
+
+    async def generate():
+        nonlocal last_id
+        last_sent = time.monotonic()
+        last_pruned = 0.0
+        yield "retry: 3000\n\n"
+
+        while True:
+            events = await db.get_events(last_id)
+            for event in events:
+                last_id = event['id']
+                data = json.dumps(format_event(event), ensure_ascii=False)
+                yield f"id: {event['id']}\nevent: {event['type']}\ndata: {data}\n\n"
+
+            now = time.monotonic()
+            if events:
+                last_sent = now
+            elif now - last_sent >= EVENTS_KEEPALIVE_INTERVAL:
+                yield ": keepalive\n\n"
+                last_sent = now
+
+            if now - last_pruned >= EVENTS_PRUNE_INTERVAL:
+                await db.prune_events(EVENTS_KEEP)
+                last_pruned = now
+
+            if not events:
+                await asyncio.sleep(EVENTS_POLL_INTERVAL)
+
+    return StreamingResponse(
+        generate(),
+        media_type='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+
+@etag_cached
+async def get_stats(request):
+    """Получить статистику"""
+    return JSONResponse(await db.get_stats())
+
+
+app = Starlette(
+    routes=[
+        Route('/', index),
+        Route('/api/chats', get_chats),
+        Route('/api/messages/{user_id:int}', get_messages),
+        Route('/api/search', search),
+        Route('/api/send_reply', send_reply, methods=['POST']),
+        Route('/api/send_message', send_message, methods=['POST']),
+        Route('/api/events', events_stream),
+        Route('/api/stats', get_stats),
+        Mount('/static', StaticFiles(directory=BASE_DIR / 'static'), name='static'),
+    ],
+    middleware=[Middleware(CORSMiddleware, allow_origins=['*'], allow_methods=['*'], allow_headers=['*'])],
+    lifespan=lifespan,
+)
+
+
+if __name__ == '__main__':
+    import uvicorn
+
+    port = int(os.getenv('WEB_PORT', 5000))
+    workers = int(os.getenv('WEB_WORKERS', 1))
+    print("🌐 Запуск веб-интерфейса (ASGI)...")
+    print(f"📍 Откройте в браузере: http://localhost:{port}")
+    uvicorn.run('web_asgi:app', host='0.0.0.0', port=port, workers=workers)
@@ -0,0 +1,208 @@
+#!/usr/bin/env python3
+"""
+Общие функции API веб-интерфейса Anonymous Bot
+Форматирование ответов и разбор параметров для web_app (Flask) и web_asgi
+"""
+
+import base64
+import binascii
+
+
+# Постраничная выдача списка чатов и сообщений
+CHATS_PAGE_DEFAULT = 50
+CHATS_PAGE_MAX = 200
+MESSAGES_PAGE_DEFAULT = 50
+MESSAGES_PAGE_MAX = 200
+SEARCH_PAGE_DEFAULT = 20
+SEARCH_PAGE_MAX = 100
+
+
+def format_user_info(row):
+    """Информация о пользователе для фронтенда"""
+    return {
+        "user_id": row['user_id'],
+        "username": row['username'] or "N/A",
+        "first_name": row['first_name'] or "N/A",
+        "last_name": row['last_name'] or "N/A",
+        "full_name": row['full_name'] or f"User {row['user_id']}",
+    }
+
+
+def encode_cursor(sort_time, user_id):
+    """Курсор страницы - непрозрачная строка из ключа последнего чата"""
+    raw = f"{sort_time}|{user_id}".encode()
+    return base64.urlsafe_b64encode(raw).decode()
+
+
+def decode_cursor(cursor):
+    """Разобрать курсор; ValueError, если он поврежден"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor.encode()).decode()
+        sort_time, user_id = raw.rsplit('|', 1)
+        return sort_time, int(user_id)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise ValueError("Некорректный cursor")
+
+
+def parse_limit(value, default, maximum):
+    """Разобрать параметр limit и ограничить его сверху"""
+    if value is None:
+        return default
+    limit = int(value)  # ValueError обрабатывает вызывающий
+    if limit < 1:
+        raise ValueError("limit должен быть положительным")
+    return min(limit, maximum)
+
+
+def format_chat(chat):
+    """Чат с полной историей сообщений (ответ /api/chats без параметров)"""
+    return {
+        "user_id": chat['user_id'],
+        "user_info": format_user_info(chat),
+        "messages": [{
+            "message_id": msg['message_id'],
+            "text": msg['message_text'],
+            "timestamp": msg['timestamp'],
+            "is_from_admin": bool(msg['is_from_admin']),
+            # ответы уже загружены вместе с сообщениями
+            "replies": msg['replies']
+        } for msg in chat['messages']],
+        "unread_count": chat['unread_count'],
+        "last_message_time": chat['last_message_time'],
+        "last_seen": chat['last_seen']
+    }
+
+
+def format_chats_page(rows, limit):
+    """Страница списка чатов и курсор следующей страницы"""
+    chats_list = [{
+        "user_id": chat['user_id'],
+        "user_info": format_user_info(chat),
+        "last_message": chat['last_message'],
+        "unread_count": chat['unread_count'],
+        "last_message_time": chat['last_message_time'],
+        "last_seen": chat['last_seen']
+    } for chat in rows]
+
+    next_cursor = None
+    if len(rows) == limit:
+        last = rows[-1]
+        next_cursor = encode_cursor(last['sort_time'], last['user_id'])
+
+    return {"chats": chats_list, "next_cursor": next_cursor}
+
+
+def format_messages(messages, user, paged, limit):
+    """Сообщения пользователя: список (прежний формат) или страница с next_before"""
+    user_info = format_user_info(user) if user else {}
+
+    formatted_messages = []
+    for msg in messages:
+        formatted_msg = {
+            "id": msg['id'],
+            "message_id": msg['message_id'],
+            "text": msg['message_text'],
+            "timestamp": msg['timestamp'],
+            "is_from_admin": bool(msg['is_from_admin']),
+            "replies": [{
+                "id": reply['id'],
+                "reply_text": reply['reply_text'],
+                "timestamp": reply['timestamp'],
+                "admin_id": reply['admin_id']
+            } for reply in msg['replies']]
+        }
+        if not paged:
+            formatted_msg["user_info"] = user_info
+
+        formatted_messages.append(formatted_msg)
+
+    if not paged:
+        return formatted_messages
+
+    next_before = messages[0]['id'] if len(messages) == limit else None
+    return {
+        "user_info": user_info,
+        "messages": formatted_messages,
+        "next_before": next_before
+    }
+
+
+def parse_messages_args(args):
+    """Параметры страницы сообщений: (paged, limit, before); ValueError при ошибке"""
+    paged = 'before' in args or 'limit' in args
+    limit = None
+    before = None
+    if paged:
+        limit = parse_limit(args.get('limit'), MESSAGES_PAGE_DEFAULT, MESSAGES_PAGE_MAX)
+        if args.get('before'):
+            before = int(args['before'])
+    return paged, limit, before
+
+
+def parse_chats_args(args):
+    """Параметры страницы чатов: (limit, after); ValueError при ошибке"""
+    limit = parse_limit(args.get('limit'), CHATS_PAGE_DEFAULT, CHATS_PAGE_MAX)
+    cursor = args.get('cursor')
+    after = decode_cursor(cursor) if cursor else None
+    return limit, after
+
+
+def parse_search_args(args):
+    """Параметры поиска: (query, limit, cursor); ValueError при ошибке"""
+    query = (args.get('q') or '').strip()
+    if not query:
+        raise ValueError("Не указан запрос q")
+    limit = parse_limit(args.get('limit'), SEARCH_PAGE_DEFAULT, SEARCH_PAGE_MAX)
+    cursor = int(args['cursor']) if args.get('cursor') else 0
+    if cursor < 0:
+        raise ValueError("Некорректный cursor")
+    return query, limit, cursor
+
+
+def format_search_results(results, next_cursor):
+    """Страница результатов поиска и курсор следующей страницы (Database.search_page)"""
+    return {
+        "results": [{
+            "kind": result['kind'],
+            "id": result['id'],
+            "message_id": result['message_id'],
+            "user_id": result['user_id'],
+            "text": result['text'],
+            "timestamp": result['timestamp'],
+            "is_from_admin": bool(result['is_from_admin']),
+            "username": result['username'] or "N/A",
+            "full_name": result['full_name'] or f"User {result['user_id']}",
+            "rank": result['rank'],
+        } for result in results],
+        "next_cursor": str(next_cursor) if next_cursor is not None else None,
+    }
+
+
+def format_event(event):
+    """Событие ленты изменений в формате для фронтенда"""
+    data = {
+        "user_id": event['user_id'],
+        "message_id": event['message_id'],
+        "unread_count": event['unread_count'],
+        "user_info": format_user_info(event['user']),
+        "last_seen": event['user']['last_seen'],
+    }
+    message = event['message']
+    if message:
+        data["message"] = {
+            "id": message['id'],
+            "message_id": message['message_id'],
+            "text": message['message_text'],
+            "timestamp": message['timestamp'],
+            "is_from_admin": bool(message['is_from_admin']),
+            "replies": []
+        }
+    reply = event['reply']
+    if reply:
+        data["reply"] = {
+            "id": reply['id'],
+            "reply_text": reply['reply_text'],
+            "timestamp": reply['timestamp'],
+            "admin_id": reply['admin_id']
+        }
+    return data